@@ -1,13 +1,31 @@
 import os
+import sys
 import json
+import argparse
 import time
 import datetime
-import requests
+import hashlib
+import mmap
+import struct
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
 from typing import Dict, List, Any
 from dataclasses import dataclass
-from dotenv import load_dotenv
 
-load_dotenv()
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+# gemini_core, shared with the Django backend, lives at the repository root.
+# Its client only imports the HTTP stack (requests/urllib3/certifi, most of
+# the CLI's import time) on the first call to Gemini; see startup_benchmark.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_core.client import GeminiClient  # noqa: E402
+from gemini_core.prompts import AdvancedPromptEngine  # noqa: E402
 
 
 @dataclass
@@ -18,164 +36,349 @@ class UserFeedback:
     rating: int
     timestamp: str
     suggestions: str = ""
+    style: str = ""
 
 
 class AIAssistantConfig:
     def __init__(self):
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
+        from dotenv import load_dotenv
 
-        if not self.gemini_api_key:
-            print("❌ Error: GEMINI_API_KEY not found in .env file!")
-            print("Please create .env file with: GEMINI_API_KEY=your-actual-api-key")
-            exit(1)
+        load_dotenv()
+        # Validated by require_api_key() on the first query, not at startup
+        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
 
         self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+        self.request_timeout = 30
+        # Retries for 429/5xx and connection errors, with exponential backoff
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+        # Print tokens as they arrive (only when stdout is a terminal)
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "1") != "0"
+        # Record/replay Gemini calls for offline runs: off, record or replay
+        self.cassette_mode = os.getenv("GEMINI_CASSETTE_MODE", "off")
+        self.cassette_path = os.getenv("GEMINI_CASSETTE_PATH", "gemini_cassette.jsonl")
+        # "recorded", "none" or a fixed number of seconds per replayed call
+        self.replay_latency = os.getenv("GEMINI_REPLAY_LATENCY", "recorded")
         self.max_tokens = 2000
         self.temperature = 0.7
-        self.feedback_file = "user_feedback.json"
-        self.session_log = "session_log.json"
+        self.feedback_file = "user_feedback.jsonl"
+        self.legacy_feedback_file = "user_feedback.json"
+        # always: fsync every rating, interval: at most every N seconds, never: leave it to the OS
+        self.feedback_fsync = os.getenv("FEEDBACK_FSYNC", "always")
+        self.feedback_fsync_interval = float(os.getenv("FEEDBACK_FSYNC_INTERVAL", "5"))
+        self.feedback_compact_every = int(os.getenv("FEEDBACK_COMPACT_EVERY", "500"))
+        self.feedback_stats_file = "user_feedback.stats.json"
+        self.session_log = "session_log.jsonl"
+        self.session_index = "session_log.idx"
+        # Recent interactions kept in memory; older ones are read back from the log
+        self.session_memory_limit = int(os.getenv("SESSION_MEMORY_LIMIT", "100"))
+        self.session_page_size = 10
+
+    def require_api_key(self) -> str:
+        if self.cassette_mode == "replay":
+            return self.gemini_api_key or ""
+        if not self.gemini_api_key:
+            print("❌ Error: GEMINI_API_KEY not found in .env file!")
+            print("Please create .env file with: GEMINI_API_KEY=your-actual-api-key")
+            sys.exit(1)
+        return self.gemini_api_key
+
+
+def empty_feedback_stats() -> Dict[str, Any]:
+    return {
+        "version": 1,
+        "log_offset": 0,
+        "total": 0,
+        "rating_sum": 0,
+        "histogram": {},
+        "by_function": {},
+        "by_style": {},
+    }
+
+
+def add_to_feedback_stats(stats: Dict[str, Any], record: Dict):
+    """Fold one feedback record into the running aggregates"""
+    rating = record.get("rating")
+    if not isinstance(rating, int) or not 1 <= rating <= 5:
+        return
+    buckets = [
+        stats,
+        stats["by_function"].setdefault(
+            record.get("function_type", "unknown"),
+            {"total": 0, "rating_sum": 0, "histogram": {}},
+        ),
+    ]
+    if record.get("style"):
+        buckets.append(
+            stats["by_style"].setdefault(
+                record["style"], {"total": 0, "rating_sum": 0, "histogram": {}}
+            )
+        )
+    for bucket in buckets:
+        bucket["total"] += 1
+        bucket["rating_sum"] += rating
+        bucket["histogram"][str(rating)] = bucket["histogram"].get(str(rating), 0) + 1
 
 
-class AdvancedPromptEngine:
-    def __init__(self):
-        self.prompt_templates = {
-            "question_answering": {
-                "factual": """You are a knowledgeable research assistant with expertise across multiple domains. 
-                When answering questions, provide accurate, well-structured information with clear explanations.
-                
-                Question: {query}
-                
-                Please provide a comprehensive answer that includes:
-                1. Direct answer to the question
-                2. Relevant context or background information
-                3. Any important related facts or considerations
-                
-                Respond in a professional yet conversational tone.""",
-                "analytical": """You are an analytical expert who breaks down complex questions into digestible insights.
-                
-                Query: {query}
-                
-                Analyze this question and provide:
-                - Core facts and direct answers
-                - Supporting evidence or reasoning
-                - Multiple perspectives if applicable
-                - Practical implications or applications
-                
-                Keep your response clear, logical, and well-organized.""",
-                "educational": """You are an educational mentor helping someone learn. Explain concepts clearly and thoroughly.
-                
-                Student's Question: {query}
-                
-                Provide an educational response that:
-                - Explains the concept from basics to advanced
-                - Uses examples and analogies where helpful
-                - Highlights key takeaways
-                - Suggests further learning directions if relevant
-                
-                Make it engaging and easy to understand.""",
-            },
-            "text_summarization": {
-                "concise": """You are a professional content summarizer. Create clear, concise summaries that capture essential information.
-                
-                Text to summarize: {query}
-                
-                Provide a well-structured summary that includes:
-                - Main points and key arguments
-                - Important details and data
-                - Logical flow and conclusions
-                
-                Keep it comprehensive yet concise, maintaining the original context and meaning.""",
-                "bullet_points": """You are a content analyst specializing in bullet-point summaries for quick comprehension.
-                
-                Content: {query}
-                
-                Create a structured summary with:
-                • Key Points (3-5 main ideas)
-                • Important Details (supporting facts/data)
-                • Conclusions/Outcomes
-                • Action Items (if applicable)
-                
-                Format in clear bullet points for easy scanning and understanding.""",
-                "executive": """You are an executive briefing specialist. Create summaries for decision-makers who need quick, actionable insights.
-                
-                Document: {query}
-                
-                Provide an executive summary with:
-                1. Executive Overview (2-3 sentences)
-                2. Key Findings
-                3. Strategic Implications
-                4. Recommended Actions
-                
-                Focus on business impact and decision-relevant information.""",
-            },
-            "creative_generation": {
-                "storytelling": """You are a creative storytelling expert with a talent for engaging narratives.
-                
-                Creative Brief: {query}
-                
-                Create compelling content that includes:
-                - Rich, vivid descriptions
-                - Well-developed characters or concepts
-                - Engaging plot or structure
-                - Emotional resonance and impact
-                
-                Make it creative, original, and captivating while staying true to the request.""",
-                "professional": """You are a professional content creator skilled in various writing formats.
-                
-                Content Request: {query}
-                
-                Generate high-quality content with:
-                - Clear structure and organization
-                - Appropriate tone for the intended audience
-                - Compelling and informative content
-                - Professional polish and refinement
-                
-                Ensure the content meets professional standards and serves its intended purpose.""",
-                "innovative": """You are an innovative content strategist who creates unique, fresh perspectives.
-                
-                Creative Challenge: {query}
-                
-                Develop innovative content featuring:
-                - Original ideas and unique angles
-                - Creative problem-solving approaches
-                - Fresh perspectives on familiar topics
-                - Engaging and memorable presentation
-                
-                Push creative boundaries while maintaining practical value.""",
-            },
-        }
+class FeedbackManager:
+    """
+    Append-only JSON Lines feedback log with background compaction.
 
-    def get_prompt(self, function_type: str, style: str, query: str) -> str:
-        try:
-            template = self.prompt_templates[function_type][style]
-            return template.format(query=query)
-        except KeyError:
-            return f"Please help me with the following: {query}"
+    Running aggregates live in a small sidecar file next to the log together
+    with the log offset they cover, so analytics never rescan the log: a
+    stale sidecar is caught up by reading only the bytes appended since.
 
+    Several CLI processes may share the log, so appends, sidecar updates and
+    the compaction swap hold an exclusive ``flock`` on the log.
+    """
 
-class FeedbackManager:
     def __init__(self, config: AIAssistantConfig):
         self.config = config
-        self.feedback_data = self.load_feedback()
-
-    def load_feedback(self) -> List[Dict]:
+        self._lock = threading.Lock()
+        self._last_fsync = 0.0
+        self._appends_since_compaction = 0
+        self._compactor = None
+        self.migrate_legacy_feedback()
+        self.repair_torn_tail()
+
+    def migrate_legacy_feedback(self):
+        """Convert the old single-array user_feedback.json into the JSONL log once"""
+        legacy = self.config.legacy_feedback_file
+        if not os.path.exists(legacy) or os.path.exists(self.config.feedback_file):
+            return
         try:
-            if os.path.exists(self.config.feedback_file):
-                with open(self.config.feedback_file, "r") as f:
-                    return json.load(f)
+            with open(legacy, "r") as f:
+                records = json.load(f)
+            tmp_path = self.config.feedback_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config.feedback_file)
+            os.replace(legacy, legacy + ".migrated")
+            print(f"ℹ️  Migrated {len(records)} feedback records to {self.config.feedback_file}")
         except Exception as e:
-            print(f"Warning: Could not load feedback data: {e}")
-        return []
+            print(f"Warning: Could not migrate legacy feedback data: {e}")
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the thread lock and, where supported, an exclusive flock on the
+        log; yields the log opened for appending. Compaction replaces the log,
+        so a lock taken on a file that was swapped out meanwhile is retaken.
+        """
+        path = self.config.feedback_file
+        with self._lock:
+            while True:
+                log = open(path, "ab")
+                if fcntl is None:
+                    break
+                fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+                try:
+                    if os.stat(path).st_ino == os.fstat(log.fileno()).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                log.close()
+            try:
+                yield log
+            finally:
+                # Closing the file releases the flock
+                log.close()
+
+    def repair_torn_tail(self):
+        """Terminate a line left half-written by a crash so the next append starts clean"""
+        try:
+            with self._locked() as log:
+                if log.seek(0, os.SEEK_END) == 0:
+                    return
+                with open(self.config.feedback_file, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+                if torn:
+                    log.write(b"\n")
+        except OSError as e:
+            print(f"Warning: Could not check feedback log: {e}")
+
+    def iter_feedback(self):
+        """Stream feedback records from the log, skipping corrupt lines"""
+        try:
+            with open(self.config.feedback_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict):
+                        yield record
+        except FileNotFoundError:
+            return
 
-    def save_feedback(self):
+    def _should_fsync(self) -> bool:
+        mode = self.config.feedback_fsync
+        if mode == "always":
+            return True
+        if mode == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.config.feedback_fsync_interval:
+                self._last_fsync = now
+                return True
+        return False
+
+    def _read_stats_sidecar(self) -> Dict[str, Any]:
+        try:
+            with open(self.config.feedback_stats_file, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            if stats.get("version") == 1:
+                return stats
+        except (OSError, ValueError):
+            pass
+        return empty_feedback_stats()
+
+    def _write_stats_sidecar(self, stats: Dict[str, Any]):
+        tmp_path = self.config.feedback_stats_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, self.config.feedback_stats_file)
+
+    def _scan_log(self, stats: Dict[str, Any], offset: int) -> Dict[str, Any]:
+        """Fold complete log lines from ``offset`` onwards into ``stats``"""
+        try:
+            with open(self.config.feedback_file, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a line still being written
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict):
+                        add_to_feedback_stats(stats, record)
+        except FileNotFoundError:
+            pass
+        stats["log_offset"] = offset
+        return stats
+
+    def _current_stats(self) -> Dict[str, Any]:
+        """
+        Aggregates covering the whole log; caller holds _locked(). The sidecar
+        is reread every time since other processes update it too.
+        """
+        stats = self._read_stats_sidecar()
         try:
-            with open(self.config.feedback_file, "w") as f:
-                json.dump(self.feedback_data, f, indent=2)
+            size = os.path.getsize(self.config.feedback_file)
+        except OSError:
+            size = 0
+        if size < stats["log_offset"]:
+            # The log was replaced behind our back; start over.
+            stats = self._scan_log(empty_feedback_stats(), 0)
+            self._write_stats_sidecar(stats)
+        elif size > stats["log_offset"]:
+            self._scan_log(stats, stats["log_offset"])
+            self._write_stats_sidecar(stats)
+        return stats
+
+    def rebuild_stats(self) -> Dict[str, Any]:
+        """Recompute the sidecar aggregates from the full log"""
+        with self._locked():
+            stats = self._scan_log(empty_feedback_stats(), 0)
+            self._write_stats_sidecar(stats)
+            return stats
+
+    def append_feedback(self, record: Dict):
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            with self._locked() as log:
+                stats = self._current_stats()
+                log.write(data)
+                log.flush()
+                if self._should_fsync():
+                    os.fsync(log.fileno())
+                # Fold in everything past the sidecar's offset, not just this
+                # line, so nothing another writer left behind goes uncounted
+                self._scan_log(stats, stats["log_offset"])
+                self._write_stats_sidecar(stats)
+                self._appends_since_compaction += 1
+                compact = self._appends_since_compaction >= self.config.feedback_compact_every
+            if compact:
+                self.start_compaction()
         except Exception as e:
             print(f"Warning: Could not save feedback: {e}")
 
+    def start_compaction(self):
+        """Run compact() on a background thread unless one is already running"""
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._appends_since_compaction = 0
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def compact(self):
+        """Rewrite the log without corrupt lines or duplicated records"""
+        path = self.config.feedback_file
+        tmp_path = None
+        try:
+            # A private temp file: other processes may be compacting too
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(path)), suffix=".compact"
+            )
+            with self._locked() as log:
+                snapshot = log.seek(0, os.SEEK_END)
+                # The locked file, not one swapped in by another compaction
+                src = open(path, "rb")
+            seen = set()
+            stats = empty_feedback_stats()
+            with src, os.fdopen(fd, "wb") as dst:
+                while src.tell() < snapshot:
+                    line = src.readline()
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(record, dict):
+                        continue
+                    digest = hashlib.sha1(
+                        json.dumps(record, sort_keys=True).encode("utf-8")
+                    ).digest()
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    add_to_feedback_stats(stats, record)
+                    dst.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+                # Appends made while we were copying are carried over verbatim.
+                with self._locked() as log:
+                    if os.fstat(log.fileno()).st_ino != os.fstat(src.fileno()).st_ino:
+                        # Another process compacted the log first; its copy stands
+                        dst.close()
+                        os.remove(tmp_path)
+                        return
+                    src.seek(snapshot)
+                    tail = src.read()
+                    dst.write(tail)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                    stats["log_offset"] = dst.tell()
+                    for line in tail.splitlines():
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if isinstance(record, dict):
+                            add_to_feedback_stats(stats, record)
+                    dst.close()
+                    src.close()
+                    os.replace(tmp_path, path)
+                    self._write_stats_sidecar(stats)
+        except Exception as e:
+            print(f"Warning: Feedback compaction failed: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     def collect_feedback(
-        self, function_type: str, query: str, response: str
+        self, function_type: str, query: str, response: str, style: str = ""
     ) -> UserFeedback:
         print("\n" + "=" * 60)
         print("📊 FEEDBACK COLLECTION")
@@ -199,9 +402,10 @@ class FeedbackManager:
             rating=rating,
             timestamp=datetime.datetime.now().isoformat(),
             suggestions=suggestions,
+            style=style,
         )
 
-        self.feedback_data.append(
+        self.append_feedback(
             {
                 "function_type": feedback.function_type,
                 "query": feedback.query,
@@ -209,46 +413,177 @@ class FeedbackManager:
                 "rating": feedback.rating,
                 "timestamp": feedback.timestamp,
                 "suggestions": feedback.suggestions,
+                "style": feedback.style,
             }
         )
 
-        self.save_feedback()
         print(f"✅ Thank you for your feedback! (Rating: {rating}/5)")
         return feedback
 
     def get_feedback_stats(self) -> Dict[str, Any]:
-        if not self.feedback_data:
-            return {"message": "No feedback data available yet."}
+        with self._locked():
+            stats = self._current_stats()
 
-        total_feedback = len(self.feedback_data)
-        avg_rating = sum(item["rating"] for item in self.feedback_data) / total_feedback
-
-        function_stats = {}
-        for item in self.feedback_data:
-            func = item["function_type"]
-            if func not in function_stats:
-                function_stats[func] = {"count": 0, "total_rating": 0}
-            function_stats[func]["count"] += 1
-            function_stats[func]["total_rating"] += item["rating"]
+        if not stats["total"]:
+            return {"message": "No feedback data available yet."}
 
-        for func in function_stats:
-            function_stats[func]["avg_rating"] = (
-                function_stats[func]["total_rating"] / function_stats[func]["count"]
-            )
+        def summarize(buckets):
+            return {
+                key: {
+                    "count": bucket["total"],
+                    "total_rating": bucket["rating_sum"],
+                    "avg_rating": bucket["rating_sum"] / bucket["total"],
+                    "histogram": bucket["histogram"],
+                }
+                for key, bucket in buckets.items()
+            }
 
         return {
-            "total_feedback": total_feedback,
-            "average_rating": round(avg_rating, 2),
-            "function_stats": function_stats,
+            "total_feedback": stats["total"],
+            "average_rating": round(stats["rating_sum"] / stats["total"], 2),
+            "rating_histogram": stats["histogram"],
+            "function_stats": summarize(stats["by_function"]),
+            "style_stats": summarize(stats["by_style"]),
         }
 
 
+class SessionLog:
+    """
+    Append-only JSON Lines log of every interaction, across sessions.
+
+    A side index holds one little-endian u64 per entry with the byte offset
+    where that entry's line starts, so entry ``i`` is found with a single
+    fixed-width read and a page of history is decoded from memory-mapped
+    files without scanning or loading the log.
+
+    Many CLI processes may append at once, so appends and index repairs hold
+    an exclusive ``flock`` on the log for both the line and its index entry.
+    """
+
+    OFFSET = struct.Struct("<Q")
+
+    def __init__(self, config: AIAssistantConfig):
+        self.path = config.session_log
+        self.index_path = config.session_index
+        self.session_id = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self._lock = threading.Lock()
+        try:
+            self.sync_index()
+        except OSError as e:
+            print(f"Warning: Could not check session log: {e}")
+
+    def sync_index(self):
+        """Repair the log/index pair after a crash between (or during) their writes"""
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        if not os.path.exists(self.index_path):
+            open(self.index_path, "wb").close()
+
+        with open(self.path, "rb+") as log, open(self.index_path, "rb+") as index, self._locked(log):
+            log_size = log.seek(0, os.SEEK_END)
+            entries = index.seek(0, os.SEEK_END) // self.OFFSET.size
+            # Drop a half-written index entry and any pointing past the log
+            while entries:
+                index.seek((entries - 1) * self.OFFSET.size)
+                if self.OFFSET.unpack(index.read(self.OFFSET.size))[0] < log_size:
+                    break
+                entries -= 1
+            index.truncate(entries * self.OFFSET.size)
+
+            # Index lines appended to the log after the last indexed one
+            if entries:
+                index.seek((entries - 1) * self.OFFSET.size)
+                start = self.OFFSET.unpack(index.read(self.OFFSET.size))[0]
+                log.seek(start)
+                start += len(log.readline())
+            else:
+                start = 0
+            log.seek(start)
+            index.seek(0, os.SEEK_END)
+            offset = start
+            for line in log:
+                if not line.endswith(b"\n"):
+                    # Torn final line: never acknowledged, so drop it
+                    log.truncate(offset)
+                    break
+                index.write(self.OFFSET.pack(offset))
+                offset += len(line)
+
+    @contextmanager
+    def _locked(self, log):
+        """Hold the log's thread lock and, where supported, an exclusive flock on it"""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(log.fileno(), fcntl.LOCK_UN)
+
+    def append(self, interaction: Dict):
+        line = json.dumps({**interaction, "session": self.session_id}, ensure_ascii=False)
+        data = (line + "\n").encode("utf-8")
+        try:
+            with open(self.path, "ab") as log, self._locked(log):
+                # Other appenders wait on the lock, so the end is where this line goes
+                offset = log.seek(0, os.SEEK_END)
+                log.write(data)
+                log.flush()
+                # The line is on disk before it is indexed, see sync_index()
+                with open(self.index_path, "ab") as index:
+                    index.write(self.OFFSET.pack(offset))
+        except Exception as e:
+            print(f"Warning: Could not save session history: {e}")
+
+    def count(self) -> int:
+        try:
+            return os.path.getsize(self.index_path) // self.OFFSET.size
+        except OSError:
+            return 0
+
+    def read(self, start: int, stop: int) -> List[Dict]:
+        """Entries [start, stop) in log order"""
+        start, stop = max(0, start), min(stop, self.count())
+        if start >= stop:
+            return []
+        entries = []
+        with open(self.index_path, "rb") as index_file, open(self.path, "rb") as log_file:
+            with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index, mmap.mmap(
+                log_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as log:
+                for i in range(start, stop):
+                    offset = self.OFFSET.unpack_from(index, i * self.OFFSET.size)[0]
+                    end = log.find(b"\n", offset)
+                    try:
+                        entries.append(json.loads(log[offset:end if end != -1 else len(log)]))
+                    except ValueError:
+                        entries.append({})
+        return entries
+
+
 class AIAssistant:
     def __init__(self):
         self.config = AIAssistantConfig()
         self.prompt_engine = AdvancedPromptEngine()
         self.feedback_manager = FeedbackManager(self.config)
-        self.session_history = []
+        self.session_log = SessionLog(self.config)
+        self.session_history = deque(maxlen=self.config.session_memory_limit)
+        self.session_count = 0
+        cassette = None
+        if self.config.cassette_mode != "off":
+            from gemini_core.cassette import open_cassette
+
+            cassette = open_cassette(
+                self.config.cassette_mode, self.config.cassette_path, self.config.replay_latency
+            )
+        self.client = GeminiClient(
+            self.config.gemini_api_key,
+            self.config.api_url,
+            timeout=self.config.request_timeout,
+            max_retries=self.config.max_retries,
+            cassette=cassette,
+        )
 
     def display_banner(self):
         print("\n" + "=" * 80)
@@ -300,42 +635,35 @@ class AIAssistant:
                 return styles[function_type][choice][0]
             print("Invalid choice. Please select 1, 2, or 3.")
 
-    def make_api_request(self, prompt: str) -> str:
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "X-goog-api-key": self.config.gemini_api_key,
-            }
-
-            request_body = {"contents": [{"parts": [{"text": prompt}]}]}
-
-            response = requests.post(
-                self.config.api_url, headers=headers, json=request_body, timeout=30
-            )
+    def request_completion(self, prompt: str) -> Dict[str, Any]:
+        """Call Gemini and return {"success", "content"} or {"success", "error"}"""
+        self.config.require_api_key()
+        return self.client.generate(prompt)
 
-            if response.status_code == 200:
-                response_data = response.json()
-                try:
-                    return response_data["candidates"][0]["content"]["parts"][0][
-                        "text"
-                    ].strip()
-                except (KeyError, IndexError):
-                    return "Sorry, I couldn't process the response properly."
-            else:
-                return f"API Error {response.status_code}: {response.text}"
-
-        except requests.exceptions.RequestException as e:
-            return f"Connection Error: {str(e)}\nPlease check your internet connection."
-        except Exception as e:
-            return (
-                f"Unexpected Error: {str(e)}\nPlease check your API key and try again."
-            )
-
-    def process_query(self, function_type: str, style: str, query: str) -> str:
-        print("\n🔄 Processing your request...")
+    def stream_completion(self, prompt: str, on_text) -> Dict[str, Any]:
+        """Call the streaming Gemini endpoint, passing each text chunk to ``on_text``"""
+        self.config.require_api_key()
+        return self.client.stream(prompt, on_text)
 
+    def make_api_request(self, prompt: str) -> str:
+        result = self.request_completion(prompt)
+        return result["content"] if result["success"] else result["error"]
+
+    def execute_query(
+        self, function_type: str, style: str, query: str, on_text=None
+    ) -> Dict[str, Any]:
+        """
+        Run one query end to end; returns the API result plus response text and
+        latency. With ``on_text`` the answer is streamed chunk by chunk.
+        """
+        started = time.perf_counter()
         prompt = self.prompt_engine.get_prompt(function_type, style, query)
-        response = self.make_api_request(prompt)
+        if on_text is None:
+            result = self.request_completion(prompt)
+        else:
+            result = self.stream_completion(prompt, on_text)
+        latency = time.perf_counter() - started
+        response = result["content"] if result["success"] else result["error"]
 
         interaction = {
             "timestamp": datetime.datetime.now().isoformat(),
@@ -343,10 +671,53 @@ class AIAssistant:
             "style": style,
             "query": query,
             "response": response,
+            "streamed": on_text is not None,
+            "time_to_first_token": result.get("time_to_first_token"),
+            "total_time": round(latency, 4),
+            "usage": result.get("usage"),
+            "model": result.get("model"),
         }
         self.session_history.append(interaction)
+        self.session_count += 1
+        self.session_log.append(interaction)
+
+        return {**result, "response": response, "latency": latency}
+
+    def process_query(self, function_type: str, style: str, query: str) -> str:
+        print("\n🔄 Processing your request...")
+        return self.execute_query(function_type, style, query)["response"]
+
+    def streaming_enabled(self) -> bool:
+        return self.config.stream_responses and sys.stdout.isatty()
+
+    def respond(self, function_type: str, style: str, query: str, title: str) -> str:
+        """Run a query and display the answer, streaming it when attached to a terminal"""
+        if not self.streaming_enabled():
+            response = self.process_query(function_type, style, query)
+            print("\n" + "=" * 60)
+            print(title)
+            print("=" * 60)
+            print(response)
+            print("=" * 60)
+            return response
 
-        return response
+        print("\n" + "=" * 60)
+        print(title)
+        print("=" * 60)
+        result = self.execute_query(
+            function_type, style, query,
+            on_text=lambda text: print(text, end="", flush=True),
+        )
+        if not result["success"]:
+            print(result["error"], end="")
+        print()
+        print("=" * 60)
+        if result.get("time_to_first_token") is not None:
+            print(
+                f"⏱️  First token {result['time_to_first_token']:.2f}s • "
+                f"total {result['latency']:.2f}s"
+            )
+        return result["response"]
 
     def handle_question_answering(self):
         print("\n❓ QUESTION ANSWERING MODE")
@@ -359,15 +730,11 @@ class AIAssistant:
             print("❌ Please enter a valid question.")
             return
 
-        response = self.process_query("question_answering", style, query)
+        response = self.respond("question_answering", style, query, "🤖 AI RESPONSE:")
 
-        print("\n" + "=" * 60)
-        print("🤖 AI RESPONSE:")
-        print("=" * 60)
-        print(response)
-        print("=" * 60)
-
-        self.feedback_manager.collect_feedback("question_answering", query, response)
+        self.feedback_manager.collect_feedback(
+            "question_answering", query, response, style
+        )
 
     def handle_text_summarization(self):
         print("\n📝 TEXT SUMMARIZATION MODE")
@@ -390,16 +757,10 @@ class AIAssistant:
             print("❌ Please enter some text to summarize.")
             return
 
-        response = self.process_query("text_summarization", style, text)
-
-        print("\n" + "=" * 60)
-        print("📋 SUMMARY:")
-        print("=" * 60)
-        print(response)
-        print("=" * 60)
+        response = self.respond("text_summarization", style, text, "📋 SUMMARY:")
 
         self.feedback_manager.collect_feedback(
-            "text_summarization", text[:100] + "...", response
+            "text_summarization", text[:100] + "...", response, style
         )
 
     def handle_creative_generation(self):
@@ -413,15 +774,11 @@ class AIAssistant:
             print("❌ Please enter a valid creative request.")
             return
 
-        response = self.process_query("creative_generation", style, query)
-
-        print("\n" + "=" * 60)
-        print("🎭 CREATIVE CONTENT:")
-        print("=" * 60)
-        print(response)
-        print("=" * 60)
+        response = self.respond("creative_generation", style, query, "🎭 CREATIVE CONTENT:")
 
-        self.feedback_manager.collect_feedback("creative_generation", query, response)
+        self.feedback_manager.collect_feedback(
+            "creative_generation", query, response, style
+        )
 
     def show_feedback_analytics(self):
         print("\n📊 FEEDBACK ANALYTICS")
@@ -442,27 +799,66 @@ class AIAssistant:
                 f"  • {func.replace('_', ' ').title()}: {data['avg_rating']:.1f}/5.0 ({data['count']} responses)"
             )
 
+        if stats["style_stats"]:
+            print("\n🎨 Style Performance:")
+            for style, data in stats["style_stats"].items():
+                print(
+                    f"  • {style.replace('_', ' ').title()}: {data['avg_rating']:.1f}/5.0 ({data['count']} responses)"
+                )
+
+        print("\n📊 Rating Distribution:")
+        for rating in range(5, 0, -1):
+            count = stats["rating_histogram"].get(str(rating), 0)
+            print(f"  {rating}⭐ {count:>6}")
+
         print("=" * 60)
 
     def show_session_history(self):
         print("\n📚 SESSION HISTORY")
         print("=" * 60)
 
-        if not self.session_history:
-            print("No interactions in this session yet.")
+        total = self.session_log.count()
+        if not total:
+            print("No interactions recorded yet.")
             return
+        print(f"{total} interactions logged, {self.session_count} in this session (marked •)")
 
-        for i, interaction in enumerate(self.session_history, 1):
-            timestamp = datetime.datetime.fromisoformat(
-                interaction["timestamp"]
-            ).strftime("%H:%M:%S")
-            print(
-                f"\n{i}. [{timestamp}] {interaction['function'].replace('_', ' ').title()} ({interaction['style']})"
-            )
-            print(
-                f"   Query: {interaction['query'][:60]}{'...' if len(interaction['query']) > 60 else ''}"
-            )
-            print("-" * 40)
+        page_size = self.config.session_page_size
+        pages = (total + page_size - 1) // page_size
+        page = 0
+        while True:
+            # Newest first: page 0 ends at the last logged entry
+            stop = total - page * page_size
+            start = max(0, stop - page_size)
+            entries = self.session_log.read(start, stop)
+            for number, interaction in zip(range(stop, start, -1), reversed(entries)):
+                self.print_interaction(number, interaction)
+
+            print(f"\nPage {page + 1}/{pages}")
+            if pages == 1:
+                return
+            choice = input("[n]ext (older), [p]revious, [q]uit: ").strip().lower()
+            if choice == "n" and page + 1 < pages:
+                page += 1
+            elif choice == "p" and page > 0:
+                page -= 1
+            elif choice in ("q", ""):
+                return
+
+    def print_interaction(self, number: int, interaction: Dict):
+        try:
+            timestamp = datetime.datetime.fromisoformat(interaction["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            print(f"\n{number}. [unreadable entry]")
+            return
+        query = interaction.get("query", "")
+        marker = " •" if interaction.get("session") == self.session_log.session_id else ""
+        print(
+            f"\n{number}. [{timestamp.strftime('%Y-%m-%d %H:%M:%S')}]{marker} "
+            f"{interaction.get('function', '').replace('_', ' ').title()} ({interaction.get('style')})"
+        )
+        print(f"   Query: {query[:60]}{'...' if len(query) > 60 else ''}")
+        print("-" * 40)
 
     def run(self):
         self.display_banner()
@@ -493,9 +889,256 @@ class AIAssistant:
             input("\n⏸️  Press Enter to continue...")
 
 
-def main():
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads; rate <= 0 disables it"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def batch_record_key(record: Dict) -> str:
+    """Stable identity of a batch record: its "id" if given, else a content hash"""
+    if record.get("id") is not None:
+        return str(record["id"])
+    payload = json.dumps(
+        [record.get("function_type"), record.get("style"), record.get("query")],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class BatchRunner:
+    """
+    Headless mode: runs {function_type, style, query} JSONL records through
+    process_query on a thread pool and streams results to a JSONL file as
+    they complete. Records already answered successfully in the output file
+    are skipped, so an interrupted run can simply be started again.
+    """
+
+    def __init__(self, assistant: "AIAssistant", workers: int = 4, rate: float = 0.0):
+        self.assistant = assistant
+        self.workers = max(1, workers)
+        # One pooled connection per worker thread
+        client = assistant.client
+        client.pool_size = max(client.pool_size, self.workers)
+        self.limiter = RateLimiter(rate)
+
+    def completed_keys(self, output_path: str) -> set:
+        done = set()
+        if not os.path.exists(output_path):
+            return done
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and result.get("success"):
+                    done.add(result.get("key"))
+        return done
+
+    def iter_records(self, source: str):
+        stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+        try:
+            for line_no, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    print(f"Warning: skipping malformed record on line {line_no}", file=sys.stderr)
+                    continue
+                yield record
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def run_record(self, key: str, record: Dict) -> Dict[str, Any]:
+        function_type = record.get("function_type")
+        style = record.get("style")
+        query = record.get("query")
+        templates = self.assistant.prompt_engine.PROMPT_TEMPLATES
+        if function_type not in templates or style not in templates[function_type] or not query:
+            return {
+                "key": key,
+                "id": record.get("id"),
+                "success": False,
+                "error": "Record needs a valid function_type, style and non-empty query",
+                "latency": 0.0,
+            }
+
+        self.limiter.wait()
+        result = self.assistant.execute_query(function_type, style, query)
+        return {
+            "key": key,
+            "id": record.get("id"),
+            "function_type": function_type,
+            "style": style,
+            "query": query,
+            "success": result["success"],
+            "response": result.get("content"),
+            "error": result.get("error"),
+            "latency": round(result["latency"], 4),
+            "usage": result.get("usage"),
+            "completed_at": datetime.datetime.now().isoformat(),
+        }
+
+    def run(self, source: str, output_path: str) -> Dict[str, Any]:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        done_keys = self.completed_keys(output_path)
+        stats = {"submitted": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+        latencies = []
+        started = time.perf_counter()
+
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+            max_workers=self.workers
+        ) as pool:
+            pending = set()
+
+            def drain(block_until):
+                nonlocal pending
+                finished, pending = wait(pending, return_when=block_until)
+                for future in finished:
+                    result = future.result()
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                    if result["success"]:
+                        stats["succeeded"] += 1
+                        latencies.append(result["latency"])
+                    else:
+                        stats["failed"] += 1
+
+            for record in self.iter_records(source):
+                key = batch_record_key(record)
+                if key in done_keys:
+                    stats["skipped"] += 1
+                    continue
+                done_keys.add(key)
+                pending.add(pool.submit(self.run_record, key, record))
+                stats["submitted"] += 1
+                # Bound the number of queued records so huge inputs stream through.
+                if len(pending) >= self.workers * 2:
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(FIRST_COMPLETED)
+
+        elapsed = time.perf_counter() - started
+        completed = stats["succeeded"] + stats["failed"]
+        return {
+            **stats,
+            "elapsed": elapsed,
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": max(latencies) if latencies else 0.0,
+        }
+
+
+def run_batch(args):
+    assistant = AIAssistant()
+    assistant.config.require_api_key()
+    runner = BatchRunner(assistant, workers=args.workers, rate=args.rate)
+    summary = runner.run(args.batch, args.output)
+    print(
+        f"Batch complete: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped (already in {args.output})",
+        file=sys.stderr,
+    )
+    print(
+        f"Elapsed {summary['elapsed']:.1f}s, throughput {summary['throughput']:.2f} req/s, "
+        f"latency p50 {summary['latency_p50']:.2f}s / p95 {summary['latency_p95']:.2f}s / "
+        f"p99 {summary['latency_p99']:.2f}s / max {summary['latency_max']:.2f}s",
+        file=sys.stderr,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Advanced AI Assistant (CLI mode)")
+    parser.add_argument(
+        "--rebuild-stats",
+        action="store_true",
+        help="Recompute the feedback analytics sidecar from the feedback log and exit",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print feedback analytics and exit",
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for the full answer instead of printing tokens as they arrive",
+    )
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument(
+        "--batch",
+        metavar="INPUT",
+        help="Run JSONL {function_type, style, query} records non-interactively ('-' for stdin)",
+    )
+    batch.add_argument(
+        "--output",
+        default="batch_results.jsonl",
+        help="JSONL file results are appended to (default: %(default)s)",
+    )
+    batch.add_argument(
+        "--workers", type=int, default=4, help="Concurrent requests (default: %(default)s)"
+    )
+    batch.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="Maximum requests per second, 0 for unlimited (default: %(default)s)",
+    )
+    return parser.parse_args(argv)
+
+
+def rebuild_feedback_stats():
+    manager = FeedbackManager(AIAssistantConfig())
+    stats = manager.rebuild_stats()
+    print(
+        f"✅ Rebuilt feedback analytics from {stats['total']} records "
+        f"({stats['log_offset']} bytes of {manager.config.feedback_file})"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
+        if args.rebuild_stats:
+            rebuild_feedback_stats()
+            return
+        if args.batch:
+            run_batch(args)
+            return
+        if args.stats:
+            AIAssistant().show_feedback_analytics()
+            return
         assistant = AIAssistant()
+        if args.no_stream:
+            assistant.config.stream_responses = False
         assistant.run()
     except KeyboardInterrupt:
         print("\n\n👋 Session interrupted. Goodbye!")
@@ -0,0 +1,123 @@
+"""
+Startup benchmark for the VeritasBot CLI.
+
+Measures wall-clock time from process start until the main menu has been
+shown (the CLI is fed "6" so it exits straight away), reports the slowest
+imports from one ``python -X importtime`` run, and checks that the menu and
+``--stats`` paths never import the HTTP stack. Exits non-zero when the median
+exceeds the 150 ms target (``--target-ms 0`` reports without enforcing it).
+
+    python startup_benchmark.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, "main.py")
+HTTP_MODULES = ("requests", "urllib3")
+TARGET_MS = 150.0
+
+# Prints the loaded HTTP modules after main() returns; run in-process so
+# sys.modules reflects exactly what the CLI imported
+_PROBE = (
+    "import sys; sys.path.insert(0, {here!r}); sys.argv = ['main.py'] + {argv!r}\n"
+    "import main\n"
+    "try:\n"
+    "    main.main({argv!r})\n"
+    "except SystemExit:\n"
+    "    pass\n"
+    "loaded = sorted(m for m in {modules!r} if m in sys.modules)\n"
+    "print('LOADED:' + ','.join(loaded))\n"
+)
+
+
+def run_cli(args, stdin="6\n", env=None, extra=()):
+    return subprocess.run(
+        [sys.executable, *extra, MAIN, *args],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.getcwd(),
+    )
+
+
+def time_to_menu(runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = run_cli([])
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise SystemExit(f"CLI exited with {result.returncode}:\n{result.stderr}")
+    return timings
+
+
+def slowest_imports(limit):
+    result = run_cli([], extra=("-X", "importtime"))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        try:
+            cumulative = int(parts[1])
+        except (IndexError, ValueError):
+            continue
+        rows.append((cumulative, parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def http_modules_loaded(argv):
+    code = _PROBE.format(here=HERE, argv=list(argv), modules=HTTP_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code], input="6\n", capture_output=True, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("LOADED:"):
+            return [m for m in line[len("LOADED:"):].split(",") if m]
+    raise SystemExit(f"Probe failed:\n{result.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI time-to-menu")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=TARGET_MS,
+        help="Exit non-zero when the median time-to-menu exceeds this (0 disables the check)",
+    )
+    args = parser.parse_args()
+
+    timings = time_to_menu(args.runs)
+    median = statistics.median(timings)
+    print(f"Time to menu over {args.runs} runs (includes interpreter start-up):")
+    print(f"  median {median:.1f} ms   min {min(timings):.1f} ms   max {max(timings):.1f} ms")
+
+    print("\nSlowest imports (cumulative µs, one run):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"  {cumulative:>8}  {name}")
+
+    failed = False
+    print()
+    for label, argv in (("menu", []), ("--stats", ["--stats"])):
+        loaded = http_modules_loaded(argv)
+        status = "OK" if not loaded else "imports " + ", ".join(loaded)
+        failed |= bool(loaded)
+        print(f"HTTP stack on {label} path: {status}")
+
+    if args.target_ms and median > args.target_ms:
+        print(f"\n❌ median {median:.1f} ms exceeds target {args.target_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Tests for the CLI's on-disk state. Run from this directory:
+
+    python -m unittest tests
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from main import AIAssistantConfig, AdvancedPromptEngine, BatchRunner, FeedbackManager, SessionLog
+
+
+def make_config(directory: str) -> AIAssistantConfig:
+    config = AIAssistantConfig()
+    config.feedback_file = os.path.join(directory, "user_feedback.jsonl")
+    config.legacy_feedback_file = os.path.join(directory, "user_feedback.json")
+    config.feedback_stats_file = os.path.join(directory, "user_feedback.stats.json")
+    config.feedback_fsync = "never"
+    config.session_log = os.path.join(directory, "session_log.jsonl")
+    config.session_index = os.path.join(directory, "session_log.idx")
+    return config
+
+
+def append_interactions(directory: str, writer: int, count: int):
+    log = SessionLog(make_config(directory))
+    for number in range(count):
+        log.append({"query": f"query {writer}-{number}", "response": "é" * number})
+
+
+def feedback_record(writer: int, number: int) -> dict:
+    return {
+        "function_type": "question_answering",
+        "query": f"query {writer}-{number}",
+        "response": "response",
+        "rating": 1 + number % 5,
+        "style": "factual",
+    }
+
+
+def append_feedback(directory: str, writer: int, count: int):
+    config = make_config(directory)
+    config.feedback_compact_every = 20
+    manager = FeedbackManager(config)
+    for number in range(count):
+        manager.append_feedback(feedback_record(writer, number))
+    if manager._compactor is not None:
+        manager._compactor.join()
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.config = make_config(self.directory)
+
+
+class FeedbackManagerTests(TempDirTestCase):
+    def test_processes_appending_and_compacting_lose_nothing(self):
+        context = multiprocessing.get_context("fork")
+        writers = [
+            context.Process(target=append_feedback, args=(self.directory, writer, 60))
+            for writer in range(4)
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+            self.assertEqual(writer.exitcode, 0)
+
+        manager = FeedbackManager(self.config)
+        queries = sorted(record["query"] for record in manager.iter_feedback())
+        self.assertEqual(
+            queries, sorted(f"query {w}-{n}" for w in range(4) for n in range(60))
+        )
+        stats = manager.get_feedback_stats()
+        self.assertEqual(stats["total_feedback"], 240)
+        manager.rebuild_stats()
+        self.assertEqual(manager.get_feedback_stats(), stats)
+
+    def test_sidecar_counts_lines_appended_behind_it(self):
+        manager = FeedbackManager(self.config)
+        manager.append_feedback(feedback_record(0, 0))
+        # Another writer appended without updating the sidecar
+        with open(self.config.feedback_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(feedback_record(1, 0)) + "\n")
+        manager.append_feedback(feedback_record(0, 1))
+
+        with open(self.config.feedback_stats_file, encoding="utf-8") as f:
+            stats = json.load(f)
+        self.assertEqual(stats["total"], 3)
+        self.assertEqual(stats["log_offset"], os.path.getsize(self.config.feedback_file))
+
+
+class FeedbackAnalyticsTests(TempDirTestCase):
+    def test_sidecar_is_caught_up_incrementally(self):
+        manager = FeedbackManager(self.config)
+        for number in range(5):
+            manager.append_feedback(feedback_record(0, number))
+        stats = manager.get_feedback_stats()
+        self.assertEqual(stats["total_feedback"], 5)
+        self.assertEqual(stats["rating_histogram"], {str(r): 1 for r in range(1, 6)})
+        self.assertEqual(stats["average_rating"], 3.0)
+        self.assertEqual(stats["function_stats"]["question_answering"]["count"], 5)
+
+        # A line still being written is left for the next catch-up
+        with open(self.config.feedback_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(feedback_record(1, 4))[:-5])
+        self.assertEqual(manager.get_feedback_stats()["total_feedback"], 5)
+        with open(self.config.feedback_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(feedback_record(1, 4))[-5:] + "\n")
+        with mock.patch.object(manager, "_scan_log", wraps=manager._scan_log) as scan:
+            stats = manager.get_feedback_stats()
+        self.assertEqual(stats["total_feedback"], 6)
+        # Only the bytes after the sidecar's offset were read
+        self.assertGreater(scan.call_args.args[1], 0)
+        manager.rebuild_stats()
+        self.assertEqual(manager.get_feedback_stats(), stats)
+
+    def test_replaced_log_is_rescanned(self):
+        manager = FeedbackManager(self.config)
+        for number in range(5):
+            manager.append_feedback(feedback_record(0, number))
+        with open(self.config.feedback_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps(feedback_record(2, 0)) + "\n")
+        self.assertEqual(manager.get_feedback_stats()["total_feedback"], 1)
+
+
+class SessionLogTests(TempDirTestCase):
+    def test_processes_share_the_log_and_index(self):
+        context = multiprocessing.get_context("fork")
+        writers = [
+            context.Process(target=append_interactions, args=(self.directory, writer, 100))
+            for writer in range(4)
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+            self.assertEqual(writer.exitcode, 0)
+
+        log = SessionLog(self.config)
+        self.assertEqual(log.count(), 400)
+        entries = log.read(0, 400)
+        self.assertEqual(
+            sorted(entry["query"] for entry in entries),
+            sorted(f"query {w}-{n}" for w in range(4) for n in range(100)),
+        )
+        for entry in entries:
+            self.assertEqual(entry["response"], "é" * int(entry["query"].rsplit("-", 1)[1]))
+        self.assertEqual(log.read(398, 410), entries[398:])
+
+    def test_sync_index_repairs_a_crash(self):
+        log = SessionLog(self.config)
+        for number in range(3):
+            log.append({"query": f"q{number}"})
+        # Crash after writing a line but before indexing it, then mid-line
+        with open(self.config.session_log, "ab") as f:
+            f.write(json.dumps({"query": "unindexed"}).encode("utf-8") + b"\n")
+            f.write(b'{"query": "tor')
+        with open(self.config.session_index, "ab") as f:
+            f.write(b"\x01\x02")
+
+        log = SessionLog(self.config)
+        self.assertEqual([entry["query"] for entry in log.read(0, 10)], ["q0", "q1", "q2", "unindexed"])
+        log.append({"query": "after"})
+        self.assertEqual(log.read(4, 5)[0]["query"], "after")
+
+
+class FakeAssistant:
+    """Stands in for AIAssistant in batch runs; fails queries containing "fail" """
+
+    def __init__(self, delay: float = 0.0):
+        self.prompt_engine = AdvancedPromptEngine()
+        self.client = mock.Mock(pool_size=10)
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def execute_query(self, function_type, style, query, on_text=None):
+        with self._lock:
+            self.calls.append(query)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if "fail" in query:
+            return {"success": False, "error": "API Error 500", "latency": self.delay}
+        return {"success": True, "content": f"answer to {query}", "latency": self.delay}
+
+
+class BatchRunnerTests(TempDirTestCase):
+    def write_batch(self, records) -> str:
+        path = os.path.join(self.directory, "batch.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+        return path
+
+    def read_results(self, path) -> list:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_rerun_skips_answered_records_and_retries_failures(self):
+        source = self.write_batch([
+            {"id": 1, "function_type": "question_answering", "style": "factual", "query": "one"},
+            {"id": 2, "function_type": "question_answering", "style": "factual", "query": "please fail"},
+            {"id": 3, "function_type": "question_answering", "style": "no-such-style", "query": "three"},
+            "not json",
+            {"function_type": "creative_generation", "style": "storytelling", "query": "four"},
+        ])
+        output = os.path.join(self.directory, "results.jsonl")
+
+        assistant = FakeAssistant()
+        summary = BatchRunner(assistant, workers=2).run(source, output)
+        self.assertEqual(
+            {key: summary[key] for key in ("submitted", "succeeded", "failed", "skipped")},
+            {"submitted": 4, "succeeded": 2, "failed": 2, "skipped": 0},
+        )
+        self.assertEqual(sorted(assistant.calls), ["four", "one", "please fail"])
+        results = {result["query"]: result for result in self.read_results(output) if "query" in result}
+        self.assertEqual(results["one"]["response"], "answer to one")
+
+        assistant = FakeAssistant()
+        summary = BatchRunner(assistant, workers=2).run(source, output)
+        self.assertEqual(summary["skipped"], 2)
+        self.assertEqual(assistant.calls, ["please fail"])
+
+    def test_records_run_concurrently(self):
+        source = self.write_batch([
+            {"function_type": "question_answering", "style": "factual", "query": f"q{i}"}
+            for i in range(8)
+        ])
+        assistant = FakeAssistant(delay=0.05)
+        summary = BatchRunner(assistant, workers=4).run(source, os.path.join(self.directory, "out.jsonl"))
+        self.assertEqual(summary["succeeded"], 8)
+        self.assertGreater(assistant.max_in_flight, 1)
+        self.assertLessEqual(assistant.max_in_flight, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,10 +13,15 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# gemini_core, shared with the CLI, lives at the repository root
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -46,6 +51,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +94,18 @@ DATABASES = {
     }
 }
 
+# High-concurrency SQLite profile, applied by api.db on every new connection.
+# WAL lets readers keep going while a writer commits, and busy_timeout makes
+# concurrent writers wait for the lock instead of failing with
+# "database is locked". Set to {} to fall back to stock SQLite behaviour.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 20000,        # milliseconds
+    'synchronous': 'NORMAL',      # durable in WAL mode except on power loss
+    'mmap_size': 268435456,       # 256 MB of the file mapped for reads
+    'cache_size': -65536,         # negative = KiB, i.e. a 64 MB page cache
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -158,6 +178,14 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-profile',
+    'x-api-key',
+]
+
+# Let the frontend read per-stage timings (api.middleware.MetricsMiddleware)
+# and profile links (api.middleware.ProfilingMiddleware)
+CORS_EXPOSE_HEADERS = [
+    'Server-Timing', 'Link', 'X-Profile-Samples', 'X-DB-Queries', 'Retry-After', 'X-RateLimit-Remaining'
 ]
 
 CORS_ALLOW_METHODS = [
@@ -176,6 +204,153 @@ CSRF_TRUSTED_ORIGINS = [
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
 DATA_DIR = BASE_DIR / 'data'
-FEEDBACK_FILE = DATA_DIR / 'user_feedback.json'
-SESSION_LOG = DATA_DIR / 'session_log.json'
+FEEDBACK_FILE = DATA_DIR / 'user_feedback.jsonl'  # CLI feedback log (JSON Lines)
+SESSION_LOG = DATA_DIR / 'session_log.jsonl'  # CLI interaction log (JSON Lines)
 os.makedirs(DATA_DIR, exist_ok=True)
+
+# Query/response text at or above this many UTF-8 bytes is zlib-compressed
+# before it is stored in api.TextBlob
+TEXT_BLOB_COMPRESS_THRESHOLD = 1024
+
+# Tiered history storage: `manage.py archive_history` moves QueryHistory rows
+# older than HISTORY_RETENTION_DAYS into per-month compressed segment files
+# under ARCHIVE_DIR. /api/history/ reads them back for old date ranges.
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 90))
+ARCHIVE_DIR = DATA_DIR / 'archive'
+ARCHIVE_BLOCK_SIZE = 256  # rows per independently compressed block
+
+# Progress of `manage.py import_cli_data`, per source file
+IMPORT_CHECKPOINT_FILE = DATA_DIR / 'import_checkpoints.json'
+
+# Record/replay of Gemini calls (gemini_core.cassette) for offline, repeatable
+# runs: GEMINI_CASSETTE_MODE is off, record or replay. Replayed calls sleep for
+# the recorded latency unless GEMINI_REPLAY_LATENCY is "none" or a fixed number
+# of seconds.
+GEMINI_CASSETTE_MODE = os.getenv('GEMINI_CASSETTE_MODE', 'off')
+GEMINI_CASSETTE_PATH = os.getenv('GEMINI_CASSETTE_PATH', str(DATA_DIR / 'gemini_cassette.jsonl'))
+GEMINI_REPLAY_LATENCY = os.getenv('GEMINI_REPLAY_LATENCY', 'recorded')
+
+# Upstream client (gemini_core.client): per-request timeout in seconds, retries
+# for 429/5xx and connection errors, and kept-alive connections per host
+GEMINI_TIMEOUT = 30
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 2))
+GEMINI_POOL_SIZE = 10
+
+# USD per million tokens, by the model name Gemini reports (modelVersion).
+# Used for QueryHistory.estimated_cost and /api/usage-stats/.
+GEMINI_PRICING = {
+    'gemini-2.0-flash': {'input': 0.10, 'output': 0.40},
+    'gemini-2.0-flash-001': {'input': 0.10, 'output': 0.40},
+}
+
+# Sliding-window latency histograms (api.histograms): LATENCY_SLOTS slots of
+# LATENCY_SLOT_SECONDS each, i.e. the last 15 minutes. Every worker writes its
+# histograms to LATENCY_SNAPSHOT_DIR at most every LATENCY_SNAPSHOT_INTERVAL
+# seconds and /api/latency/ merges them.
+LATENCY_SLOT_SECONDS = 10
+LATENCY_SLOTS = 90
+LATENCY_SNAPSHOT_DIR = DATA_DIR / 'latency'
+LATENCY_SNAPSHOT_INTERVAL = 5
+
+# On-demand request profiling (api.profiling). With PROFILING_ENABLED, requests
+# carrying a signed X-Profile header (`manage.py profile_token`, valid for
+# PROFILING_TOKEN_MAX_AGE seconds) or picked at PROFILING_SAMPLE_RATE get their
+# stack sampled every PROFILING_INTERVAL seconds; the collapsed stacks go to
+# PROFILE_DIR (newest PROFILE_MAX_FILES kept) and are linked from the response.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = 0.005
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILE_DIR = DATA_DIR / 'profiles'
+PROFILE_MAX_FILES = 200
+
+# `manage.py benchmark_hot_paths --save-baseline` stores its timings here;
+# later runs compare against them
+BENCHMARK_BASELINE_FILE = DATA_DIR / 'benchmark_baseline.json'
+
+# SQL query budgets (api.query_budget) for tests and staging: 'off', 'log'
+# (log requests over budget with the code that issued their queries) or
+# 'strict' (also raise QueryBudgetExceeded). Views without @query_budget get
+# QUERY_BUDGET_DEFAULT; None leaves them unchecked.
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'off')
+QUERY_BUDGET_DEFAULT = 20
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Version tokens behind the ETags of read endpoints (api.http_cache); on
+    # disk so every worker process sees the same values
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': DATA_DIR / 'cache' / 'versions',
+    },
+    # Answers to repeated questions (api.response_cache), shared by all
+    # workers and kept across restarts
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': DATA_DIR / 'cache' / 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Multi-turn conversations (api.conversations), in estimated tokens: context
+# sent with each query is capped at CONVERSATION_CONTEXT_TOKENS; once the
+# summary plus unsummarized turns exceed CONVERSATION_SUMMARIZE_AT, a
+# background worker folds all but the last CONVERSATION_KEEP_TURNS turns into
+# a summary of about CONVERSATION_SUMMARY_TOKENS.
+CONVERSATION_CONTEXT_TOKENS = 2000
+CONVERSATION_SUMMARIZE_AT = 1500
+CONVERSATION_KEEP_TURNS = 2
+CONVERSATION_SUMMARY_TOKENS = 300
+CONVERSATION_SUMMARY_WORKERS = 1
+
+# Response cache (api.response_cache): answers for these function types are
+# reused for RESPONSE_CACHE_TTL seconds. The RESPONSE_CACHE_WARM_KEYS most
+# frequent queries of the last RESPONSE_CACHE_WARM_DAYS days are loaded from
+# history after a worker's first request, at most once per
+# RESPONSE_CACHE_WARM_INTERVAL seconds across workers.
+RESPONSE_CACHE_FUNCTION_TYPES = ['question_answering', 'text_summarization']
+RESPONSE_CACHE_TTL = 7 * 86400
+RESPONSE_CACHE_WARM_KEYS = 500
+RESPONSE_CACHE_WARM_DAYS = 30
+RESPONSE_CACHE_WARM_INTERVAL = 600
+
+# Execution lanes for Gemini calls in /api/query/ (api.lanes), per worker
+# process: each lane has its own queue and concurrency limit, lanes share
+# QUERY_LANE_SLOTS slots by weight, and prompts longer than
+# QUERY_LANE_LONG_INPUT_CHARS use the 'long_input' lane. Queries waiting more
+# than QUERY_LANE_TIMEOUT seconds get a 503 with Retry-After. Needs threaded
+# workers with more threads than slots: serve with gunicorn.conf.py.
+QUERY_LANES = {
+    'question_answering': {'concurrency': 6, 'weight': 4},
+    'text_summarization': {'concurrency': 3, 'weight': 2},
+    'creative_generation': {'concurrency': 3, 'weight': 2},
+    'long_input': {'concurrency': 2, 'weight': 1},
+}
+QUERY_LANE_SLOTS = int(os.getenv('QUERY_LANE_SLOTS', 8))
+QUERY_LANE_LONG_INPUT_CHARS = 20000
+QUERY_LANE_TIMEOUT = 30
+QUERY_LANE_RETRY_AFTER = 5
+
+# Per-client quotas on /api/query/ (api.quotas): clients are identified by
+# X-API-Key or IP address and limited per sliding QUOTA_WINDOW_SECONDS window
+# (0 disables a limit). Counters are shared by all workers through QUOTA_DB.
+# Only trust X-Forwarded-For behind a proxy that sets it.
+QUOTA_ENABLED = os.getenv('QUOTA_ENABLED', 'true').lower() == 'true'
+QUOTA_WINDOW_SECONDS = 60
+QUOTA_REQUESTS_PER_WINDOW = int(os.getenv('QUOTA_REQUESTS_PER_WINDOW', 60))
+QUOTA_TOKENS_PER_WINDOW = int(os.getenv('QUOTA_TOKENS_PER_WINDOW', 200000))
+QUOTA_TRUST_FORWARDED_FOR = False
+# X-API-Key values that get their own quota (comma-separated); any other key
+# is ignored and the client is limited by IP address
+QUOTA_API_KEYS = [key.strip() for key in os.getenv('QUOTA_API_KEYS', '').split(',') if key.strip()]
+QUOTA_DB = DATA_DIR / 'quotas.sqlite3'
+
+# Document uploads for summarization (api.uploads): bodies are streamed to a
+# temporary file and rejected past UPLOAD_MAX_BYTES. Documents longer than
+# UPLOAD_CHUNK_CHARS (~100k tokens) are summarized in parts of that size, each
+# part summary capped at UPLOAD_PART_SUMMARY_TOKENS.
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+UPLOAD_CHUNK_CHARS = 400000
+UPLOAD_PART_SUMMARY_TOKENS = 400
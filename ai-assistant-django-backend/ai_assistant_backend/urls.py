@@ -27,10 +27,18 @@ def api_root(request):
         'endpoints': [
             '/api/health/',
             '/api/query/',
+            '/api/summarize/upload/',
+            '/api/conversations/',
+            '/api/conversations/<session_id>/',
             '/api/feedback/',
             '/api/feedback-stats/',
             '/api/styles/<function_type>/',
             '/api/history/',
+            '/api/history/export/',
+            '/api/feedback/export/',
+            '/api/metrics/',
+            '/api/usage-stats/',
+            '/api/latency/',
             '/admin/',
         ]
     })
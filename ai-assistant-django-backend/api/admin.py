@@ -1,28 +1,80 @@
+import re
+
 from django.contrib import admin
+from django.db.models import Q
+
+from .models import (
+    QueryHistory, UserFeedback, APIUsageStats, TextBlob, Conversation, ConversationTurn, text_digest
+)
+
+DIGEST = re.compile(r'[0-9a-f]{64}')
 
-from .models import QueryHistory, UserFeedback, APIUsageStats
+class BlobTextSearchMixin:
+    """
+    Substring search only sees texts stored uncompressed. Texts of
+    TEXT_BLOB_COMPRESS_THRESHOLD bytes or more live zlib-compressed in
+    ``data``, so they are found instead by exact match: searching for the
+    complete query/response text, or for its TextBlob digest.
+    """
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            digests = {text_digest(search_term)}
+            if DIGEST.fullmatch(search_term.strip()):
+                digests.add(search_term.strip())
+            results |= queryset.filter(Q(query_blob__digest__in=digests) | Q(response_blob__digest__in=digests))
+        return results, may_have_duplicates
 
 @admin.register(QueryHistory)
-class QueryHistoryAdmin(admin.ModelAdmin):
-    list_display = ['function_type', 'style', 'created_at', 'processing_time']
-    list_filter = ['function_type', 'style', 'created_at']
-    search_fields = ['query', 'response']
-    readonly_fields = ['created_at']
+class QueryHistoryAdmin(BlobTextSearchMixin, admin.ModelAdmin):
+    list_display = ['function_type', 'style', 'created_at', 'processing_time', 'total_tokens']
+    list_filter = ['function_type', 'style', 'model_name', 'created_at']
+    search_fields = ['query_blob__text', 'response_blob__text']
+    exclude = ['query_blob', 'response_blob']
+    readonly_fields = ['query', 'response', 'created_at']
     date_hierarchy = 'created_at'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        return super().get_queryset(request).select_related('query_blob', 'response_blob')
 
 @admin.register(UserFeedback)
-class UserFeedbackAdmin(admin.ModelAdmin):
+class UserFeedbackAdmin(BlobTextSearchMixin, admin.ModelAdmin):
     list_display = ['function_type', 'rating', 'created_at']
     list_filter = ['function_type', 'rating', 'created_at']
-    search_fields = ['query', 'response', 'suggestions']
-    readonly_fields = ['created_at']
+    search_fields = ['query_blob__text', 'response_blob__text', 'suggestions']
+    exclude = ['query_blob', 'response_blob']
+    readonly_fields = ['query', 'response', 'created_at']
     date_hierarchy = 'created_at'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('query_blob', 'response_blob')
+
 @admin.register(APIUsageStats)
 class APIUsageStatsAdmin(admin.ModelAdmin):
     list_display = ['function_type', 'date', 'total_queries', 'avg_rating']
     list_filter = ['function_type', 'date']
-    date_hierarchy = 'date'
\ No newline at end of file
+    date_hierarchy = 'date'
+
+@admin.register(TextBlob)
+class TextBlobAdmin(admin.ModelAdmin):
+    list_display = ['digest', 'size', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'value', 'size', 'created_at']
+    exclude = ['text', 'data']
+
+class ConversationTurnInline(admin.TabularInline):
+    model = ConversationTurn
+    exclude = ['query_blob', 'response_blob']
+    readonly_fields = ['position', 'query', 'response', 'tokens', 'query_history', 'created_at']
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('query_blob', 'response_blob')
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ['session_id', 'turn_count', 'summarized_turns', 'updated_at']
+    search_fields = ['session_id']
+    readonly_fields = ['session_id', 'summary', 'summarized_turns', 'turn_count', 'created_at', 'updated_at']
+    inlines = [ConversationTurnInline]
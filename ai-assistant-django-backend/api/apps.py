@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .db import configure_sqlite_connection
+        from .http_cache import RESOURCES, bump_for_instance
+        from .response_cache import warm_on_first_request
+
+        connection_created.connect(
+            configure_sqlite_connection,
+            dispatch_uid='api.configure_sqlite_connection'
+        )
+        for label in RESOURCES:
+            model = self.apps.get_model(label)
+            for signal in (post_save, post_delete):
+                signal.connect(bump_for_instance, sender=model, dispatch_uid='api.http_cache.bump')
+        request_started.connect(warm_on_first_request, dispatch_uid='api.response_cache.warm')
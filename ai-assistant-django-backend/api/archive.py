@@ -0,0 +1,336 @@
+"""
+Cold storage for old QueryHistory rows.
+
+Rows past the retention age are written to immutable per-month segment files
+under ``settings.ARCHIVE_DIR``. A segment is a sequence of independently
+zlib-compressed blocks, each holding up to ``ARCHIVE_BLOCK_SIZE`` JSON lines
+sorted newest first. A JSON sidecar (``<segment>.idx.json``) records the byte
+range, row count and time span of every block, so readers memory-map the
+segment and only decompress the blocks that overlap the requested range.
+The sidecar is written last and doubles as the commit marker. It also lists
+the archived row ids, so a run that stopped between publishing a segment and
+deleting its rows finishes that delete instead of archiving the rows twice.
+"""
+import heapq
+import json
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .http_cache import bump
+from .models import QueryHistory, TextBlob, UserFeedback
+from .serializers import QueryResponseSerializer
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.seg.idx.json'
+DELETE_BATCH_SIZE = 500
+RUN_BATCH_SIZE = 100  # id ranges per query, well under SQLite's expression depth limit
+
+
+def _archive_dir():
+    return os.fspath(settings.ARCHIVE_DIR)
+
+
+def _fsync_write(path, data):
+    """Write ``data`` to a temp file next to ``path``, fsync it and move it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class SegmentWriter:
+    """Streams records, supplied newest first, into a new segment file"""
+
+    def __init__(self, month):
+        self.month = month
+        self.directory = _archive_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+        self.blocks = []
+        self.offset = 0
+        self.count = 0
+        self.ids = []
+        self._pending = []
+
+    def add(self, ts, record):
+        self._pending.append((ts, record))
+        self.ids.append(record['id'])
+        if len(self._pending) >= settings.ARCHIVE_BLOCK_SIZE:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self._pending:
+            return
+        lines = '\n'.join(
+            json.dumps([ts, record], separators=(',', ':')) for ts, record in self._pending
+        )
+        data = zlib.compress(lines.encode('utf-8'), 6)
+        self.file.write(data)
+        self.blocks.append({
+            'offset': self.offset,
+            'length': len(data),
+            'count': len(self._pending),
+            'max_ts': self._pending[0][0],
+            'min_ts': self._pending[-1][0],
+        })
+        self.offset += len(data)
+        self.count += len(self._pending)
+        self._pending = []
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def commit(self):
+        """Publish the segment and its sidecar index; returns the segment path or None"""
+        self._flush_block()
+        if not self.count:
+            self.abort()
+            return None
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        sequence = len([
+            name for name in os.listdir(self.directory)
+            if name.startswith(f'history-{self.month}-') and name.endswith(INDEX_SUFFIX)
+        ])
+        base = os.path.join(self.directory, f'history-{self.month}-{sequence + 1:04d}')
+        segment_path = base + SEGMENT_SUFFIX
+        index = {
+            'version': 1,
+            'month': self.month,
+            'segment': os.path.basename(segment_path),
+            'count': self.count,
+            'max_ts': self.blocks[0]['max_ts'],
+            'min_ts': self.blocks[-1]['min_ts'],
+            'id_runs': _id_runs(self.ids),
+            'blocks': self.blocks,
+        }
+        os.replace(self.tmp_path, segment_path)
+        _fsync_write(base + INDEX_SUFFIX, json.dumps(index).encode('utf-8'))
+        return segment_path
+
+
+def _id_runs(ids):
+    """``ids`` as sorted ``[first, last]`` runs of consecutive values"""
+    runs = []
+    for row_id in sorted(ids):
+        if runs and row_id == runs[-1][1] + 1:
+            runs[-1][1] = row_id
+        else:
+            runs.append([row_id, row_id])
+    return runs
+
+
+class Segment:
+    """Read-only view of a committed segment, memory-mapped on first access"""
+
+    def __init__(self, index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.path = os.path.join(os.path.dirname(index_path), self.index['segment'])
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _buffer(self):
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    with open(self.path, 'rb') as f:
+                        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _decode_block(self, block):
+        view = memoryview(self._buffer())[block['offset']:block['offset'] + block['length']]
+        try:
+            data = zlib.decompress(view)
+        finally:
+            view.release()
+        for line in data.decode('utf-8').split('\n'):
+            yield json.loads(line)
+
+    def iter_records(self, start_ts=None, end_ts=None):
+        """Yield ``(ts, record)`` newest first within [start_ts, end_ts)"""
+        for block in self.index['blocks']:
+            if not _overlaps(block, start_ts, end_ts):
+                continue
+            for ts, record in self._decode_block(block):
+                if _in_range(ts, start_ts, end_ts):
+                    yield ts, record
+
+    def count(self, start_ts=None, end_ts=None):
+        total = 0
+        for block in self.index['blocks']:
+            if not _overlaps(block, start_ts, end_ts):
+                continue
+            if _in_range(block['min_ts'], start_ts, end_ts) and _in_range(block['max_ts'], start_ts, end_ts):
+                total += block['count']
+            else:
+                total += sum(1 for ts, _ in self._decode_block(block) if _in_range(ts, start_ts, end_ts))
+        return total
+
+
+def _in_range(ts, start_ts, end_ts):
+    return (start_ts is None or ts >= start_ts) and (end_ts is None or ts < end_ts)
+
+
+def _overlaps(span, start_ts, end_ts):
+    return (start_ts is None or span['max_ts'] >= start_ts) and (end_ts is None or span['min_ts'] < end_ts)
+
+
+_segments = {}
+_segments_lock = threading.Lock()
+
+
+def list_segments():
+    """Committed segments, reusing already-mapped ones between calls"""
+    directory = _archive_dir()
+    if not os.path.isdir(directory):
+        return []
+    index_paths = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory) if name.endswith(INDEX_SUFFIX)
+    ]
+    with _segments_lock:
+        for path in index_paths:
+            if path not in _segments:
+                _segments[path] = Segment(path)
+        return [_segments[path] for path in index_paths]
+
+
+def _ts(value):
+    return value.timestamp() if value is not None else None
+
+
+def reaches_archive(start=None, end=None):
+    """Whether the date range [start, end) overlaps any archived rows"""
+    start_ts, end_ts = _ts(start), _ts(end)
+    return any(_overlaps(segment.index, start_ts, end_ts) for segment in list_segments())
+
+
+def count_archived(start=None, end=None):
+    start_ts, end_ts = _ts(start), _ts(end)
+    return sum(
+        segment.count(start_ts, end_ts)
+        for segment in list_segments()
+        if _overlaps(segment.index, start_ts, end_ts)
+    )
+
+
+def iter_archived(start=None, end=None):
+    """Yield archived history records newest first, merged across segments"""
+    start_ts, end_ts = _ts(start), _ts(end)
+    streams = [
+        segment.iter_records(start_ts, end_ts)
+        for segment in list_segments()
+        if _overlaps(segment.index, start_ts, end_ts)
+    ]
+    for _, record in heapq.merge(*streams, key=lambda item: item[0], reverse=True):
+        yield record
+
+
+def page_archived(start, end, offset, limit):
+    return list(islice(iter_archived(start, end), offset, offset + limit))
+
+
+def _month_bounds(month_start):
+    next_month = (month_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return month_start, next_month
+
+
+def archive_history(older_than=None, chunk_size=2000, dry_run=False):
+    """
+    Move QueryHistory rows created before ``older_than`` into segment files.
+    Returns a list of ``(month, rows, segment_path)`` tuples.
+    """
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=settings.HISTORY_RETENTION_DAYS)
+
+    if not dry_run:
+        delete_leftover_rows()
+
+    eligible = QueryHistory.objects.filter(created_at__lt=older_than)
+    archived = []
+    for month_start in eligible.datetimes('created_at', 'month', tzinfo=dt_timezone.utc):
+        month_start, month_end = _month_bounds(month_start)
+        rows = (
+            eligible
+            .filter(created_at__gte=month_start, created_at__lt=month_end)
+            .select_related('query_blob', 'response_blob')
+            .order_by('-created_at', '-id')
+        )
+        month = month_start.strftime('%Y-%m')
+        if dry_run:
+            archived.append((month, rows.count(), None))
+            continue
+
+        writer = SegmentWriter(month)
+        row_ids = []
+        blob_ids = set()
+        try:
+            for row in rows.iterator(chunk_size=chunk_size):
+                writer.add(row.created_at.timestamp(), QueryResponseSerializer(row).data)
+                row_ids.append(row.id)
+                blob_ids.update((row.query_blob_id, row.response_blob_id))
+        except BaseException:
+            writer.abort()
+            raise
+
+        segment_path = writer.commit()
+        _delete_archived_rows(row_ids, blob_ids)
+        archived.append((month, len(row_ids), segment_path))
+    return archived
+
+
+def delete_leftover_rows():
+    """
+    Delete rows that a committed segment already holds, left behind when a run
+    stopped between commit() and the delete. Returns how many were deleted.
+    """
+    row_ids = []
+    blob_ids = set()
+    for segment in list_segments():
+        runs = segment.index['id_runs']
+        for i in range(0, len(runs), RUN_BATCH_SIZE):
+            ranges = Q()
+            for first, last in runs[i:i + RUN_BATCH_SIZE]:
+                ranges |= Q(id__range=(first, last))
+            for row_id, query_blob_id, response_blob_id in QueryHistory.objects.filter(ranges).values_list(
+                'id', 'query_blob_id', 'response_blob_id'
+            ):
+                row_ids.append(row_id)
+                blob_ids.update((query_blob_id, response_blob_id))
+    if row_ids:
+        _delete_archived_rows(row_ids, blob_ids)
+    return len(row_ids)
+
+
+def _delete_archived_rows(row_ids, blob_ids):
+    """Drop rows that are now safely on disk, keeping their feedback"""
+    for i in range(0, len(row_ids), DELETE_BATCH_SIZE):
+        batch = row_ids[i:i + DELETE_BATCH_SIZE]
+        with transaction.atomic():
+            UserFeedback.objects.filter(query_history_id__in=batch).update(query_history=None)
+            QueryHistory.objects.filter(id__in=batch).delete()
+    TextBlob.objects.purge_orphans(blob_ids)
+    # The update() above does not send signals
+    bump('history', 'feedback')
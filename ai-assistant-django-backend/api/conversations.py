@@ -0,0 +1,149 @@
+"""
+Multi-turn conversations with a bounded prompt.
+
+A query sent with a ``conversation_id`` is prefixed with the conversation's
+rolling summary and its most recent turns, capped at
+``CONVERSATION_CONTEXT_TOKENS``. After each turn commits, a background worker
+checks whether the unsummarized turns have grown past
+``CONVERSATION_SUMMARIZE_AT`` tokens and, if so, asks Gemini to fold all but the
+newest ``CONVERSATION_KEEP_TURNS`` into the summary. Prompt size, and with it
+upstream latency, stays flat however long the conversation runs, and the
+summarization call never sits on a user's request path.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, ConversationTurn, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+
+Current summary (may be empty):
+{summary}
+
+New exchanges to fold into it:
+{turns}
+
+Write the updated summary in at most {words} words. Keep facts, names, numbers, decisions and open questions the user may refer back to; drop greetings and repetition. Reply with the summary only."""
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def create_conversation():
+    return Conversation.objects.create(session_id=uuid.uuid4().hex)
+
+
+def format_turns(turns):
+    return '\n\n'.join(f'User: {turn.query}\nAssistant: {turn.response}' for turn in turns)
+
+
+def context_turns(conversation):
+    """The newest unsummarized turns that fit in the context budget, oldest first"""
+    budget = settings.CONVERSATION_CONTEXT_TOKENS - estimate_tokens(conversation.summary)
+    turns = (
+        conversation.turns
+        .filter(position__gte=conversation.summarized_turns)
+        .select_related('query_blob', 'response_blob')
+        .order_by('-position')
+    )
+    kept = []
+    for turn in turns:
+        if turn.tokens > budget:
+            break
+        budget -= turn.tokens
+        kept.append(turn)
+    return kept[::-1]
+
+
+def with_context(conversation, prompt):
+    """Prefix ``prompt`` with the conversation's summary and recent turns"""
+    turns = context_turns(conversation)
+    if not conversation.summary and not turns:
+        return prompt
+    parts = ['Conversation so far (use it to resolve references in the new request):']
+    if conversation.summary:
+        parts.append(f'Summary of earlier turns:\n{conversation.summary}')
+    if turns:
+        parts.append(format_turns(turns))
+    parts.append(f'New request:\n{prompt}')
+    return '\n\n'.join(parts)
+
+
+def add_turn(conversation, query_history, client):
+    """Append ``query_history`` as the next turn and summarize in the background after commit"""
+    with transaction.atomic():
+        # The UPDATE locks the row, so concurrent turns get distinct positions
+        Conversation.objects.filter(pk=conversation.pk).update(
+            turn_count=F('turn_count') + 1, updated_at=timezone.now()
+        )
+        position = Conversation.objects.values_list('turn_count', flat=True).get(pk=conversation.pk) - 1
+        turn = ConversationTurn.objects.create(
+            conversation=conversation,
+            query_history=query_history,
+            query_blob=query_history.query_blob,
+            response_blob=query_history.response_blob,
+            position=position,
+            tokens=estimate_tokens(query_history.query) + estimate_tokens(query_history.response),
+        )
+    transaction.on_commit(lambda: _get_executor().submit(_summarize_task, conversation.pk, client))
+    return turn
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONVERSATION_SUMMARY_WORKERS,
+                thread_name_prefix='conversation-summary'
+            )
+    return _executor
+
+
+def _summarize_task(conversation_id, client):
+    try:
+        summarize(conversation_id, client)
+    except Exception:
+        logger.exception('Summarizing conversation %s failed', conversation_id)
+    finally:
+        # Worker threads get their own connections; don't leave them open
+        connections.close_all()
+
+
+def summarize(conversation_id, client):
+    """Fold older turns into the summary if the unsummarized context is too large"""
+    conversation = Conversation.objects.get(pk=conversation_id)
+    turns = list(
+        conversation.turns
+        .filter(position__gte=conversation.summarized_turns)
+        .select_related('query_blob', 'response_blob')
+    )
+    pending = estimate_tokens(conversation.summary) + sum(turn.tokens for turn in turns)
+    if not turns or pending <= settings.CONVERSATION_SUMMARIZE_AT:
+        return False
+
+    fold = turns[:max(len(turns) - settings.CONVERSATION_KEEP_TURNS, 1)]
+    result = client.generate_content(SUMMARY_PROMPT.format(
+        summary=conversation.summary or '(none)',
+        turns=format_turns(fold),
+        words=settings.CONVERSATION_SUMMARY_TOKENS * 3 // 4,
+    ))
+    if not result['success']:
+        logger.warning('Summarizing conversation %s failed: %s', conversation_id, result['error'])
+        return False
+
+    # Another worker may have summarized meanwhile; only the first one wins
+    return bool(
+        Conversation.objects
+        .filter(pk=conversation_id, summarized_turns=conversation.summarized_turns)
+        .update(summary=result['content'], summarized_turns=fold[-1].position + 1)
+    )
@@ -0,0 +1,21 @@
+"""SQLite connection tuning applied through the ``connection_created`` signal."""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(conn, pragmas):
+    """Run ``PRAGMA name = value`` for each entry on a DB-API connection"""
+    cursor = conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if pragmas:
+        apply_sqlite_pragmas(connection.connection, pragmas)
@@ -0,0 +1,127 @@
+"""
+Constant-memory NDJSON/CSV export of history and feedback.
+
+Rows are pulled with ``QuerySet.iterator(chunk_size=...)`` and rendered into
+~64 KB byte chunks for a ``StreamingHttpResponse``, optionally gzip-compressed
+on the fly, so the worker never holds more than one chunk of rows at a time.
+"""
+import csv
+import json
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+
+HISTORY_FIELDS = [
+    'id', 'function_type', 'style', 'query', 'response', 'processing_time',
+    'prompt_tokens', 'output_tokens', 'total_tokens', 'model_name', 'created_at'
+]
+FEEDBACK_FIELDS = [
+    'id', 'query_history', 'function_type', 'query', 'response', 'rating',
+    'suggestions', 'created_at'
+]
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+_datetime_field = serializers.DateTimeField()
+
+
+def history_rows(queryset, chunk_size=CHUNK_SIZE):
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': row.id,
+            'function_type': row.function_type,
+            'style': row.style,
+            'query': row.query,
+            'response': row.response,
+            'processing_time': row.processing_time,
+            'prompt_tokens': row.prompt_tokens,
+            'output_tokens': row.output_tokens,
+            'total_tokens': row.total_tokens,
+            'model_name': row.model_name,
+            'created_at': _datetime_field.to_representation(row.created_at),
+        }
+
+
+def feedback_rows(queryset, chunk_size=CHUNK_SIZE):
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': row.id,
+            'query_history': row.query_history_id,
+            'function_type': row.function_type,
+            'query': row.query,
+            'response': row.response,
+            'rating': row.rating,
+            'suggestions': row.suggestions,
+            'created_at': _datetime_field.to_representation(row.created_at),
+        }
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each written line"""
+
+    def write(self, value):
+        return value
+
+
+def _render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def _render_csv(rows, fields):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row.get(field) for field in fields])
+
+
+def _batched(lines):
+    """Join rendered lines into ~FLUSH_BYTES byte chunks"""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_response(rows, fields, output, gzip, name):
+    """Build the download response for an iterator of row dicts"""
+    content_type, extension = FORMATS[output]
+    if output == 'csv':
+        lines = _render_csv(rows, fields)
+    else:
+        lines = _render_ndjson(rows)
+
+    chunks = _batched(lines)
+    filename = f"{name}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    if gzip:
+        chunks = _gzipped(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,244 @@
+"""
+Sliding-window latency histograms, kept in process and merged across workers.
+
+Latencies are counted in log-linear buckets (the HdrHistogram layout):
+values below 64 µs get one bucket per microsecond, and every power of two
+above that is split into 32 equal sub-buckets, so any recorded value is
+known to within ~3% with under a thousand possible buckets up to an hour.
+Each series (endpoint, function_type, style) keeps one sparse bucket map per
+``LATENCY_SLOT_SECONDS`` slot for the last ``LATENCY_SLOTS`` slots, so memory
+is bounded and old samples fall out of the window on their own.
+
+Bucket maps are plain counts, so histograms merge by addition: a background
+thread in every worker process writes its slots to ``LATENCY_SNAPSHOT_DIR``
+every ``LATENCY_SNAPSHOT_INTERVAL`` seconds, off the request path, and
+/api/latency/ adds up the snapshots of all live processes.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS           # sub-buckets per power of two
+LINEAR_LIMIT = SUB_BUCKETS * 2               # values below this are exact
+MAX_MICROS = 3600 * 1_000_000                # larger values are clamped
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def bucket_index(micros):
+    value = min(max(int(micros), 0), MAX_MICROS)
+    if value < LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - (SUB_BUCKET_BITS + 1)
+    return LINEAR_LIMIT + (shift - 1) * SUB_BUCKETS + ((value >> shift) - SUB_BUCKETS)
+
+
+def bucket_bounds(index):
+    """Inclusive [low, high] microsecond range of a bucket"""
+    if index < LINEAR_LIMIT:
+        return index, index
+    shift = (index - LINEAR_LIMIT) // SUB_BUCKETS + 1
+    mantissa = (index - LINEAR_LIMIT) % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+def merge_counts(target, counts):
+    for index, count in counts.items():
+        target[index] = target.get(index, 0) + count
+    return target
+
+
+def summarize(counts):
+    """Count, percentiles and max (seconds) of a bucket map"""
+    total = sum(counts.values())
+    if not total:
+        return {'count': 0}
+    indexes = sorted(counts)
+    summary = {'count': total}
+    targets = [(pct, max(1, -(-total * pct // 100))) for pct in PERCENTILES]
+    seen = 0
+    position = 0
+    for index in indexes:
+        seen += counts[index]
+        while position < len(targets) and seen >= targets[position][1]:
+            low, high = bucket_bounds(index)
+            summary[f'p{targets[position][0]:g}'] = round((low + high) / 2 / 1e6, 6)
+            position += 1
+    summary['max'] = round(bucket_bounds(indexes[-1])[1] / 1e6, 6)
+    return summary
+
+
+class SlidingHistogram:
+    """Per-slot bucket maps for the most recent ``slots`` slots"""
+
+    def __init__(self, slot_seconds, slots):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self._slots = {}  # slot number -> {bucket index: count}
+
+    def record(self, seconds, now):
+        slot = int(now // self.slot_seconds)
+        counts = self._slots.get(slot)
+        if counts is None:
+            counts = self._slots[slot] = {}
+            for old in [s for s in self._slots if s <= slot - self.slots]:
+                del self._slots[old]
+        index = bucket_index(seconds * 1e6)
+        counts[index] = counts.get(index, 0) + 1
+
+    def snapshot(self):
+        return {slot: dict(counts) for slot, counts in self._slots.items()}
+
+
+_series = {}
+_lock = threading.Lock()
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _slot_seconds():
+    return settings.LATENCY_SLOT_SECONDS
+
+
+def record(endpoint, function_type, style, seconds, now=None):
+    now = time.time() if now is None else now
+    key = (endpoint, function_type or '', style or '')
+    with _lock:
+        histogram = _series.get(key)
+        if histogram is None:
+            histogram = _series[key] = SlidingHistogram(_slot_seconds(), settings.LATENCY_SLOTS)
+        histogram.record(seconds, now)
+    _ensure_flusher()
+
+
+def local_snapshot():
+    with _lock:
+        return {key: histogram.snapshot() for key, histogram in _series.items()}
+
+
+def _snapshot_path(pid=None):
+    return os.path.join(os.fspath(settings.LATENCY_SNAPSHOT_DIR), f'latency-{pid or os.getpid()}.json')
+
+
+def _ensure_flusher():
+    """Start this process's snapshot thread once (and again in a forked child)"""
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name='latency-snapshots', daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.LATENCY_SNAPSHOT_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Writing the latency snapshot failed')
+
+
+def flush(now=None):
+    directory = os.fspath(settings.LATENCY_SNAPSHOT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    payload = {
+        'pid': os.getpid(),
+        'written_at': time.time() if now is None else now,
+        'slot_seconds': _slot_seconds(),
+        'series': [
+            {'key': list(key), 'slots': {str(slot): counts for slot, counts in slots.items()}}
+            for key, slots in local_snapshot().items()
+        ],
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(tmp_path, _snapshot_path())
+
+
+def _other_snapshots(now):
+    """Snapshots written by other live processes; stale files are removed"""
+    directory = os.fspath(settings.LATENCY_SNAPSHOT_DIR)
+    if not os.path.isdir(directory):
+        return
+    horizon = settings.LATENCY_SLOTS * _slot_seconds()
+    own = os.path.basename(_snapshot_path())
+    for name in os.listdir(directory):
+        if not name.startswith('latency-') or not name.endswith('.json') or name == own:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'r') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - payload.get('written_at', 0) > horizon:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        if payload.get('slot_seconds') != _slot_seconds():
+            continue
+        yield {
+            tuple(series['key']): {
+                int(slot): {int(index): count for index, count in counts.items()}
+                for slot, counts in series['slots'].items()
+            }
+            for series in payload['series']
+        }
+
+
+def merged(now=None):
+    """(series -> slot -> bucket map across all processes, number of processes merged)"""
+    now = time.time() if now is None else now
+    snapshots = [local_snapshot()] + list(_other_snapshots(now))
+    combined = {}
+    for snapshot in snapshots:
+        for key, slots in snapshot.items():
+            target = combined.setdefault(key, {})
+            for slot, counts in slots.items():
+                merge_counts(target.setdefault(slot, {}), counts)
+    return combined, len(snapshots)
+
+
+def window_summaries(windows, endpoint=None, function_type=None, style=None, now=None):
+    """Percentiles per series over each of the most recent ``windows`` (seconds)"""
+    now = time.time() if now is None else now
+    combined, processes = merged(now)
+    current = int(now // _slot_seconds())
+    results = []
+    for (key_endpoint, key_function, key_style), slots in sorted(combined.items()):
+        if endpoint and key_endpoint != endpoint:
+            continue
+        if function_type and key_function != function_type:
+            continue
+        if style and key_style != style:
+            continue
+        summaries = {}
+        for window in windows:
+            first = current - max(1, -(-window // _slot_seconds())) + 1
+            counts = {}
+            for slot, bucket_counts in slots.items():
+                if slot >= first:
+                    merge_counts(counts, bucket_counts)
+            summaries[f'{window}s'] = summarize(counts)
+        results.append({
+            'endpoint': key_endpoint,
+            'function_type': key_function,
+            'style': key_style,
+            'windows': summaries,
+        })
+    return results, processes
@@ -0,0 +1,96 @@
+"""
+Conditional GET for the read endpoints the frontend polls.
+
+Each cached resource ('history', 'feedback') has a version token in the
+'versions' cache, which is file based so all worker processes share it. Any
+QueryHistory or UserFeedback save or delete replaces the token (signals wired
+up in ApiConfig.ready); bulk paths that bypass signals call bump() themselves.
+ETags are built from these tokens plus the request path and query string, so
+``django.views.decorators.http.condition`` can answer If-None-Match with a 304
+before the view runs a single query.
+
+Tokens are replaced with fresh random values rather than incremented, so two
+concurrent bumps can never leave a token a client has already seen.
+"""
+import hashlib
+import secrets
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+RESOURCES = {
+    'api.QueryHistory': 'history',
+    'api.UserFeedback': 'feedback',
+}
+
+
+def _key(resource):
+    return f'version:{resource}'
+
+
+def _new_token():
+    return f'{time.time_ns():x}{secrets.token_hex(4)}'
+
+
+def bump(*resources):
+    """Invalidate ETags of ``resources`` once the current transaction commits"""
+    def replace_tokens():
+        caches['versions'].set_many(
+            {_key(resource): _new_token() for resource in resources}, timeout=None
+        )
+    # Bumping before the commit would let a request read the old rows and
+    # cache them under the new token
+    transaction.on_commit(replace_tokens)
+
+
+def versions(resources):
+    cache = caches['versions']
+    found = cache.get_many([_key(resource) for resource in resources])
+    tokens = []
+    for resource in resources:
+        token = found.get(_key(resource))
+        if token is None:
+            token = _new_token()
+            # add() keeps a token another worker may have just created
+            if not cache.add(_key(resource), token, timeout=None):
+                token = cache.get(_key(resource), token)
+        tokens.append(token)
+    return tokens
+
+
+def etag_for(*resources):
+    """``condition(etag_func=...)`` callable for views that read ``resources``"""
+    def etag_func(request, *args, **kwargs):
+        parts = versions(resources) + [request.path, request.GET.urlencode()]
+        return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=12).hexdigest()
+    return etag_func
+
+
+def static_etag(body):
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def cache_success(**directives):
+    """
+    Like ``@cache_control``, but only for 200 and 304 responses, so shared
+    caches never keep an error for the success max-age
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, **directives)
+            return response
+        return wrapper
+    return decorator
+
+
+def bump_for_instance(sender, **kwargs):
+    """post_save/post_delete receiver"""
+    resource = RESOURCES.get(sender._meta.label)
+    if resource:
+        bump(resource)
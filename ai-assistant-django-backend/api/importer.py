@@ -0,0 +1,255 @@
+"""
+Streaming import of CLI feedback files and session logs.
+
+Files are parsed incrementally (JSON arrays, JSON Lines and concatenated
+objects all work) and written with batched ``bulk_create`` calls, one
+transaction per batch. Every imported row carries a content hash so the same
+record coming from several files or several runs is stored once, and a
+per-file checkpoint records the byte offset after the last committed record,
+so an interrupted import seeks straight back to where it stopped.
+"""
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .http_cache import RESOURCES, bump
+from .models import QueryHistory, UserFeedback
+
+READ_SIZE = 1 << 20
+_decoder = json.JSONDecoder()
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_json_records(fp, read_size=READ_SIZE):
+    """Yield top-level objects from a text stream without loading it whole"""
+    for record, _ in iter_json_offsets(fp, read_size=read_size):
+        yield record
+
+
+def iter_json_offsets(fp, start=0, read_size=READ_SIZE):
+    """
+    Like iter_json_records(), yielding ``(record, offset)`` where ``offset`` is
+    the UTF-8 byte offset just past the record. ``fp`` must not translate
+    newlines (open it with ``newline=''``) and be positioned at byte ``start``.
+    """
+    buffer = ''
+    pos = 0
+    # Byte offset of buffer[mark]; bytes are counted lazily, slice by slice
+    mark = 0
+    offset = start
+    eof = False
+    started = False
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            offset += len(buffer[mark:].encode('utf-8'))
+            buffer = fp.read(read_size)
+            pos = mark = 0
+            eof = not buffer
+
+        if pos >= len(buffer):
+            return
+        if not started:
+            started = True
+            if buffer[pos] == '[':
+                pos += 1
+                continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            record, pos = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The object straddles the end of the buffer; read more and retry,
+            # growing the read so one huge record is not re-parsed many times.
+            more = fp.read(max(read_size, len(buffer) - pos))
+            offset += len(buffer[mark:pos].encode('utf-8'))
+            buffer = buffer[pos:] + more
+            pos = mark = 0
+            eof = not more
+            continue
+        offset += len(buffer[mark:pos].encode('utf-8'))
+        mark = pos
+        if isinstance(record, dict):
+            yield record, offset
+
+
+def content_hash(*parts):
+    return hashlib.sha256(
+        json.dumps(parts, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+
+
+def _parse_timestamp(value):
+    created_at = parse_datetime(value) if isinstance(value, str) else None
+    if created_at is None:
+        return None
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at
+
+
+def feedback_from_record(record):
+    """Map a CLI feedback record to an unsaved UserFeedback, or None if invalid"""
+    try:
+        rating = int(record['rating'])
+        function_type = str(record['function_type'])
+        query = str(record.get('query', ''))
+        response = str(record.get('response', ''))
+    except (KeyError, TypeError, ValueError):
+        return None
+    created_at = _parse_timestamp(record.get('timestamp'))
+    if not 1 <= rating <= 5 or created_at is None:
+        return None
+    suggestions = str(record.get('suggestions') or '')
+    return UserFeedback(
+        function_type=function_type,
+        query=query,
+        response=response,
+        rating=rating,
+        suggestions=suggestions,
+        created_at=created_at,
+        content_hash=content_hash(
+            'feedback', function_type, query, response, rating, suggestions,
+            record.get('timestamp')
+        ),
+    )
+
+
+def _token_count(usage, key):
+    value = usage.get(key) if isinstance(usage, dict) else None
+    return value if isinstance(value, int) and value >= 0 else None
+
+
+def history_from_record(record):
+    """Map a CLI session-log interaction to an unsaved QueryHistory, or None if invalid"""
+    function_type = record.get('function') or record.get('function_type')
+    style = record.get('style')
+    created_at = _parse_timestamp(record.get('timestamp'))
+    if not function_type or not style or created_at is None or 'response' not in record:
+        return None
+    query = str(record.get('query', ''))
+    response = str(record['response'])
+    processing_time = record.get('total_time', record.get('processing_time'))
+    usage = record.get('usage')
+    return QueryHistory(
+        function_type=function_type,
+        style=style,
+        query=query,
+        response=response,
+        processing_time=processing_time if isinstance(processing_time, (int, float)) else None,
+        prompt_tokens=_token_count(usage, 'prompt_tokens'),
+        output_tokens=_token_count(usage, 'output_tokens'),
+        total_tokens=_token_count(usage, 'total_tokens'),
+        model_name=str(record.get('model') or '')[:100],
+        created_at=created_at,
+        content_hash=content_hash(
+            'history', function_type, style, query, response, record.get('timestamp')
+        ),
+    )
+
+
+class Checkpoints:
+    """Records how far into each source file records have been committed"""
+
+    def __init__(self, path=None):
+        self.path = os.fspath(path or settings.IMPORT_CHECKPOINT_FILE)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def resume_point(self, source):
+        """
+        ``(records, offset)`` already imported from ``source``: the record
+        count and the byte offset after the last one. ``(0, 0)`` if the file
+        was rewritten.
+        """
+        entry = self.data.get(os.path.abspath(source))
+        if not entry:
+            return 0, 0
+        # Append-only files only ever grow; a smaller file has been replaced.
+        if os.path.getsize(source) < entry.get('size', 0):
+            return 0, 0
+        return entry['records'], entry['offset']
+
+    def update(self, source, records, offset):
+        self.data[os.path.abspath(source)] = {
+            'records': records,
+            'offset': offset,
+            'size': os.path.getsize(source),
+            'updated_at': timezone.now().isoformat(),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, source):
+        self.data.pop(os.path.abspath(source), None)
+
+
+def _insert_batch(model, objs):
+    """Insert objects whose content hash is not stored yet; returns the count actually inserted"""
+    hashes = [obj.content_hash for obj in objs]
+    existing = set(
+        model.objects.filter(content_hash__in=hashes).values_list('content_hash', flat=True)
+    )
+    fresh = {}
+    for obj in objs:
+        if obj.content_hash not in existing:
+            fresh.setdefault(obj.content_hash, obj)
+    if not fresh:
+        return 0
+    objs = model.resolve_text_blobs(list(fresh.values()))
+    model.objects.bulk_create(objs, ignore_conflicts=True)
+    bump(RESOURCES[model._meta.label])
+    # None of these hashes were stored at the check above (same transaction),
+    # so the ones present now are the rows ignore_conflicts did not skip
+    return model.objects.filter(content_hash__in=list(fresh)).count()
+
+
+def import_file(source, build, model, checkpoints, batch_size=1000, resume=True):
+    """
+    Import one file; ``build`` maps a raw record to an unsaved model instance.
+    Returns ``{'read', 'inserted', 'skipped_invalid', 'resumed_from'}``.
+    """
+    start, offset = checkpoints.resume_point(source) if resume else (0, 0)
+    stats = {'read': 0, 'inserted': 0, 'skipped_invalid': 0, 'resumed_from': start}
+    batch = []
+    position = start
+
+    def flush():
+        with transaction.atomic():
+            stats['inserted'] += _insert_batch(model, batch)
+        checkpoints.update(source, position, offset)
+        batch.clear()
+
+    with open(source, 'rb') as raw:
+        raw.seek(offset)
+        fp = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        for record, offset in iter_json_offsets(fp, start=offset):
+            position += 1
+            stats['read'] += 1
+            obj = build(record)
+            if obj is None:
+                stats['skipped_invalid'] += 1
+            else:
+                batch.append(obj)
+            if len(batch) >= batch_size:
+                flush()
+    if batch or stats['read']:
+        flush()
+    return stats
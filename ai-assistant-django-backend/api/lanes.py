@@ -0,0 +1,127 @@
+"""
+Execution lanes for upstream Gemini calls.
+
+Each query is assigned a lane (its function type, or 'long_input' when the
+prompt is larger than QUERY_LANE_LONG_INPUT_CHARS). A lane has its own queue
+and concurrency limit, and all lanes share QUERY_LANE_SLOTS slots per worker
+process. When a slot frees up, lanes with waiting requests are served by
+stride scheduling: every admission advances the lane's pass by 1/weight and
+the lane with the lowest pass goes next, so under contention lanes get slots
+in proportion to their weights. A handful of minute-long summarizations can
+then fill only their own lane, never every slot.
+
+Limits are per process and requests wait on a thread, so this needs a
+threaded server with more threads than slots: runserver in development,
+gunicorn with the gthread workers of gunicorn.conf.py (which refuses to start
+otherwise) in production.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class LaneTimeout(Exception):
+    def __init__(self, lane, waited):
+        super().__init__(f'No free slot in lane {lane!r} after {waited:.1f}s')
+        self.lane = lane
+        self.waited = waited
+
+
+class Lane:
+    def __init__(self, name, concurrency, weight):
+        self.name = name
+        self.concurrency = concurrency
+        self.weight = weight
+        self.active = 0
+        self.waiting = deque()
+        self.pass_value = 0.0
+
+
+class LaneScheduler:
+    def __init__(self, lanes, slots):
+        self.lanes = {
+            name: Lane(name, config['concurrency'], config['weight']) for name, config in lanes.items()
+        }
+        self.slots = slots
+        self.active = 0
+        self._virtual_time = 0.0
+        self._admitted = set()
+        self._cond = threading.Condition()
+
+    def _dispatch(self):
+        admitted = False
+        while self.active < self.slots:
+            ready = [
+                lane for lane in self.lanes.values()
+                if lane.waiting and lane.active < lane.concurrency
+            ]
+            if not ready:
+                break
+            lane = min(ready, key=lambda lane: lane.pass_value)
+            self._admitted.add(lane.waiting.popleft())
+            lane.active += 1
+            self.active += 1
+            self._virtual_time = lane.pass_value
+            lane.pass_value += 1.0 / lane.weight
+            admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def acquire(self, name, timeout):
+        """Wait for a slot in lane ``name``; returns seconds waited or raises LaneTimeout"""
+        lane = self.lanes[name]
+        ticket = object()
+        enqueued = time.perf_counter()
+        deadline = enqueued + timeout
+        with self._cond:
+            if not lane.waiting and not lane.active:
+                # An idle lane must not bank credit for the time it was idle
+                lane.pass_value = max(lane.pass_value, self._virtual_time)
+            lane.waiting.append(ticket)
+            self._dispatch()
+            while ticket not in self._admitted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    lane.waiting.remove(ticket)
+                    raise LaneTimeout(name, time.perf_counter() - enqueued)
+                self._cond.wait(remaining)
+            self._admitted.discard(ticket)
+        return time.perf_counter() - enqueued
+
+    def release(self, name):
+        with self._cond:
+            self.lanes[name].active -= 1
+            self.active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, name, timeout):
+        waited = self.acquire(name, timeout)
+        try:
+            yield waited
+        finally:
+            self.release(name)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LaneScheduler(settings.QUERY_LANES, settings.QUERY_LANE_SLOTS)
+    return _scheduler
+
+
+def lane_for(function_type, prompt):
+    if len(prompt) > settings.QUERY_LANE_LONG_INPUT_CHARS:
+        return 'long_input'
+    if function_type in settings.QUERY_LANES:
+        return function_type
+    return 'question_answering'
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_history
+
+
+class Command(BaseCommand):
+    help = "Move old QueryHistory rows into compressed per-month segment files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.HISTORY_RETENTION_DAYS,
+            help='Archive rows older than this many days'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many rows each month would archive'
+        )
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f"Archiving history created before {older_than.isoformat()}")
+
+        results = archive_history(
+            older_than, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+        )
+        if not results:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        total = 0
+        for month, rows, segment_path in results:
+            total += rows
+            target = segment_path or '(dry run)'
+            self.stdout.write(f"  {month}: {rows} rows -> {target}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} rows"))
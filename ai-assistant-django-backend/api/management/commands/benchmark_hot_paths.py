@@ -0,0 +1,159 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api import views
+from api.models import QueryHistory, UserFeedback
+from api.serializers import QueryRequestSerializer
+from api.utils import AdvancedPromptEngine
+
+QUERY = 'Explain how photosynthesis turns light into chemical energy, step by step.'
+
+
+def _prompt_engine():
+    for function_type, _ in QueryHistory.FUNCTION_CHOICES:
+        for style in AdvancedPromptEngine.get_available_styles(function_type):
+            AdvancedPromptEngine.get_prompt(function_type, style['id'], QUERY)
+
+
+def _request_serializer():
+    serializer = QueryRequestSerializer(data={
+        'function_type': 'question_answering', 'style': 'analytical', 'query': QUERY
+    })
+    serializer.is_valid(raise_exception=True)
+
+
+def _view(view, path, params=None):
+    factory = RequestFactory()
+
+    def call():
+        response = view(factory.get(path, params or {}))
+        response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}: {response.content[:200]!r}')
+
+    return call
+
+
+BENCHMARKS = {
+    'prompt_engine.get_prompt': _prompt_engine,
+    'QueryRequestSerializer.is_valid': _request_serializer,
+    'get_feedback_stats': _view(views.get_feedback_stats, '/api/feedback-stats/'),
+    'get_query_history': _view(views.get_query_history, '/api/history/'),
+    'get_query_history.deep_page': _view(
+        views.get_query_history, '/api/history/', {'page': 500, 'page_size': 50}
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time backend hot paths on the current database and compare them with a "
+        "stored baseline, flagging regressions beyond a threshold"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-time', type=float, default=1.0,
+            help='Seconds to spend timing each benchmark (after warmup)'
+        )
+        parser.add_argument('--max-runs', type=int, default=10000)
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Relative median slowdown reported as a regression'
+        )
+        parser.add_argument('--baseline', default=str(settings.BENCHMARK_BASELINE_FILE))
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Store this run as the new baseline instead of comparing'
+        )
+        parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Run only these benchmarks')
+
+    def handle(self, *args, **options):
+        rows = {
+            'history': QueryHistory.objects.count(),
+            'feedback': UserFeedback.objects.count(),
+        }
+        self.stdout.write(f"Table sizes: {rows['history']} history, {rows['feedback']} feedback rows")
+
+        results = {}
+        for name in options['only'] or BENCHMARKS:
+            results[name] = self._time(BENCHMARKS[name], options['min_time'], options['max_runs'])
+
+        if options['save_baseline']:
+            self._save(options['baseline'], rows, results)
+            self._report(results, {}, options['threshold'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = self._load(options['baseline'], rows)
+        regressions = self._report(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) regressed by more than "
+                f"{options['threshold']:.0%}: {', '.join(regressions)}"
+            )
+
+    def _time(self, func, min_time, max_runs):
+        for _ in range(3):
+            func()
+        samples = []
+        deadline = time.perf_counter() + min_time
+        while len(samples) < max_runs and (len(samples) < 5 or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        return {
+            'runs': len(samples),
+            'median_us': statistics.median(samples) * 1e6,
+            'p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6,
+        }
+
+    def _save(self, path, rows, results):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'results': results}, f, indent=2)
+
+    def _load(self, path, rows):
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {path}; run with --save-baseline to create one."
+            ))
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for table, count in baseline.get('rows', {}).items():
+            if count and abs(rows.get(table, 0) - count) / count > 0.1:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was taken with {count} {table} rows, now {rows.get(table, 0)}; "
+                    f"table-size dependent timings are not comparable."
+                ))
+        return baseline.get('results', {})
+
+    def _report(self, results, baseline, threshold):
+        header = f"{'benchmark':<34} {'runs':>6} {'median µs':>11} {'p95 µs':>11} {'baseline':>11} {'change':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        regressions = []
+        for name, result in results.items():
+            line = f"{name:<34} {result['runs']:>6} {result['median_us']:>11.1f} {result['p95_us']:>11.1f}"
+            previous = baseline.get(name)
+            if previous is None:
+                self.stdout.write(f"{line} {'-':>11} {'-':>8}")
+                continue
+            change = result['median_us'] / previous['median_us'] - 1
+            line = f"{line} {previous['median_us']:>11.1f} {change:>+8.1%}"
+            if change > threshold:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSION"))
+            elif change < -threshold:
+                self.stdout.write(self.style.SUCCESS(f"{line}  faster"))
+            else:
+                self.stdout.write(line)
+        return regressions
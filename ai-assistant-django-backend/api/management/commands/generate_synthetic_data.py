@@ -0,0 +1,158 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.http_cache import bump
+from api.models import QueryHistory, TextBlob, UserFeedback
+from api.utils import AdvancedPromptEngine
+
+TOPICS = [
+    'photosynthesis', 'the French Revolution', 'quantum computing', 'climate change',
+    'machine learning', 'the Roman Empire', 'supply chain management', 'black holes',
+    'renewable energy', 'the human immune system', 'cryptography', 'urban planning',
+    'the stock market', 'plate tectonics', 'remote work', 'electric vehicles',
+]
+QUESTION_FORMS = [
+    'What is {topic}?', 'How does {topic} work?', 'Why is {topic} important?',
+    'Explain {topic} to a beginner.', 'What are the main criticisms of {topic}?',
+]
+SUMMARY_FORMS = [
+    'Summarize this article about {topic}: {body}',
+    'Give me the key points of the following report on {topic}. {body}',
+]
+CREATIVE_FORMS = [
+    'Write a short story involving {topic}.', 'Draft a product pitch inspired by {topic}.',
+    'Write a poem about {topic}.', 'Come up with a blog post outline on {topic}.',
+]
+SENTENCES = [
+    'Researchers have studied {topic} for decades.',
+    'Recent work on {topic} has changed how practitioners approach the problem.',
+    'Critics argue that the benefits of {topic} are often overstated.',
+    'The economic impact of {topic} is expected to grow over the next ten years.',
+    'Several case studies show how {topic} plays out in practice.',
+    'Understanding {topic} requires some background in the underlying principles.',
+    'There is still no consensus on the long-term effects of {topic}.',
+]
+SUGGESTIONS = ['', '', '', 'More examples please.', 'Too long.', 'Great answer!', 'Cite sources.']
+
+# Skewed towards good ratings, as real feedback tends to be
+RATING_WEIGHTS = [5, 8, 17, 35, 35]
+
+
+def _paragraph(rng, topic, sentences):
+    return ' '.join(rng.choice(SENTENCES).format(topic=topic) for _ in range(sentences))
+
+
+def _query_text(rng, function_type, topic):
+    if function_type == 'question_answering':
+        return rng.choice(QUESTION_FORMS).format(topic=topic)
+    if function_type == 'text_summarization':
+        body = _paragraph(rng, topic, rng.randint(8, 40))
+        return rng.choice(SUMMARY_FORMS).format(topic=topic, body=body)
+    return rng.choice(CREATIVE_FORMS).format(topic=topic)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-insert realistic synthetic QueryHistory and UserFeedback rows, "
+        "for benchmarking at production-like table sizes (use a scratch database)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=100000, help='QueryHistory rows to create')
+        parser.add_argument(
+            '--feedback-ratio', type=float, default=0.2,
+            help='Fraction of history rows that get a UserFeedback row'
+        )
+        parser.add_argument(
+            '--distinct-texts', type=int, default=5000,
+            help='Distinct query/response texts to draw from (TextBlob rows are shared)'
+        )
+        parser.add_argument('--days', type=int, default=180, help='Spread created_at over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        pool = self._text_pool(rng, options['distinct_texts'])
+        blobs = TextBlob.objects.store_many(
+            [text for entry in pool for text in (entry[2], entry[3])]
+        )
+        self.stdout.write(
+            f"Text pool: {len(pool)} query/response pairs ({time.perf_counter() - started:.1f}s)"
+        )
+
+        now = timezone.now()
+        span = options['days'] * 86400
+        batch_size = options['batch_size']
+        created = feedback = 0
+        while created < options['history']:
+            count = min(batch_size, options['history'] - created)
+            history = []
+            for _ in range(count):
+                function_type, style, query, response = rng.choice(pool)
+                prompt_tokens = len(query) // 4 + 60
+                output_tokens = len(response) // 4
+                history.append(QueryHistory(
+                    function_type=function_type,
+                    style=style,
+                    query_blob=blobs[query],
+                    response_blob=blobs[response],
+                    processing_time=round(rng.lognormvariate(0.3, 0.5), 3),
+                    prompt_tokens=prompt_tokens,
+                    output_tokens=output_tokens,
+                    total_tokens=prompt_tokens + output_tokens,
+                    model_name='gemini-2.0-flash',
+                    created_at=now - timedelta(seconds=rng.random() * span),
+                ))
+
+            with transaction.atomic():
+                # Rows come back with primary keys on backends that support
+                # RETURNING (SQLite 3.35+, PostgreSQL), so feedback can link them
+                QueryHistory.objects.bulk_create(history, batch_size=batch_size)
+                feedbacks = [
+                    UserFeedback(
+                        query_history=row if row.pk else None,
+                        function_type=row.function_type,
+                        query_blob=row.query_blob,
+                        response_blob=row.response_blob,
+                        rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                        suggestions=rng.choice(SUGGESTIONS),
+                        created_at=row.created_at + timedelta(seconds=rng.randint(5, 600)),
+                    )
+                    for row in history if rng.random() < options['feedback_ratio']
+                ]
+                UserFeedback.objects.bulk_create(feedbacks, batch_size=batch_size)
+
+            created += count
+            feedback += len(feedbacks)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {created} history / {feedback} feedback rows ({created / elapsed:,.0f} rows/s)")
+
+        bump('history', 'feedback')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} history and {feedback} feedback rows "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _text_pool(self, rng, size):
+        """(function_type, style, query, response) tuples with distinct texts"""
+        styles = {
+            function_type: [style['id'] for style in AdvancedPromptEngine.get_available_styles(function_type)]
+            for function_type, _ in QueryHistory.FUNCTION_CHOICES
+        }
+        pool = []
+        for i in range(size):
+            function_type = rng.choice(list(styles))
+            topic = rng.choice(TOPICS)
+            query = f"{_query_text(rng, function_type, topic)} (#{i})"
+            length = rng.randint(3, 12) if function_type == 'text_summarization' else rng.randint(6, 40)
+            response = _paragraph(rng, topic, length)
+            pool.append((function_type, rng.choice(styles[function_type]), query, f"{response} [{i}]"))
+        return pool
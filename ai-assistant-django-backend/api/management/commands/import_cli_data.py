@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import (
+    Checkpoints, feedback_from_record, history_from_record, import_file
+)
+from api.models import QueryHistory, UserFeedback
+
+
+class Command(BaseCommand):
+    help = (
+        "Import CLI feedback files and session logs into UserFeedback and "
+        "QueryHistory, de-duplicating on content and resuming from checkpoints"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--feedback', nargs='*', default=None,
+            help='Feedback files (JSON array or JSON Lines). Defaults to FEEDBACK_FILE.'
+        )
+        parser.add_argument(
+            '--sessions', nargs='*', default=None,
+            help='Session log files (JSON array or JSON Lines). Defaults to SESSION_LOG.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore saved checkpoints and re-read every file from the start'
+        )
+
+    def handle(self, *args, **options):
+        feedback_files = options['feedback']
+        session_files = options['sessions']
+        if feedback_files is None and session_files is None:
+            feedback_files = [settings.FEEDBACK_FILE]
+            session_files = [settings.SESSION_LOG]
+
+        jobs = [
+            (path, feedback_from_record, UserFeedback) for path in feedback_files or []
+        ] + [
+            (path, history_from_record, QueryHistory) for path in session_files or []
+        ]
+        checkpoints = Checkpoints()
+
+        for path, build, model in jobs:
+            path = os.fspath(path)
+            if not os.path.exists(path):
+                self.stdout.write(self.style.WARNING(f"Skipping {path}: file not found"))
+                continue
+            try:
+                stats = import_file(
+                    path, build, model, checkpoints,
+                    batch_size=options['batch_size'], resume=not options['restart']
+                )
+            except ValueError as e:
+                raise CommandError(f"Could not parse {path}: {e}")
+
+            resumed = f" (resumed after {stats['resumed_from']})" if stats['resumed_from'] else ''
+            self.stdout.write(
+                f"{path}{resumed}: read {stats['read']}, inserted {stats['inserted']} "
+                f"into {model.__name__}, "
+                f"{stats['read'] - stats['inserted'] - stats['skipped_invalid']} duplicates, "
+                f"{stats['skipped_invalid']} invalid"
+            )
+        self.stdout.write(self.style.SUCCESS("Import complete"))
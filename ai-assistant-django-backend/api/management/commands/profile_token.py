@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-Profile header value that makes ProfilingMiddleware profile a request"
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            self.stderr.write("PROFILING_ENABLED is off; the header will be ignored until it is set.")
+        self.stdout.write(make_token())
+        minutes = settings.PROFILING_TOKEN_MAX_AGE // 60
+        self.stderr.write(f"Valid for {minutes} minutes, e.g. curl -H 'X-Profile: <token>' ...")
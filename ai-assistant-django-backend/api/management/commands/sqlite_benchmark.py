@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.db import apply_sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bench_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    function_type VARCHAR(50) NOT NULL,
+    style VARCHAR(50) NOT NULL,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL,
+    processing_time REAL,
+    created_at TEXT NOT NULL
+)
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS bench_history_created ON bench_history (created_at)"
+INSERT = (
+    "INSERT INTO bench_history "
+    "(function_type, style, query, response, processing_time, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SELECT = (
+    "SELECT id, function_type, style, query, response, processing_time, created_at "
+    "FROM bench_history ORDER BY created_at DESC LIMIT 20"
+)
+
+# Python's sqlite3 default, which is what Django uses when OPTIONS is empty
+STOCK_TIMEOUT = 5.0
+# How long past the run's duration to wait for a worker's report
+REPORT_GRACE = 30.0
+
+
+def _connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=STOCK_TIMEOUT, isolation_level=None)
+    if pragmas:
+        apply_sqlite_pragmas(conn, pragmas)
+    return conn
+
+
+def _row(rng):
+    return (
+        rng.choice(['question_answering', 'text_summarization', 'creative_generation']),
+        rng.choice(['factual', 'concise', 'storytelling']),
+        'benchmark query ' * rng.randint(1, 40),
+        'benchmark response ' * rng.randint(20, 400),
+        rng.random() * 5,
+        time.strftime('%Y-%m-%dT%H:%M:%S') + f'.{rng.randint(0, 999999):06d}',
+    )
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _contention_worker(path, pragmas, write_ratio, duration, start_event, results, seed):
+    """Hammer the database with a read/write mix until the deadline; always reports"""
+    try:
+        stats = _contend(path, pragmas, write_ratio, duration, start_event, seed)
+    except Exception as e:
+        stats = {'error': f'{type(e).__name__}: {e}'}
+    results.put(stats)
+
+
+def _contend(path, pragmas, write_ratio, duration, start_event, seed):
+    rng = random.Random(seed)
+    conn = _connect(path, pragmas)
+    stats = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0, 'write_latencies': []}
+
+    start_event.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        is_write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if is_write:
+                conn.execute(INSERT, _row(rng))
+                stats['writes'] += 1
+                stats['write_latencies'].append(time.perf_counter() - started)
+            else:
+                conn.execute(SELECT).fetchall()
+                stats['reads'] += 1
+        except sqlite3.OperationalError as e:
+            if not _is_lock_error(e):
+                raise
+            stats['write_errors' if is_write else 'read_errors'] += 1
+
+    conn.close()
+    return stats
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Multi-process read/write contention benchmark comparing stock SQLite "
+        "with the SQLITE_PRAGMAS profile"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile')
+        parser.add_argument('--write-ratio', type=float, default=0.5)
+        parser.add_argument('--seed-rows', type=int, default=1000)
+        parser.add_argument(
+            '--profile', choices=['stock', 'tuned', 'both'], default='both'
+        )
+
+    def handle(self, *args, **options):
+        profiles = []
+        if options['profile'] in ('stock', 'both'):
+            profiles.append(('stock', {}))
+        if options['profile'] in ('tuned', 'both'):
+            profiles.append(('tuned', dict(getattr(settings, 'SQLITE_PRAGMAS', {}))))
+
+        self.stdout.write(
+            f"{options['processes']} processes, {options['duration']}s per profile, "
+            f"{options['write_ratio']:.0%} writes"
+        )
+        header = f"{'profile':<8} {'reads/s':>10} {'writes/s':>10} {'read err%':>10} {'write err%':>11} {'write p99 ms':>13}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for name, pragmas in profiles:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._prepare(path, pragmas, options['seed_rows'])
+                totals = self._run(path, pragmas, options)
+            self._report(name, totals, options['duration'])
+
+    def _prepare(self, path, pragmas, seed_rows):
+        conn = _connect(path, pragmas)
+        conn.execute(SCHEMA)
+        conn.execute(INDEX)
+        rng = random.Random(0)
+        conn.execute('BEGIN')
+        conn.executemany(INSERT, [_row(rng) for _ in range(seed_rows)])
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _run(self, path, pragmas, options):
+        ctx = multiprocessing.get_context()
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        workers = [
+            ctx.Process(
+                target=_contention_worker,
+                args=(path, pragmas, options['write_ratio'], options['duration'],
+                      start_event, results, seed)
+            )
+            for seed in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        start_event.set()
+
+        totals = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0, 'write_latencies': []}
+        failures = []
+        for _ in workers:
+            try:
+                stats = results.get(timeout=options['duration'] + REPORT_GRACE)
+            except queue.Empty:
+                failures.append('a worker did not report back')
+                break
+            if 'error' in stats:
+                failures.append(stats['error'])
+                continue
+            for key, value in stats.items():
+                totals[key] += value
+        for worker in workers:
+            worker.join(timeout=REPORT_GRACE)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        if failures:
+            raise CommandError(f"Benchmark worker failed: {'; '.join(failures)}")
+        return totals
+
+    def _report(self, name, totals, duration):
+        reads = totals['reads'] + totals['read_errors']
+        writes = totals['writes'] + totals['write_errors']
+        read_err = totals['read_errors'] / reads if reads else 0
+        write_err = totals['write_errors'] / writes if writes else 0
+        p99 = _percentile(totals['write_latencies'], 99) * 1000
+        self.stdout.write(
+            f"{name:<8} {totals['reads'] / duration:>10.0f} {totals['writes'] / duration:>10.0f} "
+            f"{read_err:>10.2%} {write_err:>11.2%} {p99:>13.1f}"
+        )
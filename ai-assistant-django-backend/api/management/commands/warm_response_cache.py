@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import response_cache
+from api.utils import AdvancedPromptEngine, GeminiClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Load answers to the most frequent recent queries into the response cache, "
+        "regenerating stale ones through Gemini within a call and token budget"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=settings.RESPONSE_CACHE_WARM_KEYS)
+        parser.add_argument('--days', type=int, default=settings.RESPONSE_CACHE_WARM_DAYS)
+        parser.add_argument(
+            '--refresh-older-than', type=float, default=None, metavar='HOURS',
+            help='Regenerate answers older than this many hours (default: never regenerate)'
+        )
+        parser.add_argument('--max-calls', type=int, default=50, help='Gemini call budget for regeneration')
+        parser.add_argument('--max-tokens', type=int, default=200000, help='Gemini token budget for regeneration')
+        parser.add_argument('--delay', type=float, default=0.5, help='Seconds between Gemini calls')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        entries = response_cache.top_queries(options['keys'], options['days'])
+        if not entries:
+            self.stdout.write("No cacheable queries in the selected window.")
+            return
+        hits = sum(entry['hits'] for entry in entries)
+        self.stdout.write(
+            f"Top {len(entries)} queries account for {hits} requests in the last {options['days']} days "
+            f"({time.perf_counter() - started:.2f}s)"
+        )
+
+        refreshed = 0
+        if options['refresh_older_than'] is not None:
+            refreshed = self._refresh(entries, options)
+
+        if options['dry_run']:
+            return
+        stored = response_cache.load(entries, overwrite=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached {stored} answers ({refreshed} regenerated) in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _refresh(self, entries, options):
+        cutoff = time.time() - options['refresh_older_than'] * 3600
+        stale = [entry for entry in entries if entry['generated_at'] < cutoff]
+        self.stdout.write(f"{len(stale)} answers older than {options['refresh_older_than']}h")
+        if options['dry_run'] or not stale:
+            return 0
+
+        try:
+            client = GeminiClient()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        calls = tokens = refreshed = 0
+        # Most requested first, so the budget goes where it saves the most
+        for entry in stale:
+            if calls >= options['max_calls'] or tokens >= options['max_tokens']:
+                self.stdout.write(self.style.WARNING(
+                    f"Budget reached after {calls} calls / {tokens} tokens; "
+                    f"{len(stale) - refreshed} answers left as they were"
+                ))
+                break
+            if calls:
+                time.sleep(options['delay'])
+            prompt = AdvancedPromptEngine.get_prompt(entry['function_type'], entry['style'], entry['query'])
+            result = client.generate_content(prompt)
+            calls += 1
+            usage = result.get('usage') or {}
+            tokens += usage.get('total_tokens') or 0
+            if not result['success']:
+                self.stderr.write(f"  {entry['query'][:60]!r}: {result['error']}")
+                continue
+            entry.update(content=result['content'], model=result.get('model', ''), generated_at=time.time())
+            refreshed += 1
+        client.close()
+        return refreshed
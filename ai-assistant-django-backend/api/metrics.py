@@ -0,0 +1,191 @@
+"""
+In-process request metrics, exported in the Prometheus text format.
+
+Counters and fixed-bucket histograms live in this module, keyed by a small,
+bounded set of label values (endpoint name, function_type and style from the
+model choices). Recording is a dict lookup, a bisect and a few additions under
+a lock, so it is cheap enough to run on every request. Values are per worker
+process; scrape each worker, or sum them in Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from .models import QueryHistory
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_FUNCTION_TYPES = {choice for choice, _ in QueryHistory.FUNCTION_CHOICES}
+_STYLES = {choice for choice, _ in QueryHistory.STYLE_CHOICES}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", le)])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+
+REQUEST_LABELS = ('endpoint', 'function_type', 'style')
+
+REQUESTS = Counter(
+    'veritas_requests_total', 'HTTP requests handled', REQUEST_LABELS + ('status',)
+)
+ERRORS = Counter(
+    'veritas_request_errors_total', 'HTTP requests answered with a 5xx status', REQUEST_LABELS
+)
+REQUEST_LATENCY = Histogram(
+    'veritas_request_duration_seconds', 'Time spent handling a request', REQUEST_LABELS
+)
+STAGE_LATENCY = Histogram(
+    'veritas_request_stage_duration_seconds',
+    'Time spent per stage of a request (see the Server-Timing header)',
+    ('endpoint', 'stage'),
+)
+UPSTREAM_REQUESTS = Counter(
+    'veritas_upstream_requests_total', 'Calls to Gemini', ('kind', 'outcome')
+)
+LANE_QUEUE_WAIT = Histogram(
+    'veritas_lane_queue_wait_seconds',
+    'Time queries waited for a slot in their execution lane (api.lanes)',
+    ('lane',),
+)
+LANE_REJECTED = Counter(
+    'veritas_lane_rejected_total', 'Queries answered 503 after waiting too long for a lane slot', ('lane',)
+)
+
+REGISTRY = [
+    REQUESTS, ERRORS, REQUEST_LATENCY, STAGE_LATENCY, UPSTREAM_REQUESTS, LANE_QUEUE_WAIT, LANE_REJECTED
+]
+
+
+class ServerTiming:
+    """Stage durations of one request, rendered as a Server-Timing header"""
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def header(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages)
+
+
+def _http_request(request):
+    # DRF's Request wraps the Django HttpRequest the middleware annotated
+    return getattr(request, '_request', request)
+
+
+def timing_for(request):
+    """The request's ServerTiming; a detached one if the middleware is not installed"""
+    http_request = _http_request(request)
+    timing = getattr(http_request, 'server_timing', None)
+    if timing is None:
+        timing = http_request.server_timing = ServerTiming()
+    return timing
+
+
+def label_request(request, function_type=None, style=None):
+    """Attach function_type/style labels; values outside the model choices become 'other'"""
+    labels = getattr(_http_request(request), 'metrics_labels', None)
+    if labels is None:
+        return
+    if function_type is not None:
+        labels['function_type'] = function_type if function_type in _FUNCTION_TYPES else 'other'
+    if style is not None:
+        labels['style'] = style if style in _STYLES else 'other'
+
+
+def observe_request(endpoint, labels, status_code, elapsed, stages):
+    key = (endpoint, labels.get('function_type', ''), labels.get('style', ''))
+    REQUESTS.inc(key + (str(status_code),))
+    if status_code >= 500:
+        ERRORS.inc(key)
+    REQUEST_LATENCY.observe(elapsed, key)
+    for stage, seconds in stages:
+        STAGE_LATENCY.observe(seconds, (endpoint, stage))
+
+
+def observe_upstream(metrics):
+    """gemini_core client hook: count upstream calls by kind and outcome"""
+    if metrics.get('replayed'):
+        outcome = 'replayed'
+    elif metrics['success']:
+        outcome = 'success'
+    else:
+        outcome = 'error'
+    UPSTREAM_REQUESTS.inc((metrics['kind'], outcome))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
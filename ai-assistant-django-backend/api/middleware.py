@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import reverse
+
+from . import histograms, metrics, profiling
+from .query_budget import QueryBudgetExceeded, QueryRecorder, logger as budget_logger
+
+
+class MetricsMiddleware:
+    """
+    Times every request, records it in api.metrics and api.histograms and adds
+    a Server-Timing header with the stages views reported through
+    ``metrics.timing_for``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        request.server_timing = metrics.ServerTiming()
+        request.metrics_labels = {}
+
+        response = self.get_response(request)
+
+        elapsed = time.perf_counter() - started
+        timing = request.server_timing
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match and match.url_name else 'unmatched'
+        labels = request.metrics_labels
+        metrics.observe_request(endpoint, labels, response.status_code, elapsed, timing.stages)
+        histograms.record(endpoint, labels.get('function_type'), labels.get('style'), elapsed)
+        timing.add('total', elapsed)
+        response['Server-Timing'] = timing.header()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Samples the stack of requests sent with a signed X-Profile header, or a
+    PROFILING_SAMPLE_RATE fraction of all requests, and links the collapsed
+    stacks in the response. Removed from the chain unless PROFILING_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def _wanted(self, request):
+        token = request.META.get(profiling.HEADER)
+        if token:
+            return profiling.valid_token(token)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self._wanted(request):
+            return self.get_response(request)
+
+        sampler = profiling.StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match and match.url_name else 'unmatched'
+        name = profiling.write_profile(stacks, endpoint)
+        url = reverse('get_profile', args=[name])
+        response['Link'] = f'<{url}>; rel="profile"; type="text/plain"'
+        response['X-Profile-Samples'] = str(sum(stacks.values()))
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL queries and database time of each request and reports
+    requests over their view's @query_budget (or QUERY_BUDGET_DEFAULT).
+    Removed from the chain unless QUERY_BUDGET_MODE is 'log' or 'strict'.
+    """
+
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE not in ('log', 'strict'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.strict = settings.QUERY_BUDGET_MODE == 'strict'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', settings.QUERY_BUDGET_DEFAULT)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        metrics.timing_for(request).add('sql', recorder.duration)
+        response['X-DB-Queries'] = str(recorder.count)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and recorder.count > budget:
+            report = recorder.report(request.path, budget)
+            budget_logger.warning(report)
+            if self.strict:
+                raise QueryBudgetExceeded(report)
+        return response
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TextBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("text", models.TextField(blank=True)),
+                ("data", models.BinaryField(blank=True, null=True)),
+                ("size", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="queryhistory",
+            name="query_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_queries",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="queryhistory",
+            name="response_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_responses",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userfeedback",
+            name="query_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_queries",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userfeedback",
+            name="response_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_responses",
+                to="api.textblob",
+            ),
+        ),
+    ]
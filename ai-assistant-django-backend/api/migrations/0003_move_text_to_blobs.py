@@ -0,0 +1,101 @@
+# Moves existing query/response text into TextBlob rows in small batches.
+# The migration is non-atomic and each batch commits on its own, so an
+# interrupted run simply resumes with the rows that are still unconverted.
+
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+
+def _blob_fields(text, threshold):
+    encoded = text.encode("utf-8")
+    fields = {
+        "digest": hashlib.sha256(encoded).hexdigest(),
+        "text": text,
+        "data": None,
+        "size": len(text),
+    }
+    if len(encoded) >= threshold:
+        compressed = zlib.compress(encoded, 6)
+        if len(compressed) < len(encoded):
+            fields.update(text="", data=compressed)
+    return fields
+
+
+def _store_texts(TextBlob, texts, threshold):
+    rows = {}
+    digests = {}
+    for text in set(texts):
+        fields = _blob_fields(text, threshold)
+        digests[text] = fields["digest"]
+        rows.setdefault(fields["digest"], fields)
+    TextBlob.objects.bulk_create(
+        [TextBlob(**fields) for fields in rows.values()], ignore_conflicts=True
+    )
+    ids = dict(
+        TextBlob.objects.filter(digest__in=list(rows)).values_list("digest", "id")
+    )
+    return {text: ids[digest] for text, digest in digests.items()}
+
+
+def move_text_to_blobs(apps, schema_editor):
+    TextBlob = apps.get_model("api", "TextBlob")
+    threshold = getattr(settings, "TEXT_BLOB_COMPRESS_THRESHOLD", 1024)
+
+    for model_name in ("QueryHistory", "UserFeedback"):
+        model = apps.get_model("api", model_name)
+        pending = model.objects.filter(query_blob__isnull=True).order_by("pk")
+        while True:
+            with transaction.atomic():
+                batch = list(pending.only("pk", "query", "response")[:BATCH_SIZE])
+                if not batch:
+                    break
+                ids = _store_texts(
+                    TextBlob,
+                    [text for row in batch for text in (row.query, row.response)],
+                    threshold,
+                )
+                for row in batch:
+                    row.query_blob_id = ids[row.query]
+                    row.response_blob_id = ids[row.response]
+                model.objects.bulk_update(batch, ["query_blob", "response_blob"])
+
+
+def restore_text_from_blobs(apps, schema_editor):
+    for model_name in ("QueryHistory", "UserFeedback"):
+        model = apps.get_model("api", model_name)
+        rows = model.objects.select_related("query_blob", "response_blob").order_by("pk")
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+                if not batch:
+                    break
+                for row in batch:
+                    row.query = _blob_value(row.query_blob)
+                    row.response = _blob_value(row.response_blob)
+                model.objects.bulk_update(batch, ["query", "response"])
+                last_pk = batch[-1].pk
+
+
+def _blob_value(blob):
+    if blob.data is None:
+        return blob.text
+    return zlib.decompress(bytes(blob.data)).decode("utf-8")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("api", "0002_textblob"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_text_to_blobs, restore_text_from_blobs),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_move_text_to_blobs"),
+    ]
+
+    operations = [
+        # Give the old columns a default first so the removal can be reversed
+        # on a populated table.
+        migrations.AlterField(
+            model_name="queryhistory",
+            name="query",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AlterField(
+            model_name="queryhistory",
+            name="response",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AlterField(
+            model_name="userfeedback",
+            name="query",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AlterField(
+            model_name="userfeedback",
+            name="response",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RemoveField(
+            model_name="queryhistory",
+            name="query",
+        ),
+        migrations.RemoveField(
+            model_name="queryhistory",
+            name="response",
+        ),
+        migrations.RemoveField(
+            model_name="userfeedback",
+            name="query",
+        ),
+        migrations.RemoveField(
+            model_name="userfeedback",
+            name="response",
+        ),
+        migrations.AlterField(
+            model_name="queryhistory",
+            name="query_blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_queries",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="queryhistory",
+            name="response_blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_responses",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userfeedback",
+            name="query_blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_queries",
+                to="api.textblob",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userfeedback",
+            name="response_blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="%(class)s_responses",
+                to="api.textblob",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_conversations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="queryhistory",
+            name="template_hash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=16
+            ),
+        ),
+    ]
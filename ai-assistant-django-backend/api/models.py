@@ -1,9 +1,155 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
+import hashlib
 import json
+import zlib
 # Create your models here.
 
-class QueryHistory(models.Model):
+def text_digest(text):
+    """SHA-256 hex digest used as the content address of a TextBlob"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class TextBlobManager(models.Manager):
+    # Keep IN (...) lists well under SQLite's bound-parameter limit
+    LOOKUP_BATCH_SIZE = 500
+
+    def store(self, text):
+        """Return the blob holding ``text``, creating it on first use"""
+        return self.store_many([text])[text]
+
+    def store_many(self, texts):
+        """Return ``{text: blob}`` for ``texts``, inserting only missing blobs"""
+        by_digest = {text_digest(text): text for text in set(texts)}
+        digests = list(by_digest)
+        blobs = {}
+        for i in range(0, len(digests), self.LOOKUP_BATCH_SIZE):
+            chunk = digests[i:i + self.LOOKUP_BATCH_SIZE]
+            blobs.update((blob.digest, blob) for blob in self.filter(digest__in=chunk))
+
+        missing = [digest for digest in digests if digest not in blobs]
+        if missing:
+            self.bulk_create(
+                [self.model.from_text(by_digest[digest], digest) for digest in missing],
+                batch_size=self.LOOKUP_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+            for i in range(0, len(missing), self.LOOKUP_BATCH_SIZE):
+                chunk = missing[i:i + self.LOOKUP_BATCH_SIZE]
+                blobs.update((blob.digest, blob) for blob in self.filter(digest__in=chunk))
+
+        return {text: blobs[digest] for digest, text in by_digest.items()}
+
+    def purge_orphans(self, blob_ids):
+        """Delete the blobs among ``blob_ids`` that no row references any more"""
+        blob_ids = list(blob_ids)
+        for i in range(0, len(blob_ids), self.LOOKUP_BATCH_SIZE):
+            chunk = set(blob_ids[i:i + self.LOOKUP_BATCH_SIZE])
+            referenced = set()
+            for rel in self.model._meta.related_objects:
+                referenced.update(
+                    rel.related_model._default_manager
+                    .filter(**{f'{rel.field.name}__in': chunk})
+                    .values_list(rel.field.attname, flat=True)
+                )
+            self.filter(id__in=chunk - referenced).delete()
+
+class TextBlob(models.Model):
+    """Query/response text stored once per distinct content, compressed when large"""
+    digest = models.CharField(max_length=64, unique=True)
+    text = models.TextField(blank=True)
+    data = models.BinaryField(null=True, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = TextBlobManager()
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} chars)"
+
+    @classmethod
+    def from_text(cls, text, digest=None):
+        """Build an unsaved blob, zlib-compressing text above the size threshold"""
+        blob = cls(digest=digest or text_digest(text), text=text, size=len(text))
+        encoded = text.encode('utf-8')
+        if len(encoded) >= settings.TEXT_BLOB_COMPRESS_THRESHOLD:
+            compressed = zlib.compress(encoded, 6)
+            if len(compressed) < len(encoded):
+                blob.text = ''
+                blob.data = compressed
+        return blob
+
+    @cached_property
+    def value(self):
+        if self.data is None:
+            return self.text
+        return zlib.decompress(bytes(self.data)).decode('utf-8')
+
+def blob_text(name):
+    """Property exposing the text behind ``<name>_blob``; assignments are stored on save()"""
+    blob_attr = f'{name}_blob'
+    pending_attr = f'_pending_{name}'
+
+    def getter(self):
+        pending = self.__dict__.get(pending_attr)
+        if pending is not None:
+            return pending
+        if getattr(self, f'{blob_attr}_id') is None:
+            return ''
+        return getattr(self, blob_attr).value
+
+    def setter(self, value):
+        self.__dict__[pending_attr] = value
+
+    return property(getter, setter)
+
+class BlobTextModel(models.Model):
+    """Keeps ``query`` and ``response`` as references to shared TextBlob rows"""
+    query_blob = models.ForeignKey(
+        TextBlob, on_delete=models.PROTECT, related_name='%(class)s_queries'
+    )
+    response_blob = models.ForeignKey(
+        TextBlob, on_delete=models.PROTECT, related_name='%(class)s_responses'
+    )
+
+    query = blob_text('query')
+    response = blob_text('response')
+
+    TEXT_FIELDS = ('query', 'response')
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def resolve_text_blobs(cls, objs):
+        """Store pending text for unsaved ``objs`` in bulk, e.g. before bulk_create()"""
+        texts = [
+            obj.__dict__[f'_pending_{name}']
+            for obj in objs for name in cls.TEXT_FIELDS
+            if f'_pending_{name}' in obj.__dict__
+        ]
+        blobs = TextBlob.objects.store_many(texts)
+        for obj in objs:
+            for name in cls.TEXT_FIELDS:
+                pending = obj.__dict__.pop(f'_pending_{name}', None)
+                if pending is not None:
+                    setattr(obj, f'{name}_blob', blobs[pending])
+        return objs
+
+    def save(self, *args, **kwargs):
+        if any(f'_pending_{name}' in self.__dict__ for name in self.TEXT_FIELDS):
+            self.resolve_text_blobs([self])
+        super().save(*args, **kwargs)
+
+def token_cost(model_name, prompt_tokens, output_tokens):
+    """USD for the given token counts at the model's GEMINI_PRICING rates"""
+    price = settings.GEMINI_PRICING.get(model_name)
+    if price is None or prompt_tokens is None or output_tokens is None:
+        return None
+    return (prompt_tokens * price['input'] + output_tokens * price['output']) / 1_000_000
+
+class QueryHistory(BlobTextModel):
     FUNCTION_CHOICES = [
         ('question_answering', 'Question Answering'),
         ('text_summarization', 'Text Summarization'),
@@ -29,10 +175,18 @@ class QueryHistory(models.Model):
     
     function_type = models.CharField(max_length=50, choices=FUNCTION_CHOICES)
     style = models.CharField(max_length=50, choices=STYLE_CHOICES)
-    query = models.TextField()
-    response = models.TextField()
     processing_time = models.FloatField(null=True, blank=True)
+    # Token counts reported by Gemini (usageMetadata); null when unknown
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+    total_tokens = models.PositiveIntegerField(null=True, blank=True)
+    model_name = models.CharField(max_length=100, blank=True, default='')
     created_at = models.DateTimeField(default=timezone.now)
+    # Set for rows loaded by import_cli_data so re-imports are de-duplicated
+    content_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # response_cache.template_hash() of the prompt template a fresh answer was
+    # generated from; empty for cache hits, conversation turns and imports
+    template_hash = models.CharField(max_length=16, blank=True, default='', editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -40,7 +194,18 @@ class QueryHistory(models.Model):
     def __str__(self):
         return f"{self.function_type} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
-class UserFeedback(models.Model):
+    @property
+    def output_tokens_per_second(self):
+        if not self.output_tokens or not self.processing_time:
+            return None
+        return self.output_tokens / self.processing_time
+
+    @property
+    def estimated_cost(self):
+        """USD cost from settings.GEMINI_PRICING, or None if tokens or price are unknown"""
+        return token_cost(self.model_name, self.prompt_tokens, self.output_tokens)
+
+class UserFeedback(BlobTextModel):
     RATING_CHOICES = [(i, i) for i in range(1, 6)]
     
     query_history = models.ForeignKey(
@@ -51,11 +216,10 @@ class UserFeedback(models.Model):
         blank=True
     )
     function_type = models.CharField(max_length=50)
-    query = models.TextField()
-    response = models.TextField()
     rating = models.IntegerField(choices=RATING_CHOICES)
     suggestions = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    content_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -63,6 +227,51 @@ class UserFeedback(models.Model):
     def __str__(self):
         return f"Feedback - Rating: {self.rating} - {self.created_at.strftime('%Y-%m-%d')}"
 
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for sizing prompt context"""
+    return (len(text) + 3) // 4
+
+class Conversation(models.Model):
+    """
+    A multi-turn session. Turns before ``summarized_turns`` are folded into
+    ``summary``; the rest are sent verbatim as context for the next query.
+    """
+    session_id = models.CharField(max_length=32, unique=True)
+    summary = models.TextField(blank=True)
+    summarized_turns = models.PositiveIntegerField(default=0)
+    turn_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"Conversation {self.session_id}"
+
+class ConversationTurn(BlobTextModel):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='turns')
+    # Kept when the history row is archived; the turn has its own text references
+    query_history = models.ForeignKey(
+        QueryHistory,
+        on_delete=models.SET_NULL,
+        related_name='conversation_turns',
+        null=True,
+        blank=True
+    )
+    position = models.PositiveIntegerField()
+    tokens = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'position'], name='unique_turn_position')
+        ]
+
+    def __str__(self):
+        return f"{self.conversation.session_id} #{self.position}"
+
 class APIUsageStats(models.Model):
     date = models.DateField(default=timezone.now)
     function_type = models.CharField(max_length=50)
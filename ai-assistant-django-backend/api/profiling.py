@@ -0,0 +1,104 @@
+"""
+On-demand sampling profiler for single requests.
+
+ProfilingMiddleware profiles a request when it carries a valid signed
+``X-Profile`` header (``manage.py profile_token`` prints one) or is picked
+by ``PROFILING_SAMPLE_RATE``. A background thread then reads the request
+thread's stack through ``sys._current_frames()`` every
+``PROFILING_INTERVAL`` seconds; the request itself runs untouched. Stacks are
+written in the collapsed format (``root;caller;callee count`` per line) that
+flamegraph.pl, speedscope and inferno read, under ``PROFILE_DIR``.
+"""
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'api.profiling'
+PROFILE_NAME = re.compile(r'^[0-9]{8}-[0-9]{6}-[a-z_]+-[0-9a-f]{16}\.folded$')
+
+
+def make_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(value, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{module}:{name}'.replace(';', ':')
+
+
+def collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Counts the collapsed stacks of one thread, sampled from a helper thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def profile_path(name):
+    return os.path.join(os.fspath(settings.PROFILE_DIR), name)
+
+
+def write_profile(stacks, endpoint):
+    """Write collapsed stacks and return the file name; keeps the newest PROFILE_MAX_FILES"""
+    directory = os.fspath(settings.PROFILE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r'[^a-z_]', '_', endpoint.lower()) or 'unmatched'
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{secrets.token_hex(8)}.folded"
+    with open(profile_path(name), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if PROFILE_NAME.match(entry.name)),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:-settings.PROFILE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return name
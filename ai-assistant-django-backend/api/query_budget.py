@@ -0,0 +1,80 @@
+"""
+Per-request SQL query budgets.
+
+Views declare how many queries they may run with ``@query_budget(n)`` (placed
+above ``@api_view``). With ``QUERY_BUDGET_MODE`` set to ``log`` or ``strict``,
+QueryBudgetMiddleware counts every query a request runs through
+``connection.execute_wrapper`` and notes where in our code it was issued.
+Requests over budget are logged with their worst call sites; in ``strict``
+mode they also raise QueryBudgetExceeded, which fails the test (or the staging
+request) that caused it.
+"""
+import logging
+import os
+import time
+import traceback
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Frames from these directories are framework code, not the query's origin
+_FRAMEWORK_DIRS = tuple(
+    os.path.dirname(module.__file__) + os.sep
+    for module in (__import__('django'), __import__('rest_framework'))
+)
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Declare the most SQL queries one request to the decorated view may run"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _origin():
+    """'file:line in function' of the innermost project frame issuing a query"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename == _THIS_FILE or filename.startswith(_FRAMEWORK_DIRS) or 'site-packages' in filename:
+            continue
+        return f'{os.path.relpath(filename)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper callable counting queries, time and origins"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.origins = defaultdict(lambda: [0, 0.0, ''])  # origin -> [count, seconds, sample sql]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            entry = self.origins[_origin()]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = entry[2] or sql
+
+    def worst(self, limit=5):
+        return sorted(self.origins.items(), key=lambda item: (-item[1][0], -item[1][1]))[:limit]
+
+    def report(self, path, budget):
+        lines = [
+            f'{path} ran {self.count} SQL queries ({self.duration * 1000:.1f} ms), budget {budget}:'
+        ]
+        for origin, (count, seconds, sql) in self.worst():
+            lines.append(f'  {count:>4}x {seconds * 1000:>7.1f} ms  {origin}  {sql[:120]}')
+        return '\n'.join(lines)
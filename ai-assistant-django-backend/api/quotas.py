@@ -0,0 +1,245 @@
+"""
+Per-client request and token quotas for the endpoints that call Gemini.
+
+Clients are identified by their ``X-API-Key`` header (hashed) when it is one
+of QUOTA_API_KEYS, otherwise by IP address, so made-up keys can't be used to
+get a fresh quota per request. Usage is counted in fixed windows of QUOTA_WINDOW_SECONDS
+and checked against a sliding-window estimate: the current window's count
+plus the previous window's count weighted by how much of it still overlaps
+the sliding window. Two counters per client and metric, no per-request log.
+
+Counters live in their own SQLite file (QUOTA_DB) in WAL mode, so every
+worker process shares them without Redis and without contending with the
+main database's writers. Each thread keeps its connection open; a check is
+one short write transaction, tens of microseconds.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from .db import apply_sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_counters (
+    client TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (client, metric, window)
+) WITHOUT ROWID
+"""
+SELECT = (
+    "SELECT metric, window, value FROM quota_counters "
+    "WHERE client = ? AND window IN (?, ?)"
+)
+UPSERT = (
+    "INSERT INTO quota_counters (client, metric, window, value) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (client, metric, window) DO UPDATE SET value = value + excluded.value"
+)
+PURGE = "DELETE FROM quota_counters WHERE window < ?"
+
+PURGE_EVERY = 1000  # writes per connection between purges of old windows
+
+_local = threading.local()
+
+
+class QuotaExceeded(Exception):
+    """Raised by TokenBudget; ``retry_after`` is None when waiting would not help"""
+
+    def __init__(self, tokens, retry_after):
+        if retry_after is None:
+            message = f'This needs about {tokens} tokens, more than the token quota of {settings.QUOTA_TOKENS_PER_WINDOW} per window.'
+        else:
+            message = f'Quota exceeded for this client. Retry in {retry_after}s.'
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        path = os.fspath(settings.QUOTA_DB)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        apply_sqlite_pragmas(conn, {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+        conn.execute(SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.writes = 0
+    return conn
+
+
+def _key_digest(api_key):
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+_known_keys = (None, frozenset())
+
+
+def _known_key_digests():
+    global _known_keys
+    configured, digests = _known_keys
+    if configured is not settings.QUOTA_API_KEYS:
+        digests = frozenset(_key_digest(key) for key in settings.QUOTA_API_KEYS)
+        _known_keys = (settings.QUOTA_API_KEYS, digests)
+    return digests
+
+
+def client_id(request):
+    api_key = request.META.get('HTTP_X_API_KEY')
+    if api_key:
+        digest = _key_digest(api_key)
+        if digest in _known_key_digests():
+            return 'key:' + digest[:24]
+    address = request.META.get('REMOTE_ADDR', '')
+    if settings.QUOTA_TRUST_FORWARDED_FOR:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            address = forwarded.split(',')[0].strip()
+    return 'ip:' + address
+
+
+def _estimate(current, previous, elapsed_fraction):
+    return current + previous * (1.0 - elapsed_fraction)
+
+
+def _retry_after(current, previous, elapsed_fraction, limit, window, incoming=0):
+    """
+    Seconds until the sliding estimate leaves room for ``incoming`` more
+    under ``limit`` (1 for a request, which counts itself)
+    """
+    room = limit - incoming
+    if current <= room:
+        # Only the previous window's weight can fall: wait until it has
+        needed = 1.0 - (room - current) / previous if previous else elapsed_fraction
+        wait = (needed - elapsed_fraction) * window
+    else:
+        # This window is already full; it becomes the previous one next
+        wait = (1.0 - elapsed_fraction) * window + (1.0 - room / current) * window
+    return max(1, math.ceil(wait))
+
+
+def check(client, now=None):
+    """
+    Count one request for ``client`` if it is within its quotas.
+    Returns ``(allowed, retry_after_seconds, remaining_requests)``.
+    """
+    now = time.time() if now is None else now
+    window_seconds = settings.QUOTA_WINDOW_SECONDS
+    window = int(now // window_seconds)
+    elapsed = (now % window_seconds) / window_seconds
+    limits = {'requests': settings.QUOTA_REQUESTS_PER_WINDOW, 'tokens': settings.QUOTA_TOKENS_PER_WINDOW}
+
+    conn = _connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        counts = {(metric, w): value for metric, w, value in conn.execute(SELECT, (client, window, window - 1))}
+        for metric, limit in limits.items():
+            current = counts.get((metric, window), 0)
+            previous = counts.get((metric, window - 1), 0)
+            incoming = 1 if metric == 'requests' else 0
+            if limit and _estimate(current, previous, elapsed) + incoming > limit:
+                conn.execute('COMMIT')
+                return False, _retry_after(current, previous, elapsed, limit, window_seconds, incoming), 0
+        conn.execute(UPSERT, (client, 'requests', window, 1))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    _maybe_purge(conn, window)
+
+    used = _estimate(counts.get(('requests', window), 0) + 1, counts.get(('requests', window - 1), 0), elapsed)
+    return True, 0, max(int(limits['requests'] - used), 0)
+
+
+def check_tokens(client, tokens, now=None):
+    """
+    Whether ``tokens`` more Gemini tokens fit in ``client``'s token quota,
+    without counting anything. Returns ``(allowed, retry_after_seconds)``;
+    retry_after is None when they would not fit even in an empty window.
+    """
+    limit = settings.QUOTA_TOKENS_PER_WINDOW
+    if not limit:
+        return True, 0
+    if tokens > limit:
+        return False, None
+    now = time.time() if now is None else now
+    window_seconds = settings.QUOTA_WINDOW_SECONDS
+    window = int(now // window_seconds)
+    elapsed = (now % window_seconds) / window_seconds
+    counts = {
+        (metric, w): value
+        for metric, w, value in _connection().execute(SELECT, (client, window, window - 1))
+    }
+    current = counts.get(('tokens', window), 0)
+    previous = counts.get(('tokens', window - 1), 0)
+    if _estimate(current, previous, elapsed) + tokens <= limit:
+        return True, 0
+    return False, _retry_after(current, previous, elapsed, limit, window_seconds, tokens)
+
+
+def record_tokens(client, tokens, now=None):
+    """Charge ``tokens`` Gemini tokens to ``client``'s current window"""
+    if not tokens:
+        return
+    now = time.time() if now is None else now
+    conn = _connection()
+    conn.execute(UPSERT, (client, 'tokens', int(now // settings.QUOTA_WINDOW_SECONDS), int(tokens)))
+
+
+class TokenBudget:
+    """
+    Token accounting for a request that makes several Gemini calls: each call
+    is charged as soon as it returns, and require() stops the request before a
+    call that would not fit in what is left of the client's quota.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def require(self, tokens):
+        allowed, retry_after = check_tokens(self.client, tokens)
+        if not allowed:
+            raise QuotaExceeded(tokens, retry_after)
+
+    def charge(self, tokens):
+        record_tokens(self.client, tokens)
+
+
+def _maybe_purge(conn, window):
+    _local.writes += 1
+    if _local.writes % PURGE_EVERY == 0:
+        conn.execute(PURGE, (window - 1,))
+
+
+def client_quota(view):
+    """
+    Reject requests over the client's quotas with 429 and Retry-After; the
+    view charges tokens with ``record_tokens(request.quota_client, n)``.
+    Place above ``@api_view``.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.QUOTA_ENABLED:
+            request.quota_client = None
+            return view(request, *args, **kwargs)
+        request.quota_client = client_id(request)
+        allowed, retry_after, remaining = check(request.quota_client)
+        if not allowed:
+            response = JsonResponse({
+                'success': False,
+                'error': f'Quota exceeded for this client. Retry in {retry_after}s.'
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        response = view(request, *args, **kwargs)
+        response['X-RateLimit-Remaining'] = str(remaining)
+        return response
+    return wrapper
@@ -0,0 +1,185 @@
+"""
+Answers to repeated questions, served without calling Gemini.
+
+Entries live in the 'responses' cache (file based, so shared by all workers
+and kept across restarts), keyed by function type, style, the normalized
+query and a hash of the prompt template, so editing a template invalidates
+its answers. Only RESPONSE_CACHE_FUNCTION_TYPES are cached; creative
+generation is expected to vary.
+
+Traffic has a heavy head, so the cache is warmed from QueryHistory: the most
+frequent normalized queries of the last RESPONSE_CACHE_WARM_DAYS days are
+loaded with their latest stored answer by ``manage.py warm_response_cache``
+(which can also regenerate stale answers under a call/token budget) and, once
+per RESPONSE_CACHE_WARM_INTERVAL, in the background after a worker's first
+request. Frequency counts every row, cache hits included, but answers come
+only from rows generated from the current template (``template_hash``), so
+warming never resurrects answers to an edited template and an answer's age
+is that of its last real generation.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import QueryHistory
+from .utils import AdvancedPromptEngine
+
+logger = logging.getLogger(__name__)
+
+WARM_LOCK_KEY = 'warm-lock'
+
+_warm_started = False
+_warm_lock = threading.Lock()
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split()).rstrip('?!. ')
+
+
+def cacheable(function_type):
+    return function_type in settings.RESPONSE_CACHE_FUNCTION_TYPES
+
+
+def template_hash(function_type, style):
+    """Identifies the prompt template of (function_type, style) as it is now"""
+    template = AdvancedPromptEngine.PROMPT_TEMPLATES.get(function_type, {}).get(style, '')
+    parts = [function_type, style, template]
+    return hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def cache_key(function_type, style, query):
+    parts = [function_type, style, normalize_query(query), template_hash(function_type, style)]
+    return 'answer:' + hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def get(function_type, style, query):
+    """The cached ``{'content', 'model', 'generated_at'}`` entry, or None"""
+    if not cacheable(function_type):
+        return None
+    return caches['responses'].get(cache_key(function_type, style, query))
+
+
+def put(function_type, style, query, content, model, generated_at=None):
+    if not cacheable(function_type):
+        return
+    caches['responses'].set(cache_key(function_type, style, query), {
+        'content': content,
+        'model': model,
+        'generated_at': time.time() if generated_at is None else generated_at,
+    }, timeout=settings.RESPONSE_CACHE_TTL)
+
+
+def top_queries(limit, days=None):
+    """
+    The ``limit`` most frequent normalized (function_type, style, query) keys
+    of the last ``days`` days, most frequent first, each with its latest answer
+    generated from the current template (keys without one are left out). An
+    answer already regenerated into the cache is used if it is newer.
+    """
+    days = settings.RESPONSE_CACHE_WARM_DAYS if days is None else days
+    current = [
+        template_hash(function_type, style)
+        for function_type in settings.RESPONSE_CACHE_FUNCTION_TYPES
+        for style in AdvancedPromptEngine.PROMPT_TEMPLATES.get(function_type, {})
+    ]
+    groups = (
+        QueryHistory.objects
+        .filter(
+            created_at__gte=timezone.now() - timedelta(days=days),
+            function_type__in=settings.RESPONSE_CACHE_FUNCTION_TYPES
+        )
+        .order_by()
+        .values('function_type', 'style', 'query_blob')
+        .annotate(hits=Count('id'), latest_id=Max('id', filter=Q(template_hash__in=current)))
+        .order_by('-hits')
+    )
+    # Exact-text groups; several may share a normalized key, so take extra
+    groups = list(groups[:limit * 2])
+    latest = QueryHistory.objects.select_related('query_blob', 'response_blob').in_bulk(
+        [group['latest_id'] for group in groups if group['latest_id'] is not None]
+    )
+
+    keys = {}
+    for group in groups:
+        row = latest.get(group['latest_id'])
+        if row is None:
+            continue
+        key = cache_key(row.function_type, row.style, row.query)
+        entry = keys.get(key)
+        if entry is None:
+            keys[key] = {
+                'key': key,
+                'function_type': row.function_type,
+                'style': row.style,
+                'query': row.query,
+                'hits': group['hits'],
+                'content': row.response,
+                'model': row.model_name,
+                'generated_at': row.created_at.timestamp(),
+            }
+            continue
+        entry['hits'] += group['hits']
+        if row.created_at.timestamp() > entry['generated_at']:
+            entry.update(content=row.response, model=row.model_name, generated_at=row.created_at.timestamp())
+
+    entries = sorted(keys.values(), key=lambda entry: -entry['hits'])[:limit]
+    cached = caches['responses'].get_many([entry['key'] for entry in entries])
+    for entry in entries:
+        newer = cached.get(entry['key'])
+        if newer and newer['generated_at'] > entry['generated_at']:
+            entry.update(content=newer['content'], model=newer['model'], generated_at=newer['generated_at'])
+    return entries
+
+
+def load(entries, overwrite=False):
+    """Cache ``entries`` from top_queries(); returns how many were stored"""
+    cache = caches['responses']
+    if not overwrite:
+        present = cache.get_many([entry['key'] for entry in entries])
+        entries = [entry for entry in entries if entry['key'] not in present]
+    cache.set_many({
+        entry['key']: {
+            'content': entry['content'],
+            'model': entry['model'],
+            'generated_at': entry['generated_at'],
+        }
+        for entry in entries
+    }, timeout=settings.RESPONSE_CACHE_TTL)
+    return len(entries)
+
+
+def warm_from_history(limit=None):
+    entries = top_queries(limit or settings.RESPONSE_CACHE_WARM_KEYS)
+    return load(entries)
+
+
+def _warm_task():
+    try:
+        stored = warm_from_history()
+        logger.info('Response cache warmed with %d answers', stored)
+    except Exception:
+        logger.exception('Warming the response cache failed')
+    finally:
+        connections.close_all()
+
+
+def warm_on_first_request(sender, **kwargs):
+    """request_started receiver: warm in the background once per process"""
+    global _warm_started
+    if _warm_started:
+        return
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+    # One worker warms per interval; the cache is shared
+    if caches['responses'].add(WARM_LOCK_KEY, time.time(), timeout=settings.RESPONSE_CACHE_WARM_INTERVAL):
+        threading.Thread(target=_warm_task, name='response-cache-warm', daemon=True).start()
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import QueryHistory, UserFeedback, APIUsageStats
+from .models import QueryHistory, UserFeedback, APIUsageStats, Conversation, ConversationTurn
 
 class QueryRequestSerializer(serializers.Serializer):
     function_type = serializers.ChoiceField(choices=[
@@ -9,13 +9,26 @@ class QueryRequestSerializer(serializers.Serializer):
     ])
     style = serializers.CharField(max_length=50)
     query = serializers.CharField()
+    # session_id of a Conversation to continue (see POST /api/conversations/)
+    conversation_id = serializers.CharField(max_length=32, required=False)
+
+class DocumentUploadSerializer(serializers.Serializer):
+    """Options for POST /api/summarize/upload/ (the document itself is streamed, not validated here)"""
+    style = serializers.ChoiceField(choices=['concise', 'bullet_points', 'executive'], default='concise')
 
 class QueryResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = QueryHistory
-        fields = ['id', 'function_type', 'style', 'query', 'response', 'processing_time', 'created_at']
+        fields = [
+            'id', 'function_type', 'style', 'query', 'response', 'processing_time',
+            'prompt_tokens', 'output_tokens', 'total_tokens', 'model_name', 'created_at'
+        ]
 
 class FeedbackSerializer(serializers.ModelSerializer):
+    # Text lives in shared TextBlob rows; the model properties rebuild it
+    query = serializers.CharField()
+    response = serializers.CharField()
+
     class Meta:
         model = UserFeedback
         fields = ['id', 'function_type', 'query', 'response', 'rating', 'suggestions', 'created_at']
@@ -40,3 +53,20 @@ class HealthCheckSerializer(serializers.Serializer):
     message = serializers.CharField()
     version = serializers.CharField()
     django_version = serializers.CharField()
+
+class ConversationTurnSerializer(serializers.ModelSerializer):
+    query = serializers.CharField()
+    response = serializers.CharField()
+
+    class Meta:
+        model = ConversationTurn
+        fields = ['position', 'query_history', 'query', 'response', 'tokens', 'created_at']
+
+class ConversationSerializer(serializers.ModelSerializer):
+    turns = ConversationTurnSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'session_id', 'summary', 'summarized_turns', 'turn_count', 'created_at', 'updated_at', 'turns'
+        ]
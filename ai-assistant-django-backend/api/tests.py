@@ -1,3 +1,871 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from gemini_core.cassette import INDEX_ENTRY, Cassette
+from gemini_core.client import GeminiClient, extract_usage
+
+from . import (
+    archive, conversations, histograms, importer, lanes, metrics, profiling, quotas, response_cache,
+    uploads, views
+)
+from .models import Conversation, QueryHistory, UserFeedback
+from .query_budget import QueryBudgetExceeded
+
+
+def gemini_event(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+
+
+class StreamStub(BaseHTTPRequestHandler):
+    """streamGenerateContent stand-in: raw UTF-8 SSE events, no charset in the headers"""
+    chunks = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for chunk in self.chunks:
+            event = json.dumps(gemini_event(chunk), ensure_ascii=False)
+            self.wfile.write(f'data: {event}\r\n\r\n'.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class GeminiStreamingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StreamStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_stream_decodes_non_ascii_as_utf8(self):
+        StreamStub.chunks = ['café – ', 'naïve 😀']
+        client = GeminiClient(
+            api_key='test', api_url=f'http://127.0.0.1:{self.server.server_address[1]}/m:generateContent'
+        )
+        received = []
+        result = client.stream('hi', received.append)
+        client.close()
+
+        self.assertTrue(result['success'])
+        self.assertEqual(received, ['café – ', 'naïve 😀'])
+        self.assertEqual(result['content'], 'café – naïve 😀')
+
+
+class CassetteTests(SimpleTestCase):
+    url = 'https://example.test/models/m:generateContent'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/cassette.jsonl'
+
+    def record(self, cassette, prompts):
+        for prompt in prompts:
+            cassette.record(self.url, {'prompt': prompt}, {'success': True, 'content': f'answer to {prompt}'}, 0.0)
+
+    def test_two_recorders_share_a_cassette(self):
+        first, second = Cassette(self.path, mode='record'), Cassette(self.path, mode='record')
+        threads = [
+            threading.Thread(target=self.record, args=(cassette, [f'{name}-{i}' for i in range(50)]))
+            for name, cassette in (('a', first), ('b', second))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        replay = Cassette(self.path, mode='replay', latency='none')
+        self.assertEqual(replay.entries, 100)
+        for prompt in [f'a-{i}' for i in range(50)] + [f'b-{i}' for i in range(50)]:
+            result = replay.replay(self.url, {'prompt': prompt})
+            self.assertEqual(result['content'], f'answer to {prompt}')
+        replay.close()
+
+    def test_stale_index_entry_is_a_miss_and_rebuilds(self):
+        self.record(Cassette(self.path, mode='record'), ['one', 'two'])
+        with open(self.path + '.idx', 'rb') as f:
+            entries = list(INDEX_ENTRY.iter_unpack(f.read()))
+        # Point 'two' at the line recorded for 'one'
+        with open(self.path + '.idx', 'wb') as f:
+            f.write(INDEX_ENTRY.pack(entries[0][0], 0) + INDEX_ENTRY.pack(entries[1][0], 0))
+
+        replay = Cassette(self.path, mode='replay', latency='none')
+        self.assertEqual(replay.replay(self.url, {'prompt': 'two'})['content'], 'answer to two')
+        self.assertIsNone(replay.lookup(self.url, {'prompt': 'three'}))
+        replay.close()
+
+
+def gemini_result(content='A generated answer.', usage=None, timings=None):
+    return {
+        'success': True,
+        'content': content,
+        'model': 'gemini-test',
+        'usage': usage or {'prompt_tokens': 10, 'output_tokens': 20, 'total_tokens': 30},
+        'processing_time': 0.01,
+        'timings': timings or {},
+    }
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+
+
+def patch_gemini(test, **result):
+    """Replace the views' Gemini client with a mock answering gemini_result(**result)"""
+    gemini = mock.Mock()
+    gemini.generate_content.side_effect = lambda prompt: gemini_result(**result)
+    for patcher in (
+        mock.patch.object(views, 'gemini_client', gemini),
+        # No background warm-up thread touching the test database
+        mock.patch.object(response_cache, '_warm_started', True),
+    ):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return gemini
+
+
+@override_settings(
+    QUERY_BUDGET_MODE='strict',
+    QUOTA_ENABLED=False,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+    LATENCY_SNAPSHOT_DIR=tempfile.mkdtemp(),
+    ARCHIVE_DIR=tempfile.mkdtemp(),
+)
+class QueryBudgetTests(TestCase):
+    """Every @query_budget view, run in strict mode with Gemini mocked out"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            history = QueryHistory.objects.create(
+                function_type='question_answering', style='factual',
+                query=f'Question {i}?', response=f'Answer {i}.',
+                processing_time=0.5, prompt_tokens=10, output_tokens=20, total_tokens=30,
+                model_name='gemini-test'
+            )
+            UserFeedback.objects.create(
+                function_type='question_answering', query=history.query, response=history.response,
+                rating=1 + i % 5, query_history=history
+            )
+
+    def setUp(self):
+        patch_gemini(self)
+
+    def assertWithinBudget(self, response, view, status=200):
+        self.assertEqual(response.status_code, status, response.content[:500])
+        self.assertLessEqual(int(response['X-DB-Queries']), view.query_budget)
+
+    def query(self, query='What is WAL mode?', **extra):
+        return self.client.post('/api/query/', {
+            'function_type': 'question_answering', 'style': 'factual', 'query': query, **extra
+        }, content_type='application/json')
+
+    def test_health_and_styles(self):
+        self.assertWithinBudget(self.client.get('/api/health/'), views.health_check)
+        self.assertWithinBudget(
+            self.client.get('/api/styles/question_answering/'), views.get_available_styles
+        )
+
+    def test_metrics_and_latency(self):
+        self.assertWithinBudget(self.client.get('/api/metrics/'), views.metrics_view)
+        self.assertWithinBudget(self.client.get('/api/latency/'), views.get_latency)
+
+    def test_handle_query(self):
+        self.assertWithinBudget(self.query(), views.handle_query)
+        # Served from the response cache the second time
+        response = self.query()
+        self.assertWithinBudget(response, views.handle_query)
+        self.assertTrue(response.json()['data']['cached'])
+
+    def test_handle_query_in_conversation(self):
+        created = self.client.post('/api/conversations/')
+        self.assertWithinBudget(created, views.create_conversation, status=201)
+        session_id = created.json()['data']['session_id']
+        for i in range(3):
+            self.assertWithinBudget(
+                self.query(f'Follow-up {i}?', conversation_id=session_id), views.handle_query
+            )
+        self.assertWithinBudget(
+            self.client.get(f'/api/conversations/{session_id}/'), views.get_conversation
+        )
+
+    def test_summarize_upload(self):
+        upload = SimpleUploadedFile('notes.md', b'# Notes\n\nSome text to summarize.', 'text/markdown')
+        self.assertWithinBudget(
+            self.client.post('/api/summarize/upload/', {'file': upload}), views.summarize_upload
+        )
+
+    def test_handle_feedback(self):
+        response = self.client.post('/api/feedback/', {
+            'function_type': 'question_answering', 'query': 'Q?', 'response': 'A.', 'rating': 4
+        }, content_type='application/json')
+        self.assertWithinBudget(response, views.handle_feedback)
+
+    def test_read_endpoints(self):
+        self.assertWithinBudget(self.client.get('/api/feedback-stats/'), views.get_feedback_stats)
+        self.assertWithinBudget(self.client.get('/api/usage-stats/'), views.get_usage_stats)
+        self.assertWithinBudget(self.client.get('/api/history/'), views.get_query_history)
+
+    def test_exceeding_a_budget_raises(self):
+        with mock.patch.object(views.get_query_history, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/history/')
+
+
+@override_settings(
+    QUOTA_WINDOW_SECONDS=60,
+    QUOTA_REQUESTS_PER_WINDOW=60,
+    QUOTA_TOKENS_PER_WINDOW=0,
+    QUOTA_API_KEYS=['known-key'],
+)
+class QuotaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = override_settings(QUOTA_DB=f'{directory.name}/quotas.sqlite3')
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        # Connections are per thread; start from the temporary database
+        quotas._local.conn = None
+
+    def fill(self, client, window, count):
+        quotas._connection().execute(quotas.UPSERT, (client, 'requests', window, count))
+
+    def test_retry_after_leaves_room_for_the_retry(self):
+        self.fill('ip:1', 1000, 60)
+        self.fill('ip:1', 1001, 59)
+        now = 1001 * 60 + 30
+        allowed, retry_after, _ = quotas.check('ip:1', now=now)
+        self.assertFalse(allowed)
+        self.assertFalse(quotas.check('ip:1', now=now + retry_after - 1)[0])
+        self.assertTrue(quotas.check('ip:1', now=now + retry_after)[0])
+
+    def test_only_configured_api_keys_identify_clients(self):
+        factory = RequestFactory()
+        known = quotas.client_id(factory.get('/', HTTP_X_API_KEY='known-key', REMOTE_ADDR='10.0.0.1'))
+        unknown = quotas.client_id(factory.get('/', HTTP_X_API_KEY='made-up', REMOTE_ADDR='10.0.0.1'))
+        self.assertTrue(known.startswith('key:'))
+        self.assertEqual(unknown, 'ip:10.0.0.1')
+
+    @override_settings(QUOTA_TOKENS_PER_WINDOW=1000, UPLOAD_CHUNK_CHARS=400)
+    def test_document_summaries_stop_when_tokens_run_out(self):
+        gemini = mock.Mock()
+        gemini.generate_content.side_effect = lambda prompt: {
+            **gemini_result('Part summary.'), 'usage': {'total_tokens': 300}
+        }
+        budget = quotas.TokenBudget('ip:2')
+        with tempfile.TemporaryFile() as document:
+            document.write(b'A sentence that needs summarizing.\n\n' * 200)
+            document.seek(0)
+            with self.assertRaises(quotas.QuotaExceeded) as raised:
+                budget.require(uploads.estimate_tokens(document))
+            self.assertIsNone(raised.exception.retry_after)
+
+            document.seek(0)
+            document.truncate(3000)
+            with self.assertRaises(quotas.QuotaExceeded) as raised:
+                budget.require(0)
+                uploads.summarize_document(document, 'concise', gemini, budget=budget)
+        self.assertIsNotNone(raised.exception.retry_after)
+        # Stopped as soon as the charged calls left no room for the next part
+        self.assertEqual(gemini.generate_content.call_count, 3)
+
+
+class UploadTests(SimpleTestCase):
+    def test_parts_never_exceed_the_chunk_size(self):
+        self.assertEqual(
+            [len(part) for part in uploads.iter_parts(['a' * 5, '', 'b' * 60, 'c' * 60], 100)],
+            [5, 60, 60]
+        )
+        lines = [('x' * (i * 37 % 150)) if i % 7 else '' for i in range(500)]
+        for size in (50, 100, 256):
+            parts = list(uploads.iter_parts(lines, size))
+            self.assertLessEqual(max(len(part) for part in parts), size)
+            self.assertEqual(
+                ''.join(parts).replace('\n', ''), ''.join(lines)
+            )
+
+
+@override_settings(QUOTA_ENABLED=False)
+class UploadViewTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(views, 'gemini_client', mock.Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_empty_documents_are_bad_requests(self):
+        for body, content_type in ((b'', ''), (b'', 'text/plain'), (b' \n\n\t\n', 'text/plain')):
+            response = self.client.post('/api/summarize/upload/', body, content_type=content_type)
+            self.assertEqual(response.status_code, 400, (body, content_type))
+            self.assertFalse(response.json()['success'])
+
+
+@override_settings(
+    ARCHIVE_BLOCK_SIZE=3,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+)
+class ArchiveTests(TestCase):
+    """Seven January 2024 rows go to the archive; three from February stay hot"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ARCHIVE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # No background warm-up thread touching the test database
+        patcher = mock.patch.object(response_cache, '_warm_started', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for day in (3, 5, 8, 13, 21, 29, 31):
+            self.create(datetime(2024, 1, day, 12, tzinfo=dt_timezone.utc))
+        for day in (2, 9, 16):
+            self.create(datetime(2024, 2, day, 12, tzinfo=dt_timezone.utc))
+        self.cutoff = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+
+    def create(self, created_at):
+        history = QueryHistory.objects.create(
+            function_type='question_answering', style='factual',
+            query=f'Question of {created_at:%b %d}?', response=f'Answer of {created_at:%b %d}.',
+            processing_time=0.5
+        )
+        QueryHistory.objects.filter(id=history.id).update(created_at=created_at)
+
+    def test_segment_round_trip(self):
+        archived = archive.archive_history(older_than=self.cutoff)
+        self.assertEqual([(month, rows) for month, rows, _ in archived], [('2024-01', 7)])
+        self.assertEqual(QueryHistory.objects.count(), 3)
+
+        records = list(archive.iter_archived())
+        self.assertEqual(
+            [record['query'] for record in records],
+            [f'Question of Jan {day:02d}?' for day in (31, 29, 21, 13, 8, 5, 3)]
+        )
+        self.assertEqual(records[0]['response'], 'Answer of Jan 31.')
+        # A range that starts and ends inside blocks
+        start, end = datetime(2024, 1, 6, tzinfo=dt_timezone.utc), datetime(2024, 1, 22, tzinfo=dt_timezone.utc)
+        self.assertEqual(archive.count_archived(start, end), 3)
+        self.assertEqual(
+            [record['query'] for record in archive.page_archived(start, end, 1, 5)],
+            ['Question of Jan 13?', 'Question of Jan 08?']
+        )
+
+    def test_rerun_is_a_no_op(self):
+        archive.archive_history(older_than=self.cutoff)
+        self.assertEqual(archive.archive_history(older_than=self.cutoff), [])
+        self.assertEqual(len(archive.list_segments()), 1)
+        self.assertEqual(archive.count_archived(), 7)
+
+    def test_rerun_after_a_crash_finishes_the_delete(self):
+        with mock.patch.object(archive, '_delete_archived_rows', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                archive.archive_history(older_than=self.cutoff)
+        self.assertEqual(QueryHistory.objects.count(), 10)
+
+        self.assertEqual(archive.archive_history(older_than=self.cutoff), [])
+        self.assertEqual(QueryHistory.objects.count(), 3)
+        self.assertEqual(len(archive.list_segments()), 1)
+        self.assertEqual(archive.count_archived(), 7)
+
+    def test_history_pages_through_hot_then_archived_rows(self):
+        archive.archive_history(older_than=self.cutoff)
+        queries = []
+        for page in (1, 2, 3):
+            data = self.client.get(
+                '/api/history/', {'date_from': '2024-01-04', 'page': page, 'page_size': 4}
+            ).json()['data']
+            self.assertEqual(data['total_count'], 9)
+            self.assertEqual(data['has_next'], page < 3)
+            queries += [record['query'] for record in data['results']]
+        self.assertEqual(queries, [
+            f'Question of {month} {day:02d}?' for month, day in (
+                ('Feb', 16), ('Feb', 9), ('Feb', 2),
+                ('Jan', 31), ('Jan', 29), ('Jan', 21), ('Jan', 13), ('Jan', 8), ('Jan', 5),
+            )
+        ])
+
+
+def feedback_line(number, rating=4, **extra):
+    return {
+        'function_type': 'question_answering', 'query': f'Frage {number} – naïve?',
+        'response': f'Antwort {number} ✓', 'rating': rating,
+        'timestamp': f'2024-03-01T10:00:{number:02d}', **extra
+    }
+
+
+@override_settings(CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM})
+class ImporterTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.checkpoints = importer.Checkpoints(f'{self.directory}/checkpoints.json')
+
+    def write(self, name, text, mode='w'):
+        path = f'{self.directory}/{name}'
+        with open(path, mode, encoding='utf-8', newline='') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        return importer.import_file(
+            path, importer.feedback_from_record, UserFeedback, self.checkpoints, batch_size=2, **options
+        )
+
+    def test_jsonl_resumes_after_appended_records(self):
+        path = self.write('feedback.jsonl', ''.join(
+            json.dumps(feedback_line(i), ensure_ascii=False) + '\r\n' for i in range(3)
+        ))
+        self.assertEqual(self.run_import(path)['inserted'], 3)
+        self.write('feedback.jsonl', ''.join(
+            json.dumps(feedback_line(i), ensure_ascii=False) + '\n' for i in range(3, 5)
+        ), mode='a')
+
+        stats = self.run_import(path)
+        self.assertEqual(stats, {'read': 2, 'inserted': 2, 'skipped_invalid': 0, 'resumed_from': 3})
+        self.assertEqual(
+            sorted(feedback.query for feedback in UserFeedback.objects.select_related('query_blob')),
+            [f'Frage {i} – naïve?' for i in range(5)]
+        )
+
+    def test_json_array_resumes_after_appended_records(self):
+        records = [feedback_line(i) for i in range(5)]
+        path = self.write('feedback.json', json.dumps(records[:3], ensure_ascii=False, indent=2))
+        self.assertEqual(self.run_import(path)['inserted'], 3)
+        self.write('feedback.json', json.dumps(records, ensure_ascii=False, indent=2))
+
+        stats = self.run_import(path)
+        self.assertEqual(stats, {'read': 2, 'inserted': 2, 'skipped_invalid': 0, 'resumed_from': 3})
+        self.assertEqual(UserFeedback.objects.count(), 5)
+
+    def test_rerun_and_copies_are_deduplicated(self):
+        text = ''.join(json.dumps(feedback_line(i)) + '\n' for i in range(4))
+        first, copy = self.write('a.jsonl', text), self.write('b.jsonl', text)
+        self.assertEqual(self.run_import(first)['inserted'], 4)
+
+        self.assertEqual(self.run_import(first, resume=False), {
+            'read': 4, 'inserted': 0, 'skipped_invalid': 0, 'resumed_from': 0
+        })
+        self.assertEqual(self.run_import(copy)['inserted'], 0)
+        self.assertEqual(UserFeedback.objects.count(), 4)
+
+    def test_invalid_records_are_skipped(self):
+        path = self.write('feedback.jsonl', '\n'.join(json.dumps(record) for record in [
+            feedback_line(0),
+            feedback_line(1, rating=9),
+            feedback_line(2, timestamp='yesterday'),
+            {'query': 'no function type or rating'},
+            ['not', 'an', 'object'],
+            feedback_line(3),
+        ]))
+        self.assertEqual(self.run_import(path), {
+            'read': 5, 'inserted': 2, 'skipped_invalid': 3, 'resumed_from': 0
+        })
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative_and_upper_inclusive(self):
+        histogram = metrics.Histogram('test_seconds', 'Test', ('endpoint',), buckets=(0.01, 0.1, 1.0))
+        for value in (0.01, 0.05, 0.1, 0.5, 7.0):
+            histogram.observe(value, ('x',))
+        lines = list(histogram.render())[2:]
+        self.assertEqual(lines, [
+            'test_seconds_bucket{endpoint="x",le="0.01"} 1',
+            'test_seconds_bucket{endpoint="x",le="0.1"} 3',
+            'test_seconds_bucket{endpoint="x",le="1.0"} 4',
+            'test_seconds_bucket{endpoint="x",le="+Inf"} 5',
+            'test_seconds_sum{endpoint="x"} 7.66',
+            'test_seconds_count{endpoint="x"} 5',
+        ])
+
+    def test_labels_outside_the_model_choices_are_bucketed(self):
+        request = mock.Mock(spec=['metrics_labels'], metrics_labels={})
+        metrics.label_request(request, 'question_answering', 'made-up-style')
+        self.assertEqual(request.metrics_labels, {'function_type': 'question_answering', 'style': 'other'})
+
+
+@override_settings(
+    QUOTA_ENABLED=False,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+    LATENCY_SNAPSHOT_DIR=tempfile.mkdtemp(),
+)
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        patch_gemini(self, timings={'connect': 0.0, 'upstream': 0.25, 'download': 0.01, 'parse': 0.001})
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.post('/api/query/', {
+            'function_type': 'question_answering', 'style': 'factual', 'query': 'Time this?'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        stages = dict(
+            (entry.split(';dur=')[0], float(entry.split(';dur=')[1]))
+            for entry in response['Server-Timing'].split(', ')
+        )
+        for stage in ('validate', 'cache', 'prompt', 'queue', 'upstream', 'download', 'db', 'total'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['upstream'], 250.0)
+        self.assertGreaterEqual(stages['total'], max(stages['validate'], stages['db']))
+
+        exposition = self.client.get('/api/metrics/').content.decode()
+        self.assertIn(
+            'veritas_requests_total{endpoint="handle_query",function_type="question_answering",'
+            'style="factual",status="200"}', exposition
+        )
+        self.assertIn(
+            'veritas_request_stage_duration_seconds_bucket{endpoint="handle_query",stage="upstream",le="0.25"}',
+            exposition
+        )
+
+
+@override_settings(
+    QUOTA_ENABLED=False,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+    GEMINI_PRICING={'gemini-2.0-flash': {'input': 0.10, 'output': 0.40}},
+)
+class UsageStatsTests(TestCase):
+    def setUp(self):
+        patch_gemini(self)
+
+    def create(self, style, model_name='gemini-2.0-flash', prompt_tokens=None, output_tokens=None, seconds=1.0):
+        return QueryHistory.objects.create(
+            function_type='question_answering', style=style, query='Q?', response='A.',
+            processing_time=seconds, prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+            total_tokens=prompt_tokens + output_tokens if prompt_tokens is not None else None,
+            model_name=model_name
+        )
+
+    def test_usage_metadata_is_parsed(self):
+        self.assertEqual(
+            extract_usage({'usageMetadata': {'promptTokenCount': 7, 'candidatesTokenCount': 5}}),
+            {'prompt_tokens': 7, 'output_tokens': 5, 'total_tokens': 12}
+        )
+        self.assertIsNone(extract_usage({'candidates': []}))
+
+    def test_query_records_usage(self):
+        data = self.client.post('/api/query/', {
+            'function_type': 'question_answering', 'style': 'factual', 'query': 'Count my tokens?'
+        }, content_type='application/json').json()['data']
+        self.assertEqual((data['prompt_tokens'], data['output_tokens'], data['total_tokens']), (10, 20, 30))
+        history = QueryHistory.objects.get(id=data['id'])
+        self.assertEqual(history.model_name, 'gemini-test')
+        self.assertEqual(history.output_tokens_per_second, 20 / 0.01)
+        # No price for the test model
+        self.assertIsNone(history.estimated_cost)
+
+    def test_usage_stats_aggregate_throughput_and_cost(self):
+        self.create('factual', prompt_tokens=1000, output_tokens=2000, seconds=2.0)
+        self.create('concise', prompt_tokens=3000, output_tokens=6000, seconds=4.0)
+        self.create('factual', model_name='unpriced-model', prompt_tokens=100, output_tokens=100, seconds=1.0)
+        # Imported before usage was recorded: counts for latency, not throughput
+        self.create('concise', model_name='', seconds=3.0)
+
+        data = self.client.get('/api/usage-stats/').json()['data']
+        total = data['total']
+        self.assertEqual(total['queries'], 4)
+        self.assertEqual(total['queries_with_usage'], 3)
+        self.assertEqual(total['output_tokens'], 8100)
+        self.assertEqual(total['avg_processing_time'], 2.5)
+        self.assertEqual(total['output_tokens_per_second'], round(8100 / 7.0, 2))
+        self.assertEqual(total['estimated_cost'], 0.0036)
+        self.assertEqual(total['unpriced_queries'], 1)
+        self.assertEqual(data['by_model']['gemini-2.0-flash']['queries'], 2)
+        self.assertEqual(data['by_model']['unknown']['queries'], 1)
+        self.assertEqual(data['by_style']['factual']['estimated_cost'], 0.0009)
+
+
+class HistogramTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(LATENCY_SNAPSHOT_DIR=directory.name, LATENCY_SLOT_SECONDS=10, LATENCY_SLOTS=3)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Series recorded by other tests stay out of the way
+        patcher = mock.patch.object(histograms, '_series', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_buckets_are_exact_then_within_three_percent(self):
+        for micros in (0, 1, 63):
+            self.assertEqual(histograms.bucket_bounds(histograms.bucket_index(micros)), (micros, micros))
+        self.assertEqual(histograms.bucket_bounds(histograms.bucket_index(64)), (64, 65))
+        previous_high = 63
+        for index in range(histograms.LINEAR_LIMIT, histograms.bucket_index(histograms.MAX_MICROS) + 1):
+            low, high = histograms.bucket_bounds(index)
+            # Buckets tile the range with no gaps or overlaps
+            self.assertEqual(low, previous_high + 1)
+            self.assertLessEqual(high - low + 1, low / histograms.SUB_BUCKETS)
+            self.assertEqual(histograms.bucket_index(low), index)
+            self.assertEqual(histograms.bucket_index(high), index)
+            previous_high = high
+        self.assertLess(histograms.bucket_index(histograms.MAX_MICROS), 1000)
+        self.assertEqual(
+            histograms.bucket_index(histograms.MAX_MICROS * 10), histograms.bucket_index(histograms.MAX_MICROS)
+        )
+
+    def test_percentiles(self):
+        counts = {}
+        for millis in range(1, 1001):
+            index = histograms.bucket_index(millis * 1000)
+            counts[index] = counts.get(index, 0) + 1
+        summary = histograms.summarize(counts)
+        self.assertEqual(summary['count'], 1000)
+        for name, expected in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p99.9', 0.999), ('max', 1.0)):
+            self.assertAlmostEqual(summary[name], expected, delta=expected * 0.03)
+        self.assertEqual(histograms.summarize({}), {'count': 0})
+
+    def test_old_slots_fall_out_of_the_window(self):
+        histogram = histograms.SlidingHistogram(10, 3)
+        histogram.record(0.1, now=5)
+        histogram.record(0.2, now=25)
+        histogram.record(0.3, now=31)
+        self.assertEqual(sorted(histogram.snapshot()), [2, 3])
+
+    def test_snapshots_of_live_processes_are_merged(self):
+        histogram = histograms.SlidingHistogram(10, 3)
+        histograms._series[('query', 'question_answering', 'factual')] = histogram
+        histogram.record(0.1, now=1000)
+        histogram.record(0.2, now=1021)
+        histograms.flush(now=1025)
+        # The same snapshot, as written by another worker, and one by a worker long gone
+        own = os.path.join(self.directory, f'latency-{os.getpid()}.json')
+        with open(own) as f:
+            payload = json.load(f)
+        with open(os.path.join(self.directory, 'latency-1.json'), 'w') as f:
+            json.dump(payload, f)
+        stale = os.path.join(self.directory, 'latency-2.json')
+        with open(stale, 'w') as f:
+            json.dump({**payload, 'written_at': 900}, f)
+
+        series, processes = histograms.window_summaries([10, 30], now=1025)
+        self.assertEqual(processes, 2)
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(len(series), 1)
+        windows = series[0]['windows']
+        self.assertEqual(windows['10s']['count'], 2)
+        self.assertAlmostEqual(windows['10s']['p50'], 0.2, delta=0.006)
+        self.assertEqual(windows['30s']['count'], 4)
+        self.assertAlmostEqual(windows['30s']['p50'], 0.1, delta=0.003)
+        self.assertEqual(histograms.window_summaries([30], endpoint='summarize', now=1025)[0], [])
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@override_settings(
+    PROFILING_ENABLED=True,
+    PROFILING_SAMPLE_RATE=0,
+    PROFILING_INTERVAL=0.001,
+    PROFILE_MAX_FILES=2,
+    QUOTA_ENABLED=False,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(PROFILE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        gemini = patch_gemini(self)
+
+        def slow_generate(prompt):
+            spin(0.05)
+            return gemini_result()
+        gemini.generate_content.side_effect = slow_generate
+
+    def query(self, **headers):
+        return self.client.post('/api/query/', {
+            'function_type': 'question_answering', 'style': 'factual', 'query': 'Profile me?'
+        }, content_type='application/json', **headers)
+
+    def test_sampler_counts_the_target_threads_stacks(self):
+        worker = threading.Thread(target=spin, args=(0.1,))
+        worker.start()
+        stacks = profiling.StackSampler(worker.ident, 0.002).start()
+        worker.join()
+        stacks = stacks.stop()
+        self.assertGreater(sum(stacks.values()), 5)
+        self.assertTrue(all(stack.split(';')[0].startswith('threading:') for stack in stacks))
+        self.assertTrue(any(stack.endswith(';api.tests:spin') for stack in stacks))
+
+    def test_signed_requests_get_a_flamegraph_profile(self):
+        response = self.query(HTTP_X_PROFILE=profiling.make_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Profile-Samples']), 0)
+        url = response['Link'].split(';')[0].strip('<>')
+
+        folded = b''.join(self.client.get(url).streaming_content).decode()
+        lines = folded.splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('api.views:handle_query' in line and 'api.tests:spin' in line for line in lines))
+
+    def test_unsigned_requests_are_not_profiled(self):
+        for headers in ({}, {'HTTP_X_PROFILE': 'profile:forged:signature'}):
+            response = self.query(**headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Link', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_only_the_newest_profiles_are_kept(self):
+        names = []
+        for i in range(3):
+            names.append(profiling.write_profile(Counter({'a;b': i + 1}), 'handle_query'))
+            # Distinct, increasing modification times whatever the clock resolution
+            os.utime(profiling.profile_path(names[-1]), (1000 + i, 1000 + i))
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(names[1:]))
+        self.assertEqual(self.client.get('/api/profiles/..%2Fsettings.py/').status_code, 404)
+
+
+@override_settings(
+    QUOTA_ENABLED=False,
+    CACHES={'default': LOCMEM, 'versions': LOCMEM, 'responses': LOCMEM},
+    CONVERSATION_CONTEXT_TOKENS=100,
+    CONVERSATION_KEEP_TURNS=1,
+)
+class ConversationTests(TestCase):
+    """Each turn is 25 estimated tokens: a 23-token question and a 2-token answer"""
+
+    def setUp(self):
+        self.prompts = []
+
+        def generate(prompt):
+            if prompt.startswith('You maintain a running summary'):
+                return gemini_result('Summary so far.')
+            self.prompts.append(prompt)
+            return gemini_result('Answer.')
+        patch_gemini(self).generate_content.side_effect = generate
+        # Summarize inline instead of on the background worker
+        executor = mock.Mock(submit=lambda task, *args: conversations.summarize(*args))
+        patcher = mock.patch.object(conversations, '_get_executor', return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session_id = self.client.post('/api/conversations/').json()['data']['session_id']
+
+    def turn(self, number):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/query/', {
+                'function_type': 'question_answering', 'style': 'factual',
+                'query': f'Question {number}: ' + 'q' * 80, 'conversation_id': self.session_id
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return self.prompts[-1]
+
+    @override_settings(CONVERSATION_SUMMARIZE_AT=10 ** 6)
+    def test_context_keeps_only_the_newest_turns_that_fit(self):
+        for number in range(8):
+            prompt = self.turn(number)
+        # Four 25-token turns fill the 100-token budget
+        self.assertEqual(prompt.count('User: Question'), 4)
+        self.assertIn('User: Question 3', prompt)
+        self.assertNotIn('Question 2', prompt)
+        self.assertIn('New request:', prompt)
+
+    @override_settings(CONVERSATION_SUMMARIZE_AT=60)
+    def test_older_turns_are_folded_into_the_summary(self):
+        for number in range(6):
+            prompt = self.turn(number)
+        conversation = Conversation.objects.get(session_id=self.session_id)
+        self.assertEqual(conversation.summary, 'Summary so far.')
+        self.assertEqual(conversation.turn_count, 6)
+        # Summarization keeps the newest turn out of the summary
+        self.assertGreaterEqual(conversation.summarized_turns, 4)
+        self.assertLess(conversation.summarized_turns, 6)
+
+        prompt = self.turn(6)
+        self.assertIn('Summary of earlier turns:\nSummary so far.', prompt)
+        self.assertNotIn('Question 0', prompt)
+        self.assertIn('User: Question 5', prompt)
+
+        data = self.client.get(f'/api/conversations/{self.session_id}/').json()['data']
+        self.assertEqual(data['summary'], 'Summary so far.')
+
+
+class LaneTests(SimpleTestCase):
+    def make_scheduler(self, slots):
+        return lanes.LaneScheduler({
+            'fast': {'concurrency': 2, 'weight': 3},
+            'slow': {'concurrency': 1, 'weight': 1},
+        }, slots)
+
+    def test_waiting_lanes_share_slots_by_weight(self):
+        scheduler = self.make_scheduler(1)
+        scheduler.acquire('fast', 1)
+        tickets = {}
+        for name in ('fast', 'slow'):
+            for _ in range(8):
+                ticket = object()
+                tickets[ticket] = name
+                scheduler.lanes[name].waiting.append(ticket)
+
+        order = []
+        current = 'fast'
+        for _ in range(8):
+            scheduler.release(current)
+            (ticket,) = scheduler._admitted
+            scheduler._admitted.clear()
+            current = tickets[ticket]
+            order.append(current)
+        self.assertEqual(order.count('fast'), 6)
+        self.assertEqual(order.count('slow'), 2)
+
+    def test_full_lane_times_out_without_blocking_others(self):
+        scheduler = self.make_scheduler(3)
+        scheduler.acquire('slow', 1)
+        with self.assertRaises(lanes.LaneTimeout) as raised:
+            scheduler.acquire('slow', 0.05)
+        self.assertGreaterEqual(raised.exception.waited, 0.05)
+        self.assertFalse(scheduler.lanes['slow'].waiting)
+
+        with scheduler.slot('fast', 1) as waited:
+            self.assertLess(waited, 0.05)
+            self.assertEqual(scheduler.active, 2)
+        self.assertEqual(scheduler.active, 1)
+
+    def test_release_wakes_a_waiting_request(self):
+        scheduler = self.make_scheduler(1)
+        scheduler.acquire('fast', 1)
+        waited = []
+        waiter = threading.Thread(target=lambda: waited.append(scheduler.acquire('slow', 5)))
+        waiter.start()
+        while not scheduler.lanes['slow'].waiting:
+            time.sleep(0.001)
+        time.sleep(0.02)
+        scheduler.release('fast')
+        waiter.join(5)
+        self.assertEqual(len(waited), 1)
+        self.assertGreaterEqual(waited[0], 0.02)
+        self.assertEqual(scheduler.lanes['slow'].active, 1)
+
+    @override_settings(QUERY_LANE_LONG_INPUT_CHARS=100)
+    def test_lane_for(self):
+        self.assertEqual(lanes.lane_for('text_summarization', 'x' * 100), 'text_summarization')
+        self.assertEqual(lanes.lane_for('text_summarization', 'x' * 101), 'long_input')
+        self.assertEqual(lanes.lane_for('unknown', 'x'), 'question_answering')
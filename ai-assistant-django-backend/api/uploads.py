@@ -0,0 +1,287 @@
+"""
+Document uploads for summarization.
+
+POST /api/summarize/upload/ takes a text or markdown document either as a
+multipart form (``file`` plus an optional ``style`` field) or as the raw
+request body (``?style=`` in the query string). The body is streamed to a
+temporary file, never buffered whole, and rejected once it passes
+UPLOAD_MAX_BYTES. Text is then decoded and normalized incrementally and cut
+into parts of at most UPLOAD_CHUNK_CHARS characters. A document that fits in
+one part is summarized like a /api/query/ request; longer ones are summarized
+part by part and the partial summaries are combined in the requested style.
+At most two parts of the document are held in memory at a time (the first
+two, to tell a one-part document from a longer one).
+
+With quotas on, the view checks an estimate for the whole document (its size
+over CHARS_PER_TOKEN) against the client's remaining tokens first, and every
+Gemini call is charged as it returns and re-checked before the next one, so a
+large document can't run far past the quota in a single request.
+"""
+import codecs
+import os
+import re
+import tempfile
+from itertools import chain
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from . import lanes, metrics
+from .utils import AdvancedPromptEngine
+
+READ_SIZE = 1 << 16
+CHARS_PER_TOKEN = 4
+MARKDOWN_TYPES = {'text/markdown', 'text/x-markdown'}
+RAW_TYPES = {'text/plain', 'application/octet-stream'} | MARKDOWN_TYPES
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+
+PART_PROMPT = """You are summarizing a long document one part at a time. This is part {number}.
+
+{text}
+
+Summarize this part in at most {words} words. Keep the main points, names, numbers, dates and conclusions so the part summaries can be combined into one summary of the whole document. Reply with the summary only."""
+
+_CONTROL = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+_SPACES = re.compile(r'[ \t\u00a0]+')
+_MD_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+_MD_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_MD_EMPHASIS = re.compile(r'(\*\*|__|~~|`)')
+_MD_REFERENCE = re.compile(r'^\s{0,3}\[[^\]]+\]:\s')
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit):
+        super().__init__(f'Document is larger than the {limit} byte limit')
+        self.limit = limit
+
+
+class UnsupportedDocument(Exception):
+    pass
+
+
+class EmptyDocument(UnsupportedDocument):
+    pass
+
+
+class CappedUploadHandler(TemporaryFileUploadHandler):
+    """Writes multipart files straight to disk; stops the upload past UPLOAD_MAX_BYTES"""
+    too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.received = 0
+        if content_length > settings.UPLOAD_MAX_BYTES:
+            # Don't read the body at all
+            self.too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def is_markdown(content_type, name=''):
+    return content_type in MARKDOWN_TYPES or name.lower().endswith(MARKDOWN_SUFFIXES)
+
+
+def multipart_document(request):
+    """
+    Parse a multipart upload with CappedUploadHandler. Returns the form fields
+    and the ``file`` upload (None if missing); raises UploadTooLarge.
+    """
+    handler = CappedUploadHandler(request)
+    request.upload_handlers = [handler]
+    data, document = request.data, request.FILES.get('file')
+    if handler.too_large:
+        if document is not None:
+            document.close()
+        raise UploadTooLarge(settings.UPLOAD_MAX_BYTES)
+    return data, document
+
+
+def spool_body(stream, content_length):
+    """Copy a raw request body to a temporary file; the caller closes it"""
+    limit = settings.UPLOAD_MAX_BYTES
+    if content_length > limit:
+        raise UploadTooLarge(limit)
+    spooled = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    try:
+        size = 0
+        while stream is not None:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            size += len(data)
+            if size > limit:
+                raise UploadTooLarge(limit)
+            spooled.write(data)
+        spooled.seek(0)
+    except BaseException:
+        spooled.close()
+        raise
+    return spooled
+
+
+def _normalize_line(line, markdown):
+    line = _SPACES.sub(' ', _CONTROL.sub('', line)).strip()
+    if markdown and line:
+        if _MD_REFERENCE.match(line) or line.startswith('```'):
+            return ''
+        line = _MD_EMPHASIS.sub('', _MD_LINK.sub(r'\1', _MD_IMAGE.sub(r'\1', line)))
+    return line
+
+
+def iter_lines(fp, markdown=False):
+    """
+    Yield normalized lines from a binary file, decoding UTF-8 as it reads.
+    Runs of blank lines come out as a single '' (a paragraph break).
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    carry = ''
+    blank = True
+    first = True
+    while True:
+        data = fp.read(READ_SIZE)
+        if first and b'\x00' in data:
+            raise UnsupportedDocument('Binary files are not supported; upload plain text or markdown')
+        first = False
+        text = carry + decoder.decode(data, final=not data)
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        # The last piece may be a partial line, unless it's already too long to wait for
+        carry = lines.pop() if data and len(lines[-1]) <= READ_SIZE else ''
+        for line in lines:
+            line = _normalize_line(line, markdown)
+            if line or not blank:
+                yield line
+            blank = not line
+        if not data:
+            return
+
+
+def iter_parts(lines, size):
+    """Pack lines into parts of at most ``size`` characters, breaking at paragraphs when possible"""
+    part = []
+    length = 0
+    paragraph_end = 0
+    for line in lines:
+        while len(line) > size:
+            # A single line longer than a part: flush and cut it
+            if part:
+                yield '\n'.join(part).strip()
+                part, length, paragraph_end = [], 0, 0
+            yield line[:size]
+            line = line[size:]
+        while length + len(line) + 1 > size and part:
+            # Cut at the last paragraph break, or flush everything if that
+            # still leaves too little room for this line
+            cut = paragraph_end or len(part)
+            text = '\n'.join(part[:cut]).strip()
+            if text:
+                yield text
+            part = part[cut:]
+            length = sum(len(kept) + 1 for kept in part)
+            paragraph_end = 0
+        part.append(line)
+        length += len(line) + 1
+        if not line:
+            paragraph_end = len(part)
+    text = '\n'.join(part).strip()
+    if text:
+        yield text
+
+
+def estimate_tokens(fp):
+    """Rough prompt tokens for the whole document in binary file ``fp``"""
+    return os.fstat(fp.fileno()).st_size // CHARS_PER_TOKEN
+
+
+def _generate(client, prompt, totals, budget=None):
+    if budget is not None:
+        budget.require(len(prompt) // CHARS_PER_TOKEN)
+    lane = lanes.lane_for('text_summarization', prompt)
+    try:
+        with lanes.scheduler().slot(lane, settings.QUERY_LANE_TIMEOUT) as waited:
+            metrics.LANE_QUEUE_WAIT.observe(waited, (lane,))
+            totals['timings']['queue'] = totals['timings'].get('queue', 0) + waited
+            result = client.generate_content(prompt)
+    except lanes.LaneTimeout as e:
+        metrics.LANE_QUEUE_WAIT.observe(e.waited, (lane,))
+        metrics.LANE_REJECTED.inc((lane,))
+        raise
+
+    if budget is not None:
+        budget.charge((result.get('usage') or {}).get('total_tokens'))
+    totals['calls'] += 1
+    totals['processing_time'] += result.get('processing_time', 0)
+    for stage, seconds in result.get('timings', {}).items():
+        totals['timings'][stage] = totals['timings'].get(stage, 0) + seconds
+    for key, value in (result.get('usage') or {}).items():
+        if value:
+            totals['usage'][key] = totals['usage'].get(key, 0) + value
+    if result['success']:
+        totals['model'] = result.get('model', '')
+    return result
+
+
+def summarize_document(fp, style, client, markdown=False, budget=None):
+    """
+    Summarize the document in binary file ``fp``. Returns a generate_content()
+    style result with the totals over every Gemini call plus ``characters``
+    and ``parts``. Calls are charged to ``budget`` (a quotas.TokenBudget) as
+    they complete. Raises EmptyDocument, UnsupportedDocument,
+    lanes.LaneTimeout or quotas.QuotaExceeded.
+    """
+    size = settings.UPLOAD_CHUNK_CHARS
+    words = settings.UPLOAD_PART_SUMMARY_TOKENS * 3 // 4
+    totals = {
+        'calls': 0, 'processing_time': 0.0, 'timings': {}, 'usage': {},
+        'model': '', 'characters': 0, 'parts': 0,
+    }
+
+    def failed(result):
+        return {'success': False, 'error': result['error'], **totals}
+
+    parts = iter_parts(iter_lines(fp, markdown), size)
+    text = next(parts, '')
+    if not text:
+        raise EmptyDocument('The document contains no text')
+    second = next(parts, None)
+    if second is None:
+        totals.update(characters=len(text), parts=1)
+    else:
+        # Summarize part by part, then combine the part summaries, in rounds
+        # if even they don't fit in one part
+        summaries = []
+        for number, part in enumerate(chain([text, second], parts), 1):
+            totals['characters'] += len(part)
+            totals['parts'] = number
+            result = _generate(client, PART_PROMPT.format(number=number, text=part, words=words), totals, budget)
+            if not result['success']:
+                return failed(result)
+            summaries.append(result['content'])
+        while True:
+            combined = list(iter_parts(_paragraphs(summaries), size))
+            if len(combined) == 1:
+                text = combined[0]
+                break
+            summaries = []
+            for number, part in enumerate(combined, 1):
+                result = _generate(client, PART_PROMPT.format(number=number, text=part, words=words), totals, budget)
+                if not result['success']:
+                    return failed(result)
+                summaries.append(result['content'])
+
+    result = _generate(client, AdvancedPromptEngine.get_prompt('text_summarization', style, text), totals, budget)
+    if not result['success']:
+        return failed(result)
+    return {'success': True, 'content': result['content'], **totals}
+
+
+def _paragraphs(texts):
+    for text in texts:
+        yield text
+        yield ''
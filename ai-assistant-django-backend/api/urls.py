@@ -6,8 +6,17 @@ urlpatterns = [
     path('cors-test/', views.cors_test, name='cors_test'),  # ← ADD THIS
 
     path('query/', views.handle_query, name='handle_query'),
+    path('summarize/upload/', views.summarize_upload, name='summarize_upload'),
+    path('conversations/', views.create_conversation, name='create_conversation'),
+    path('conversations/<str:session_id>/', views.get_conversation, name='get_conversation'),
     path('feedback/', views.handle_feedback, name='handle_feedback'),
     path('feedback-stats/', views.get_feedback_stats, name='get_feedback_stats'),
     path('styles/<str:function_type>/', views.get_available_styles, name='get_available_styles'),
     path('history/', views.get_query_history, name='get_query_history'),
+    path('history/export/', views.export_history, name='export_history'),
+    path('feedback/export/', views.export_feedback, name='export_feedback'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('usage-stats/', views.get_usage_stats, name='get_usage_stats'),
+    path('latency/', views.get_latency, name='get_latency'),
+    path('profiles/<str:name>/', views.get_profile, name='get_profile'),
 ]
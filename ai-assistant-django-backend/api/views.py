@@ -1,25 +1,57 @@
 from django.shortcuts import render
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
 import django
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, Q, Sum
 from django.utils import timezone
-from datetime import datetime
-from .models import QueryHistory, UserFeedback, APIUsageStats
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+from datetime import datetime, time, timedelta
+from itertools import chain
+from . import (
+    archive, conversations, export, histograms, http_cache, lanes, metrics, profiling, quotas,
+    response_cache, uploads
+)
+from .query_budget import query_budget
+from django.db.models import Prefetch
+from .models import QueryHistory, UserFeedback, APIUsageStats, Conversation, ConversationTurn, token_cost
 from .serializers import (
     QueryRequestSerializer, QueryResponseSerializer, 
     FeedbackSerializer, FeedbackStatsSerializer, StylesSerializer,
-    HealthCheckSerializer
+    HealthCheckSerializer, ConversationSerializer, DocumentUploadSerializer
 )
 from .utils import GeminiClient, AdvancedPromptEngine
 # Create your views here.
 try:
     gemini_client = GeminiClient()
+    gemini_client.add_metrics_hook(metrics.observe_upstream)
 except ValueError as e:
     gemini_client = None
     print(f"Warning: {e}")
 
+# The style catalog and health payload only change with a deploy, so their
+# bodies/ETags are computed once per process
+STYLE_BODIES = {
+    function_type: JSONRenderer().render({
+        'success': True,
+        'styles': AdvancedPromptEngine.get_available_styles(function_type)
+    })
+    for function_type, _ in QueryHistory.FUNCTION_CHOICES
+}
+STYLE_ETAGS = {
+    function_type: http_cache.static_etag(body) for function_type, body in STYLE_BODIES.items()
+}
+HEALTH_ETAG = http_cache.static_etag(f'2.0-{django.get_version()}'.encode('utf-8'))
+
+@query_budget(0)
+@cache_control(no_cache=True)
+@condition(etag_func=lambda request: HEALTH_ETAG)
 @api_view(['GET'])
 def health_check(request):
     """Health check endpoint"""
@@ -32,12 +64,17 @@ def health_check(request):
     serializer = HealthCheckSerializer(data)
     return Response(serializer.data)
 
+@query_budget(11)
+@quotas.client_quota
 @api_view(['POST'])
 def handle_query(request):
     """Handle AI query requests"""
-    serializer = QueryRequestSerializer(data=request.data)
+    timing = metrics.timing_for(request)
+    with timing.stage('validate'):
+        serializer = QueryRequestSerializer(data=request.data)
+        is_valid = serializer.is_valid()
     
-    if not serializer.is_valid():
+    if not is_valid:
         return Response({
             'success': False,
             'errors': serializer.errors
@@ -53,36 +90,105 @@ def handle_query(request):
         function_type = serializer.validated_data['function_type']
         style = serializer.validated_data['style']
         query = serializer.validated_data['query']
+        metrics.label_request(request, function_type, style)
+
+        conversation = None
+        conversation_id = serializer.validated_data.get('conversation_id')
+        if conversation_id:
+            conversation = Conversation.objects.filter(session_id=conversation_id).first()
+            if conversation is None:
+                return Response({
+                    'success': False,
+                    'error': f'Conversation not found: {conversation_id}'
+                }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get optimized prompt
-        prompt = AdvancedPromptEngine.get_prompt(function_type, style, query)
-        
-        # Generate response using Gemini
-        result = gemini_client.generate_content(prompt)
+        # Answers in a conversation depend on its context, so skip the cache
+        cached = None
+        if not conversation:
+            with timing.stage('cache'):
+                cached = response_cache.get(function_type, style, query)
+
+        if cached:
+            result = {
+                'success': True,
+                'content': cached['content'],
+                'model': cached['model'],
+                'processing_time': timing.stages[-1][1]
+            }
+        else:
+            # Get optimized prompt
+            with timing.stage('prompt'):
+                prompt = AdvancedPromptEngine.get_prompt(function_type, style, query)
+                if conversation:
+                    prompt = conversations.with_context(conversation, prompt)
+
+            # Generate response using Gemini, in this query's lane
+            lane = lanes.lane_for(function_type, prompt)
+            try:
+                with lanes.scheduler().slot(lane, settings.QUERY_LANE_TIMEOUT) as waited:
+                    metrics.LANE_QUEUE_WAIT.observe(waited, (lane,))
+                    timing.add('queue', waited)
+                    result = gemini_client.generate_content(prompt)
+            except lanes.LaneTimeout as e:
+                metrics.LANE_QUEUE_WAIT.observe(e.waited, (lane,))
+                metrics.LANE_REJECTED.inc((lane,))
+                return Response({
+                    'success': False,
+                    'error': f'Server busy: {e}. Please retry shortly.'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(settings.QUERY_LANE_RETRY_AFTER)})
+            for stage, seconds in result.get('timings', {}).items():
+                timing.add(stage, seconds)
+            if result['success'] and not conversation:
+                response_cache.put(function_type, style, query, result['content'], result.get('model', ''))
+            if request.quota_client:
+                quotas.record_tokens(request.quota_client, (result.get('usage') or {}).get('total_tokens'))
         
         if result['success']:
             # Save to database
-            query_history = QueryHistory.objects.create(
-                function_type=function_type,
-                style=style,
-                query=query,
-                response=result['content'],
-                processing_time=result.get('processing_time', 0)
-            )
+            usage = result.get('usage') or {}
+            with timing.stage('db'):
+                query_history = QueryHistory.objects.create(
+                    function_type=function_type,
+                    style=style,
+                    query=query,
+                    response=result['content'],
+                    processing_time=result.get('processing_time', 0),
+                    prompt_tokens=usage.get('prompt_tokens'),
+                    output_tokens=usage.get('output_tokens'),
+                    total_tokens=usage.get('total_tokens'),
+                    model_name=result.get('model', ''),
+                    # Only fresh, context-free answers may be warmed back into the cache
+                    template_hash=(
+                        '' if cached or conversation else response_cache.template_hash(function_type, style)
+                    )
+                )
+                if conversation:
+                    turn = conversations.add_turn(conversation, query_history, gemini_client)
             
             # Return response in format that React expects
+            data = {
+                'id': query_history.id,
+                'function_type': function_type,
+                'style': style,
+                'query': query,
+                'response': result['content'],
+                'processing_time': result.get('processing_time', 0),
+                'prompt_tokens': query_history.prompt_tokens,
+                'output_tokens': query_history.output_tokens,
+                'total_tokens': query_history.total_tokens,
+                'model_name': query_history.model_name,
+                'output_tokens_per_second': query_history.output_tokens_per_second,
+                'cached': bool(cached),
+                'created_at': query_history.created_at.isoformat()
+            }
+            if conversation:
+                data['conversation_id'] = conversation.session_id
+                data['turn'] = turn.position
             return Response({
                 'success': True,
                 'response': result['content'],  # ← ADD THIS for React compatibility
-                'data': {
-                    'id': query_history.id,
-                    'function_type': function_type,
-                    'style': style,
-                    'query': query,
-                    'response': result['content'],
-                    'processing_time': result.get('processing_time', 0),
-                    'created_at': query_history.created_at.isoformat()
-                }
+                'data': data
             })
         else:
             return Response({
@@ -96,6 +202,197 @@ def handle_query(request):
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@query_budget(5)
+@quotas.client_quota
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def summarize_upload(request):
+    """Summarize a text or markdown document sent as multipart 'file' or as the raw body"""
+    if not gemini_client:
+        return Response({
+            'success': False,
+            'error': 'Gemini API client not initialized. Check your API key.'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    timing = metrics.timing_for(request)
+    content_type = request.content_type.split(';')[0].strip().lower()
+    try:
+        with timing.stage('upload'):
+            if content_type == 'multipart/form-data':
+                options, document = uploads.multipart_document(request)
+                if document is None:
+                    return Response({
+                        'success': False,
+                        'error': "No document uploaded; send it in the 'file' field"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                name, markdown = document.name, uploads.is_markdown(document.content_type, document.name)
+            elif not int(request.META.get('CONTENT_LENGTH') or 0):
+                return Response({
+                    'success': False,
+                    'error': "Empty document; send it as the request body or in the 'file' field"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            elif content_type in uploads.RAW_TYPES:
+                options = request.query_params
+                name = options.get('filename', 'document')
+                markdown = uploads.is_markdown(content_type, name)
+                document = uploads.spool_body(request.stream, int(request.META.get('CONTENT_LENGTH') or 0))
+            else:
+                return Response({
+                    'success': False,
+                    'error': f'Unsupported content type: {content_type or "(none)"}. '
+                             'Send multipart/form-data or a text/plain or text/markdown body.'
+                }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    except uploads.UploadTooLarge as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    try:
+        with document:
+            serializer = DocumentUploadSerializer(data=options)
+            if not serializer.is_valid():
+                return Response({
+                    'success': False,
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            style = serializer.validated_data['style']
+            metrics.label_request(request, 'text_summarization', style)
+            budget = None
+            if request.quota_client:
+                budget = quotas.TokenBudget(request.quota_client)
+                budget.require(uploads.estimate_tokens(document))
+            result = uploads.summarize_document(document, style, gemini_client, markdown, budget)
+    except quotas.QuotaExceeded as e:
+        headers = {'Retry-After': str(e.retry_after)} if e.retry_after is not None else None
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers=headers)
+    except uploads.EmptyDocument as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except uploads.UnsupportedDocument as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    except lanes.LaneTimeout as e:
+        return Response({
+            'success': False,
+            'error': f'Server busy: {e}. Please retry shortly.'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(settings.QUERY_LANE_RETRY_AFTER)})
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    for stage, seconds in result['timings'].items():
+        timing.add(stage, seconds)
+    usage = result['usage']
+    if not result['success']:
+        return Response({
+            'success': False,
+            'error': result['error']
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        # The document itself isn't stored, only a description of it
+        with timing.stage('db'):
+            query_history = QueryHistory.objects.create(
+                function_type='text_summarization',
+                style=style,
+                query=f'[Document] {name} ({result["characters"]} characters, {result["parts"]} parts)',
+                response=result['content'],
+                processing_time=result['processing_time'],
+                prompt_tokens=usage.get('prompt_tokens'),
+                output_tokens=usage.get('output_tokens'),
+                total_tokens=usage.get('total_tokens'),
+                model_name=result['model']
+            )
+        return Response({
+            'success': True,
+            'response': result['content'],
+            'data': {
+                'id': query_history.id,
+                'function_type': 'text_summarization',
+                'style': style,
+                'query': query_history.query,
+                'response': result['content'],
+                'processing_time': result['processing_time'],
+                'prompt_tokens': query_history.prompt_tokens,
+                'output_tokens': query_history.output_tokens,
+                'total_tokens': query_history.total_tokens,
+                'model_name': query_history.model_name,
+                'document': {
+                    'name': name,
+                    'characters': result['characters'],
+                    'parts': result['parts'],
+                    'gemini_calls': result['calls'],
+                },
+                'created_at': query_history.created_at.isoformat()
+            }
+        })
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@query_budget(1)
+@api_view(['POST'])
+def create_conversation(request):
+    """Start a conversation; pass its conversation_id to /api/query/ to keep context"""
+    try:
+        conversation = conversations.create_conversation()
+        return Response({
+            'success': True,
+            'data': {
+                'session_id': conversation.session_id,
+                'created_at': conversation.created_at.isoformat()
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@query_budget(2)
+@api_view(['GET'])
+def get_conversation(request, session_id):
+    """A conversation's rolling summary and turns"""
+    try:
+        turns = ConversationTurn.objects.select_related('query_blob', 'response_blob')
+        conversation = (
+            Conversation.objects
+            .prefetch_related(Prefetch('turns', queryset=turns))
+            .filter(session_id=session_id)
+            .first()
+        )
+        if conversation is None:
+            return Response({
+                'success': False,
+                'error': f'Conversation not found: {session_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'success': True,
+            'data': ConversationSerializer(conversation).data
+        })
+
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@query_budget(5)
 @api_view(['POST'])
 def handle_feedback(request):
     """Handle feedback submission"""
@@ -122,26 +419,37 @@ def handle_feedback(request):
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@query_budget(2)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=http_cache.etag_for('feedback'))
 @api_view(['GET'])
 def get_feedback_stats(request):
     """Get feedback statistics"""
     try:
-        feedbacks = UserFeedback.objects.all()
-        
-        if not feedbacks.exists():
+        totals = UserFeedback.objects.aggregate(total=Count('id'), avg_rating=Avg('rating'))
+        if not totals['total']:
             return Response({
                 'success': True,
                 'data': {'message': 'No feedback data available yet.'}
             })
-        total_feedback = feedbacks.count()
-        avg_rating = feedbacks.aggregate(Avg('rating'))['rating__avg']
+        total_feedback = totals['total']
+        avg_rating = totals['avg_rating']
+
+        # One GROUP BY instead of two queries per function type; order_by()
+        # drops the model's default ordering from the grouping
+        per_function = {
+            row['function_type']: row
+            for row in UserFeedback.objects.order_by()
+            .values('function_type')
+            .annotate(count=Count('id'), avg_rating=Avg('rating'))
+        }
         function_stats = {}
         for function_type in ['question_answering', 'text_summarization', 'creative_generation']:
-            func_feedbacks = feedbacks.filter(function_type=function_type)
-            if func_feedbacks.exists():
+            row = per_function.get(function_type)
+            if row:
                 function_stats[function_type] = {
-                    'count': func_feedbacks.count(),
-                    'avg_rating': round(func_feedbacks.aggregate(Avg('rating'))['rating__avg'], 2)
+                    'count': row['count'],
+                    'avg_rating': round(row['avg_rating'], 2)
                 }
         
         stats_data = {
@@ -161,34 +469,137 @@ def get_feedback_stats(request):
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _usage_group(rows, key):
+    """Fold per (function_type, style, model) aggregate rows into groups by ``key``"""
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(key(row), {
+            'queries': 0, 'queries_with_usage': 0, 'prompt_tokens': 0, 'output_tokens': 0,
+            'total_tokens': 0, 'processing_time': 0.0, 'timed_processing_time': 0.0,
+            'estimated_cost': 0.0, 'unpriced_queries': 0
+        })
+        group['queries'] += row['queries']
+        group['queries_with_usage'] += row['queries_with_usage']
+        group['prompt_tokens'] += row['sum_prompt_tokens'] or 0
+        group['output_tokens'] += row['sum_output_tokens'] or 0
+        group['total_tokens'] += row['sum_total_tokens'] or 0
+        group['processing_time'] += row['sum_processing_time'] or 0
+        group['timed_processing_time'] += row['timed_processing_time'] or 0
+        cost = token_cost(row['model_name'], row['sum_prompt_tokens'], row['sum_output_tokens'])
+        if cost is None:
+            group['unpriced_queries'] += row['queries_with_usage']
+        else:
+            group['estimated_cost'] += cost
+
+    for group in groups.values():
+        timed = group.pop('timed_processing_time')
+        group['avg_processing_time'] = round(group.pop('processing_time') / group['queries'], 4)
+        group['output_tokens_per_second'] = round(group['output_tokens'] / timed, 2) if timed else None
+        group['avg_output_tokens'] = (
+            round(group['output_tokens'] / group['queries_with_usage'], 1)
+            if group['queries_with_usage'] else None
+        )
+        group['cost_per_1k_output_tokens'] = (
+            round(group['estimated_cost'] / group['output_tokens'] * 1000, 6)
+            if group['output_tokens'] else None
+        )
+        group['estimated_cost'] = round(group['estimated_cost'], 6)
+    return groups
+
+@query_budget(1)
 @api_view(['GET'])
-def get_available_styles(request, function_type):
-    """Get available styles for a function type"""
+def get_usage_stats(request):
+    """Token usage, throughput and estimated cost per style, function type and model"""
     try:
-        styles = AdvancedPromptEngine.get_available_styles(function_type)
-        
-        if not styles:
+        try:
+            date_from, date_to = _parse_date_range(request.GET)
+        except ValueError as e:
             return Response({
                 'success': False,
-                'error': 'Invalid function type'
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        queries = QueryHistory.objects.all()
+        if date_from:
+            queries = queries.filter(created_at__gte=date_from)
+        if date_to:
+            queries = queries.filter(created_at__lt=date_to)
+
+        # Throughput only counts rows where both tokens and time are known
+        with_usage = Q(output_tokens__isnull=False, processing_time__isnull=False)
+        rows = list(
+            queries.order_by()
+            .values('function_type', 'style', 'model_name')
+            .annotate(
+                queries=Count('id'),
+                queries_with_usage=Count('id', filter=Q(output_tokens__isnull=False)),
+                sum_prompt_tokens=Sum('prompt_tokens'),
+                sum_output_tokens=Sum('output_tokens'),
+                sum_total_tokens=Sum('total_tokens'),
+                sum_processing_time=Sum('processing_time'),
+                timed_processing_time=Sum('processing_time', filter=with_usage),
+            )
+        )
+
         return Response({
             'success': True,
-            'styles': styles
+            'data': {
+                'by_style': _usage_group(rows, lambda row: row['style']),
+                'by_function': _usage_group(rows, lambda row: row['function_type']),
+                'by_model': _usage_group(rows, lambda row: row['model_name'] or 'unknown'),
+                'total': _usage_group(rows, lambda row: 'all').get('all', {})
+            }
         })
-        
+
     except Exception as e:
         return Response({
             'success': False,
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@query_budget(0)
+@http_cache.cache_success(public=True, max_age=3600)
+@condition(etag_func=lambda request, function_type: STYLE_ETAGS.get(function_type))
+@api_view(['GET'])
+def get_available_styles(request, function_type):
+    """Get available styles for a function type"""
+    body = STYLE_BODIES.get(function_type)
+    if body is None:
+        return Response({
+            'success': False,
+            'error': 'Invalid function type'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return HttpResponse(body, content_type='application/json')
+
+def _parse_date_range(params):
+    """Read ``date_from``/``date_to`` (ISO date or datetime) as an aware [start, end) range"""
+    bounds = []
+    for name, is_end in (('date_from', False), ('date_to', True)):
+        raw = params.get(name)
+        if not raw:
+            bounds.append(None)
+            continue
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                raise ValueError(f'Invalid {name}: {raw}')
+            # A bare date_to includes the whole day
+            value = datetime.combine(day + timedelta(days=1) if is_end else day, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        bounds.append(value)
+    return bounds[0], bounds[1]
+
+@query_budget(2)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=http_cache.etag_for('history'))
 @api_view(['GET'])
 def get_query_history(request):
-    """Get query history with pagination"""
+    """Get query history with pagination, reading archived segments for old date ranges"""
     try:
-        queries = QueryHistory.objects.all()
+        queries = QueryHistory.objects.select_related('query_blob', 'response_blob')
         page_size = request.GET.get('page_size', 10)
         page = request.GET.get('page', 1)
         
@@ -198,19 +609,42 @@ def get_query_history(request):
         except ValueError:
             page_size = 10
             page = 1
+
+        try:
+            date_from, date_to = _parse_date_range(request.GET)
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if date_from:
+            queries = queries.filter(created_at__gte=date_from)
+        if date_to:
+            queries = queries.filter(created_at__lt=date_to)
         
         start = (page - 1) * page_size
         end = start + page_size
         
         paginated_queries = queries[start:end]
-        total_count = queries.count()
-        
-        serializer = QueryResponseSerializer(paginated_queries, many=True)
+        hot_count = queries.count()
+        results = QueryResponseSerializer(paginated_queries, many=True).data
+
+        # Archived rows are older than everything still in the table, so they
+        # continue the listing once the hot rows run out.
+        total_count = hot_count
+        if (date_from or date_to) and archive.reaches_archive(date_from, date_to):
+            total_count += archive.count_archived(date_from, date_to)
+            if end > hot_count:
+                offset = max(start - hot_count, 0)
+                results = list(results) + archive.page_archived(
+                    date_from, date_to, offset, end - max(start, hot_count)
+                )
         
         return Response({
             'success': True,
             'data': {
-                'results': serializer.data,
+                'results': results,
                 'total_count': total_count,
                 'page': page,
                 'page_size': page_size,
@@ -224,6 +658,122 @@ def get_query_history(request):
             'success': False,
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+def _export_params(params):
+    """Validate the filters and output options shared by the export endpoints"""
+    output = params.get('output', 'ndjson')
+    if output not in export.FORMATS:
+        raise ValueError(f"Invalid output: {output}. Use one of: {', '.join(export.FORMATS)}")
+    function_type = params.get('function_type')
+    valid_types = [choice for choice, _ in QueryHistory.FUNCTION_CHOICES]
+    if function_type and function_type not in valid_types:
+        raise ValueError(f'Invalid function_type: {function_type}')
+    date_from, date_to = _parse_date_range(params)
+    gzip = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return output, function_type, date_from, date_to, gzip
+
+def _filter_export(queryset, function_type, date_from, date_to):
+    if function_type:
+        queryset = queryset.filter(function_type=function_type)
+    if date_from:
+        queryset = queryset.filter(created_at__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__lt=date_to)
+    return queryset
+
+@api_view(['GET'])
+def export_history(request):
+    """Stream query history as NDJSON or CSV, including archived rows for old date ranges"""
+    try:
+        output, function_type, date_from, date_to, gzip = _export_params(request.GET)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    queries = _filter_export(
+        QueryHistory.objects.select_related('query_blob', 'response_blob'),
+        function_type, date_from, date_to
+    )
+    rows = export.history_rows(queries)
+    if (date_from or date_to) and archive.reaches_archive(date_from, date_to):
+        archived = archive.iter_archived(date_from, date_to)
+        if function_type:
+            archived = (row for row in archived if row['function_type'] == function_type)
+        rows = chain(rows, archived)
+    return export.streaming_response(rows, export.HISTORY_FIELDS, output, gzip, 'history')
+
+@api_view(['GET'])
+def export_feedback(request):
+    """Stream feedback as NDJSON or CSV"""
+    try:
+        output, function_type, date_from, date_to, gzip = _export_params(request.GET)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    feedbacks = _filter_export(
+        UserFeedback.objects.select_related('query_blob', 'response_blob'),
+        function_type, date_from, date_to
+    )
+    rows = export.feedback_rows(feedbacks)
+    return export.streaming_response(rows, export.FEEDBACK_FIELDS, output, gzip, 'feedback')
+
+@query_budget(0)
+@api_view(['GET'])
+def metrics_view(request):
+    """Request counters and latency histograms in the Prometheus text format"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@query_budget(0)
+@api_view(['GET'])
+def get_latency(request):
+    """Live latency percentiles per endpoint, function type and style, merged across workers"""
+    try:
+        try:
+            windows = [int(w) for w in request.GET.get('windows', '60,300,900').split(',') if w]
+        except ValueError:
+            windows = []
+        horizon = settings.LATENCY_SLOTS * settings.LATENCY_SLOT_SECONDS
+        if not windows or any(w <= 0 or w > horizon for w in windows):
+            return Response({
+                'success': False,
+                'error': f'windows must be comma-separated seconds between 1 and {horizon}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        series, processes = histograms.window_summaries(
+            windows,
+            endpoint=request.GET.get('endpoint'),
+            function_type=request.GET.get('function_type'),
+            style=request.GET.get('style')
+        )
+        return Response({
+            'success': True,
+            'data': {
+                'processes': processes,
+                'series': series
+            }
+        })
+
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def get_profile(request, name):
+    """Download a collapsed-stack profile written by ProfilingMiddleware"""
+    if not settings.PROFILING_ENABLED or not profiling.PROFILE_NAME.match(name):
+        raise Http404
+    try:
+        handle = open(profiling.profile_path(name), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(handle, content_type='text/plain; charset=utf-8')
+
 @api_view(['GET', 'POST', 'OPTIONS'])
 def cors_test(request):
     """Test CORS configuration"""
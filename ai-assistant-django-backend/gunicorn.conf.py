@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for serving the backend:
+
+    gunicorn -c gunicorn.conf.py ai_assistant_backend.wsgi
+
+api.lanes caps concurrent Gemini calls per process, with requests waiting on
+their own thread for a lane slot. That only works with threaded workers that
+have more threads than QUERY_LANE_SLOTS: a sync worker runs one request at a
+time, so a long summarization would hold the whole worker and the lanes would
+never see contention. Both values read the same environment variables as the
+Django settings.
+"""
+import multiprocessing
+import os
+
+QUERY_LANE_SLOTS = int(os.getenv('QUERY_LANE_SLOTS', 8))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count(), 4)))
+worker_class = 'gthread'
+# Slots for Gemini calls plus headroom for requests that never call Gemini
+# (history, stats, styles) and for queued requests waiting on a lane
+threads = int(os.getenv('GUNICORN_THREADS', QUERY_LANE_SLOTS * 2))
+# Document summaries make several Gemini calls in one request
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+
+
+def on_starting(server):
+    if server.cfg.worker_class_str != 'gthread' or server.cfg.threads <= QUERY_LANE_SLOTS:
+        raise RuntimeError(
+            f'Execution lanes need gthread workers with more than QUERY_LANE_SLOTS '
+            f'({QUERY_LANE_SLOTS}) threads; got {server.cfg.worker_class_str} with {server.cfg.threads}'
+        )
@@ -0,0 +1,4 @@
+"""
+Code shared by the CLI (``CLI mode/main.py``) and the Django backend
+(``ai-assistant-django-backend``) for talking to Gemini.
+"""
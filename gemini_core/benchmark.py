@@ -0,0 +1,152 @@
+"""
+Per-call overhead of the Gemini client as seen from each front end.
+
+Starts a local keep-alive HTTP stub that answers like Gemini, then times the
+same prompts through the CLI (``AIAssistant.request_completion``) and the
+backend (``api.utils.GeminiClient.generate_content``), interleaved so both
+see the same machine state. Both go through gemini_core.client, so their
+medians should agree within noise; a one-off ``requests.post`` per call (no
+pooled connection, the old behaviour) is timed for comparison.
+
+    python gemini_core/benchmark.py --calls 500 --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_DIR = os.path.join(ROOT, "CLI mode")
+BACKEND_DIR = os.path.join(ROOT, "ai-assistant-django-backend")
+
+REPLY = json.dumps(
+    {"candidates": [{"content": {"parts": [{"text": "benchmark answer " * 20}]}}]}
+).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        # Headers and body in one write, as real servers do; two small writes
+        # would add a Nagle/delayed-ACK stall to whichever caller hits it
+        self.wfile.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(REPLY)}\r\n\r\n".encode("ascii")
+            + REPLY
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v1beta/models/stub:generateContent"
+
+
+def cli_caller(url):
+    sys.path.insert(0, CLI_DIR)
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    import main
+    from gemini_core.client import stream_url_for
+
+    assistant = main.AIAssistant()
+    assistant.client.api_url = url
+    assistant.client.stream_url = stream_url_for(url)
+    return assistant.request_completion
+
+
+def backend_caller(url):
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ai_assistant_backend.settings")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.GEMINI_API_URL = url
+    from api.utils import GeminiClient
+
+    return GeminiClient().generate_content
+
+
+def unpooled_caller(url):
+    import requests
+
+    def call(prompt):
+        response = requests.post(
+            url,
+            headers={"Content-Type": "application/json", "X-goog-api-key": "benchmark"},
+            json={"contents": [{"parts": [{"text": prompt}]}]},
+            timeout=30,
+        )
+        return response.json()
+
+    return call
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "median": statistics.median(samples) * 1e6,
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Allowed relative difference between the CLI and backend medians",
+    )
+    args = parser.parse_args()
+
+    server, url = start_stub()
+    sys.path.insert(0, ROOT)
+    callers = {
+        "cli": cli_caller(url),
+        "backend": backend_caller(url),
+        "unpooled requests.post": unpooled_caller(url),
+    }
+    samples = {name: [] for name in callers}
+    order = list(callers.items())
+
+    for i in range(args.warmup + args.calls):
+        prompt = f"benchmark prompt {i}"
+        # Rotate so no caller always runs first (or right after another)
+        for name, call in order[i % len(order):] + order[:i % len(order)]:
+            started = time.perf_counter()
+            result = call(prompt)
+            elapsed = time.perf_counter() - started
+            if isinstance(result, dict) and result.get("success") is False:
+                raise SystemExit(f"{name} call failed: {result['error']}")
+            if i >= args.warmup:
+                samples[name].append(elapsed)
+    server.shutdown()
+
+    print(f"{args.calls} calls per front end against a local stub\n")
+    print(f"{'caller':<24} {'median µs':>10} {'p95 µs':>10}")
+    stats = {name: summarize(values) for name, values in samples.items()}
+    for name, row in stats.items():
+        print(f"{name:<24} {row['median']:>10.0f} {row['p95']:>10.0f}")
+
+    cli, backend = stats["cli"]["median"], stats["backend"]["median"]
+    difference = abs(cli - backend) / max(cli, backend)
+    print(f"\nCLI vs backend median difference: {difference:.1%}")
+    sys.exit(0 if difference <= args.tolerance else 1)
+
+
+if __name__ == "__main__":
+    main()
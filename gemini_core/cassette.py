@@ -0,0 +1,256 @@
+"""
+Record/replay of Gemini calls.
+
+In ``record`` mode every request body and its result are appended to a JSON
+Lines cassette; in ``replay`` mode results are served from the cassette
+instead of the network, optionally sleeping for the recorded (or a fixed)
+latency so timings keep the shape of the original traffic.
+
+Lookups go through a side index (``<cassette>.idx``) of fixed-width entries,
+a 32-byte SHA-256 of the request followed by the u64 byte offset of its line.
+The index is loaded into a dict when the cassette is opened, so a lookup is
+one hash probe and one line read however many interactions were recorded.
+
+Several processes may record into one cassette (backend workers, a CLI run
+next to the backend), so appends, index writes and crash repairs hold an
+exclusive ``flock`` on the cassette. A lookup still checks the key stored
+in the line it lands on; a mismatch means a stale index, which is rebuilt.
+"""
+import datetime
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: recording is only serialized within a process
+    fcntl = None
+
+MODES = ("off", "record", "replay")
+INDEX_ENTRY = struct.Struct("<32sQ")
+
+# Streaming and non-streaming calls for the same body share a recording
+_STREAM_METHOD = ":streamGenerateContent"
+_METHOD = ":generateContent"
+
+
+def request_digest(url: str, body: Dict[str, Any]) -> bytes:
+    """Stable hash of an upstream request; the API key is never part of it"""
+    endpoint = url.split("?", 1)[0].replace(_STREAM_METHOD, _METHOD)
+    canonical = json.dumps(
+        [endpoint, body], sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+def parse_latency(value) -> Optional[float]:
+    """'recorded' -> None (use the recorded latency), 'none' -> 0, else fixed seconds"""
+    if value is None or str(value).strip().lower() in ("", "recorded"):
+        return None
+    if str(value).strip().lower() == "none":
+        return 0.0
+    return max(0.0, float(value))
+
+
+class Cassette:
+    def __init__(self, path, mode: str = "replay", latency="recorded"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        self.path = os.fspath(path)
+        self.index_path = self.path + ".idx"
+        self.mode = mode
+        self.fixed_latency = parse_latency(latency)
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._reader = None
+        self._load_index()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def entries(self) -> int:
+        return len(self._index)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and, where supported, an exclusive flock on the cassette"""
+        with self._lock, open(self.path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load_index(self):
+        if self.recording:
+            with self._locked():
+                self._read_index()
+        else:
+            self._read_index()
+
+    def _read_index(self):
+        try:
+            data_size = os.path.getsize(self.path)
+        except OSError:
+            data_size = 0
+        try:
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b""
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        valid_size = 0
+        last_offset = None
+        for digest, offset in INDEX_ENTRY.iter_unpack(raw[:usable]):
+            if offset >= data_size:
+                break
+            self._index[digest] = offset
+            last_offset = offset
+            valid_size += INDEX_ENTRY.size
+        if self.recording and data_size:
+            self._catch_up(last_offset, valid_size)
+
+    def _catch_up(self, last_offset, valid_size):
+        """
+        Drop a torn index tail and index lines written after it (e.g. after a
+        crash); caller holds the flock, so no other recorder is mid-write
+        """
+        entries = []
+        with open(self.path, "rb+") as f:
+            if last_offset is not None:
+                f.seek(last_offset)
+                f.readline()
+            offset = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    f.truncate(offset)  # never acknowledged; the next record starts clean
+                    break
+                try:
+                    entries.append((bytes.fromhex(json.loads(line)["key"]), offset))
+                except (ValueError, KeyError, TypeError):
+                    pass
+                offset += len(line)
+        with open(self.index_path, "ab") as f:
+            f.truncate(valid_size)
+            for digest, offset in entries:
+                f.write(INDEX_ENTRY.pack(digest, offset))
+                self._index[digest] = offset
+
+    def lookup(self, url: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The recorded entry for this request, or None"""
+        digest = request_digest(url, body)
+        for attempt in range(2):
+            offset = self._index.get(digest)
+            if offset is None:
+                return None
+            entry = self._read_entry(offset)
+            if entry is not None and entry.get("key") == digest.hex():
+                return entry
+            if attempt == 0:
+                self.rebuild_index()
+        return None
+
+    def _read_entry(self, offset: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.path, "rb")
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def rebuild_index(self):
+        """Re-index the whole cassette, e.g. after a lookup found the index stale"""
+        with self._locked():
+            index = {}
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        index[bytes.fromhex(json.loads(line)["key"])] = offset
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    offset += len(line)
+            with open(self.index_path, "wb") as f:
+                for digest, offset in index.items():
+                    f.write(INDEX_ENTRY.pack(digest, offset))
+            self._index = index
+
+    def replay(self, url: str, body: Dict[str, Any], on_text=None) -> Dict[str, Any]:
+        """Serve a recorded result, sleeping for the configured latency"""
+        entry = self.lookup(url, body)
+        if entry is None:
+            return {
+                "success": False,
+                "error": "No recorded response for this request (GEMINI_CASSETTE_MODE=replay)",
+            }
+        result = dict(entry["result"])
+        latency = entry.get("latency", 0.0) if self.fixed_latency is None else self.fixed_latency
+        first_token = result.get("time_to_first_token")
+        if on_text is not None and result.get("success"):
+            # Keep the time-to-first-token split of a recorded stream
+            first_token = min(first_token if first_token is not None else latency, latency)
+            time.sleep(first_token)
+            on_text(result["content"])
+            time.sleep(latency - first_token)
+            result["time_to_first_token"] = first_token
+        else:
+            time.sleep(latency)
+        return result
+
+    def record(self, url: str, body: Dict[str, Any], result: Dict[str, Any], latency: float):
+        digest = request_digest(url, body)
+        entry = {
+            "key": digest.hex(),
+            "url": url.split("?", 1)[0],
+            "request": body,
+            "result": {
+                k: v for k, v in result.items() if k not in ("processing_time", "timings")
+            },
+            "latency": round(latency, 6),
+            "recorded_at": datetime.datetime.now().isoformat(),
+        }
+        data = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._locked() as f:
+            # Other recorders wait on the flock, so the end is where this line goes
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            # Written after the line, so the index never points at a torn entry
+            with open(self.index_path, "ab") as index:
+                index.write(INDEX_ENTRY.pack(digest, offset))
+            self._index[digest] = offset
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+def open_cassette(mode: str, path, latency="recorded") -> Optional[Cassette]:
+    """A Cassette for ``mode``, or None when record/replay is off"""
+    mode = (mode or "off").strip().lower()
+    if mode == "off":
+        return None
+    return Cassette(path, mode=mode, latency=latency)
@@ -0,0 +1,345 @@
+"""
+Gemini HTTP client shared by the CLI and the backend.
+
+One ``requests.Session`` per client keeps TLS connections alive between calls
+(pooled per host, sized for concurrent callers), retries throttling and
+transient upstream errors with exponential backoff, and reports every call to
+registered metrics hooks. ``requests`` is imported on first use so front ends
+that never reach the network (``--stats``, replay mode) do not pay for it.
+
+Successful results also carry ``usage`` (prompt, output and total token
+counts from ``usageMetadata``, None if Gemini sent none) and ``model``.
+
+Every result carries ``timings``, seconds spent per stage of the call:
+``connect`` (DNS, TCP and TLS; 0 on a reused connection), ``upstream`` (request
+sent until response headers, i.e. Gemini's generation time), ``download``
+(reading the body, or the rest of the stream) and ``parse`` (JSON decoding).
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+PARSE_ERROR = "Failed to parse Gemini response"
+
+# Connection setup time of the current thread's request, written by the timed
+# urllib3 connections below
+_connect_time = threading.local()
+
+
+def _take_connect_time() -> float:
+    elapsed = getattr(_connect_time, "value", 0.0)
+    _connect_time.value = 0.0
+    return elapsed
+
+
+def _timed_adapter_class():
+    """HTTPAdapter whose pools time connect() (DNS + TCP + TLS) per thread"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(connection_cls):
+        class TimedConnection(connection_cls):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    super().connect()
+                finally:
+                    _connect_time.value = (
+                        getattr(_connect_time, "value", 0.0) + time.perf_counter() - started
+                    )
+
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    class TimedHTTPAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": TimedHTTPConnectionPool,
+                "https": TimedHTTPSConnectionPool,
+            }
+
+    return TimedHTTPAdapter
+
+
+def build_request_body(prompt: str) -> Dict[str, Any]:
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+def stream_url_for(api_url: str) -> str:
+    return api_url.replace(":generateContent", ":streamGenerateContent") + "?alt=sse"
+
+
+def model_from_url(api_url: str) -> str:
+    """'.../models/gemini-2.0-flash:generateContent' -> 'gemini-2.0-flash'"""
+    return api_url.split("?", 1)[0].rsplit("/", 1)[-1].split(":", 1)[0]
+
+
+def extract_usage(response_data: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """Token counts from ``usageMetadata``, or None when the response has none"""
+    usage = response_data.get("usageMetadata")
+    if not isinstance(usage, dict):
+        return None
+    prompt_tokens = usage.get("promptTokenCount")
+    output_tokens = usage.get("candidatesTokenCount")
+    total_tokens = usage.get("totalTokenCount")
+    if total_tokens is None and prompt_tokens is not None and output_tokens is not None:
+        total_tokens = prompt_tokens + output_tokens
+    return {
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens,
+    }
+
+
+def extract_text(response_data: Dict[str, Any]) -> str:
+    """Concatenated text of the first candidate; raises KeyError/IndexError if absent"""
+    parts = response_data["candidates"][0]["content"]["parts"]
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiClient:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        api_url: str,
+        timeout: float = 30,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        cassette=None,
+    ):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.stream_url = stream_url_for(api_url)
+        self.model = model_from_url(api_url)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cassette = cassette
+        self.hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def add_metrics_hook(self, hook: Callable[[Dict[str, Any]], None]):
+        """Call ``hook(metrics)`` after every request; see _report() for the keys"""
+        self.hooks.append(hook)
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        import requests
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = _timed_adapter_class()(
+            pool_connections=2, pool_maxsize=self.pool_size, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    def _headers(self) -> Dict[str, str]:
+        return {"X-goog-api-key": self.api_key or ""}
+
+    def _report(self, kind: str, result: Dict[str, Any], **extra):
+        if not self.hooks:
+            return
+        metrics = {
+            "kind": kind,
+            "model": result.get("model", self.model),
+            "usage": result.get("usage"),
+            "success": result.get("success", False),
+            "latency": result["processing_time"],
+            "time_to_first_token": result.get("time_to_first_token"),
+            "timings": result.get("timings", {}),
+            **extra,
+        }
+        for hook in self.hooks:
+            try:
+                hook(metrics)
+            except Exception:
+                pass
+
+    def generate(self, prompt: str) -> Dict[str, Any]:
+        """
+        Returns ``{'success', 'content' | 'error', 'processing_time'}``;
+        never raises for upstream or network failures.
+        """
+        started = time.perf_counter()
+        body = build_request_body(prompt)
+        replayed = bool(self.cassette and self.cassette.replaying)
+        if replayed:
+            result = self.cassette.replay(self.api_url, body)
+            status_code = None
+            result["timings"] = {"replay": time.perf_counter() - started}
+        else:
+            result, status_code = self._post(body)
+        result["processing_time"] = time.perf_counter() - started
+        if self.cassette and self.cassette.recording:
+            self.cassette.record(self.api_url, body, result, result["processing_time"])
+        self._report("generate", result, status_code=status_code, replayed=replayed)
+        return result
+
+    def _post(self, body: Dict[str, Any]):
+        import requests
+
+        session = self.session
+        _take_connect_time()
+        started = time.perf_counter()
+        try:
+            response = session.post(
+                self.api_url, headers=self._headers(), json=body, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            return {
+                "success": False,
+                "error": f"Connection Error: {str(e)}",
+                "timings": {"connect": _take_connect_time()},
+            }, None
+        received = time.perf_counter()
+        connect = _take_connect_time()
+        # elapsed runs from sending the request to parsing the response headers
+        headers_at = response.elapsed.total_seconds()
+        timings = {
+            "connect": connect,
+            "upstream": max(headers_at - connect, 0.0),
+            "download": max(received - started - headers_at, 0.0),
+        }
+
+        if response.status_code != 200:
+            return {
+                "success": False,
+                "error": f"API Error {response.status_code}: {response.text}",
+                "timings": timings,
+            }, response.status_code
+        try:
+            response_data = response.json()
+            content = extract_text(response_data).strip()
+            result = {
+                "success": True,
+                "content": content,
+                "usage": extract_usage(response_data),
+                "model": response_data.get("modelVersion") or self.model,
+            }
+        except (ValueError, KeyError, IndexError, AttributeError):
+            result = {"success": False, "error": PARSE_ERROR}
+        timings["parse"] = time.perf_counter() - received
+        result["timings"] = timings
+        return result, response.status_code
+
+    def stream(self, prompt: str, on_text: Callable[[str], None]) -> Dict[str, Any]:
+        """Like generate(), passing each text chunk to ``on_text`` as it arrives"""
+        started = time.perf_counter()
+        body = build_request_body(prompt)
+        replayed = bool(self.cassette and self.cassette.replaying)
+        if replayed:
+            result = self.cassette.replay(self.stream_url, body, on_text)
+            status_code = None
+            result["timings"] = {"replay": time.perf_counter() - started}
+        else:
+            result, status_code = self._post_stream(body, on_text, started)
+        result["processing_time"] = time.perf_counter() - started
+        if self.cassette and self.cassette.recording:
+            self.cassette.record(self.stream_url, body, result, result["processing_time"])
+        self._report("stream", result, status_code=status_code, replayed=replayed)
+        return result
+
+    def _post_stream(self, body: Dict[str, Any], on_text, started: float):
+        import requests
+
+        session = self.session
+        _take_connect_time()
+        first_token_at = None
+        chunks = []
+        usage = None
+        model = self.model
+        timings = {}
+        try:
+            with session.post(
+                self.stream_url,
+                headers=self._headers(),
+                json=body,
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                headers_received = time.perf_counter()
+                timings["connect"] = _take_connect_time()
+                timings["upstream"] = max(
+                    response.elapsed.total_seconds() - timings["connect"], 0.0
+                )
+                if response.status_code != 200:
+                    return {
+                        "success": False,
+                        "error": f"API Error {response.status_code}: {response.text}",
+                        "timings": timings,
+                    }, response.status_code
+
+                # SSE is UTF-8 by definition; without a charset in the headers
+                # requests would decode it as ISO-8859-1
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[len("data:"):])
+                        # Running totals; the final event carries the complete counts
+                        usage = extract_usage(event) or usage
+                        model = event.get("modelVersion") or model
+                        text = extract_text(event)
+                    except (ValueError, KeyError, IndexError, AttributeError):
+                        continue
+                    if not text:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    chunks.append(text)
+                    on_text(text)
+                timings["download"] = time.perf_counter() - headers_received
+        except requests.exceptions.RequestException as e:
+            timings.setdefault("connect", _take_connect_time())
+            return {"success": False, "error": f"Connection Error: {str(e)}", "timings": timings}, None
+
+        content = "".join(chunks).strip()
+        if not content:
+            return {"success": False, "error": PARSE_ERROR, "timings": timings}, 200
+        return {
+            "success": True,
+            "content": content,
+            "time_to_first_token": first_token_at - started,
+            "usage": usage,
+            "model": model,
+            "timings": timings,
+        }, 200
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None